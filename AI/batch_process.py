@@ -0,0 +1,248 @@
+"""
+Batch Floor Plan Processing
+
+Runs the unified detector (or the Shared/ocr_extract.py OCR pipeline) over
+a directory or glob of floor plan images in a process pool, so interpreter,
+OpenCV and Tesseract start-up is paid once per worker instead of once per
+image. Files whose output is already up to date are skipped, and a manifest
+with per-file timings and errors is rewritten after every file, so an
+interrupted run resumes where it stopped.
+
+Usage:
+    python batch_process.py <dir|glob> [<dir|glob> ...] [--mode unified|ocr]
+                            [--workers N] [--manifest PATH] [--force]
+
+Outputs:
+    unified: <imageName>_detection.json next to each image
+    ocr:     <imageName>-ocr.json next to each image
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SHARED_DIR = os.path.join(os.path.dirname(BASE_DIR), "Shared")
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+MANIFEST_NAME = "batch_manifest.json"
+
+
+def find_images(patterns: List[str]) -> List[str]:
+    """Expand directories and glob patterns into a sorted list of image paths."""
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                for name in files:
+                    paths.add(os.path.join(root, name))
+        else:
+            paths.update(glob.glob(pattern, recursive=True))
+
+    return sorted(
+        os.path.abspath(p) for p in paths
+        if p.lower().endswith(IMAGE_EXTENSIONS)
+        # Skip debug renders written next to the source plans
+        and not os.path.splitext(p)[0].endswith(("_processed", "_preprocessed", "_ocr_result"))
+    )
+
+
+def import_ocr_extract():
+    """Import Shared/ocr_extract.py (only needed, and importable, in ocr mode)."""
+    if SHARED_DIR not in sys.path:
+        sys.path.insert(0, SHARED_DIR)
+    import ocr_extract
+    return ocr_extract
+
+
+def output_path_for(image_path: str, mode: str) -> str:
+    """Output JSON path for an image, matching the single-image CLIs."""
+    if mode == "ocr":
+        return import_ocr_extract().output_path_for(image_path)
+    return f"{os.path.splitext(image_path)[0]}_detection.json"
+
+
+def pipeline_version(mode: str) -> str:
+    """Version string recorded in the manifest; a change forces reprocessing."""
+    if mode == "ocr":
+        return f"ocr-{import_ocr_extract().OCR_VERSION}"
+    from unified_detector import DETECTOR_VERSION
+    return f"unified-{DETECTOR_VERSION}"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_up_to_date(image_path: str, entry: Optional[Dict], mode: str, version: str) -> bool:
+    """
+    Check whether a previous run already produced a current output.
+
+    The cheap mtime/size comparison is tried first; the file is only hashed
+    when those changed (e.g. after a copy or touch) to confirm the content.
+    """
+    if not entry or entry.get("status") != "ok":
+        return False
+    if entry.get("mode") != mode or entry.get("version") != version:
+        return False
+    if not os.path.exists(entry.get("output", "")):
+        return False
+
+    stat = os.stat(image_path)
+    if entry.get("mtime") == stat.st_mtime and entry.get("size") == stat.st_size:
+        return True
+    return entry.get("sha256") == file_sha256(image_path)
+
+
+def process_one(image_path: str, mode: str) -> Dict:
+    """Worker entry point: process one image and write its output JSON."""
+    started = time.time()
+    output_path = output_path_for(image_path, mode)
+
+    try:
+        if mode == "ocr":
+            import cv2
+
+            image = cv2.imread(image_path)
+            if image is None:
+                raise ValueError(f"Could not load image: {image_path}")
+            output = import_ocr_extract().process_image(image)
+            with open(output_path, "w", encoding="utf-8") as f:
+                json.dump(output, f, indent=2, ensure_ascii=False)
+            summary = {k: len(v) for k, v in output.items()}
+        else:
+            from unified_detector import process_floor_plan
+
+            result = process_floor_plan(image_path, output_path)
+            summary = {k: len(v) for k, v in result["detections"].items() if isinstance(v, list)}
+    except Exception as e:
+        return {
+            "status": "error",
+            "error": f"{type(e).__name__}: {e}",
+            "seconds": round(time.time() - started, 3)
+        }
+
+    return {
+        "status": "ok",
+        "output": output_path,
+        "seconds": round(time.time() - started, 3),
+        "summary": summary
+    }
+
+
+def load_manifest(path: str) -> Dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"files": {}}
+
+
+def save_manifest(path: str, manifest: Dict) -> None:
+    """Write the manifest atomically so an interrupted run never corrupts it."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def run_batch(patterns: List[str], mode: str = "unified", workers: int = None,
+              manifest_path: str = None, force: bool = False) -> Dict:
+    """
+    Process every image matched by `patterns` and return the manifest.
+
+    Args:
+        patterns: Directories and/or glob patterns
+        mode: "unified" (unified_detector) or "ocr" (Shared/ocr_extract.py)
+        workers: Worker processes (default: CPU count)
+        manifest_path: Manifest location (default: batch_manifest.json in the
+            first directory argument, or the current directory)
+        force: Reprocess files even if their output is up to date
+    """
+    images = find_images(patterns)
+    if manifest_path is None:
+        first_dir = next((p for p in patterns if os.path.isdir(p)), ".")
+        manifest_path = os.path.join(first_dir, MANIFEST_NAME)
+
+    manifest = load_manifest(manifest_path)
+    files = manifest.setdefault("files", {})
+    version = pipeline_version(mode)
+
+    pending = []
+    for path in images:
+        if force or not is_up_to_date(path, files.get(path), mode, version):
+            pending.append(path)
+        else:
+            # Remember the current mtime so an unchanged file is not re-hashed next time
+            stat = os.stat(path)
+            files[path].update({"mtime": stat.st_mtime, "size": stat.st_size})
+    print(f"{len(images)} images, {len(images) - len(pending)} up to date, {len(pending)} to process")
+
+    started = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process_one, path, mode): path for path in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            stat = os.stat(path)
+            entry = {
+                "mode": mode,
+                "version": version,
+                "mtime": stat.st_mtime,
+                "size": stat.st_size,
+                "sha256": file_sha256(path),
+                "processedAt": time.time()
+            }
+            try:
+                entry.update(future.result())
+            except Exception as e:
+                # The worker process itself died (e.g. killed or out of memory)
+                entry.update({"status": "error", "error": f"{type(e).__name__}: {e}"})
+
+            if entry["status"] == "ok":
+                print(f"[{done}/{len(pending)}] {path} ({entry['seconds']}s)")
+            else:
+                print(f"[{done}/{len(pending)}] {path} FAILED: {entry['error']}")
+
+            files[path] = entry
+            save_manifest(manifest_path, manifest)
+
+    manifest["lastRun"] = {
+        "mode": mode,
+        "images": len(images),
+        "processed": len(pending),
+        "errors": sum(1 for p in pending if files[p]["status"] == "error"),
+        "seconds": round(time.time() - started, 3)
+    }
+    save_manifest(manifest_path, manifest)
+    print(f"Manifest: {manifest_path}")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch-process floor plan images")
+    parser.add_argument("inputs", nargs="+", help="Image directories or glob patterns")
+    parser.add_argument("--mode", choices=["unified", "ocr"], default="unified",
+                        help="unified_detector (default) or Shared/ocr_extract.py")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--manifest", type=str, default=None, help="Manifest path")
+    parser.add_argument("--force", action="store_true", help="Reprocess up-to-date files")
+    args = parser.parse_args()
+
+    manifest = run_batch(args.inputs, args.mode, args.workers, args.manifest, args.force)
+    sys.exit(1 if manifest["lastRun"]["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
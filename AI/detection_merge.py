@@ -0,0 +1,103 @@
+"""
+Detection Merging
+
+Combines unified (OpenCV + OCR) detections with ML model detections of the
+same floor plan. Unified detections are the primary set: they carry OCR
+names, room labels and wall geometry the navigation graph is built from.
+An ML room or door overlapping a unified one above the merge IoU confirms
+it (adding the ML confidence and class); unmatched ML rooms and doors are
+added. ML wall boxes are only added where no unified wall segment passes
+through them. Every merged item lists the backends that found it in
+"sources".
+
+Usage:
+    from detection_merge import merge_detections
+
+    merged = merge_detections(cv_detections, ml_detections, merge_iou=0.3)
+"""
+
+from typing import Dict, List
+
+import numpy as np
+
+from geometry import door_box, room_box, segments_intersect_box
+from nms import box_iou
+
+
+def match_boxes(primary: np.ndarray, secondary: np.ndarray, threshold: float) -> np.ndarray:
+    """Index of the best-overlapping primary box for each secondary box, -1 if none exceeds `threshold`."""
+    matches = np.full(len(secondary), -1, dtype=np.int64)
+    if len(primary) == 0:
+        return matches
+    for k, box in enumerate(secondary):
+        iou = box_iou(box, primary)
+        best = int(np.argmax(iou))
+        if iou[best] > threshold:
+            matches[k] = best
+    return matches
+
+
+def _merge_boxed(cv_items: List[Dict], ml_items: List[Dict], box, threshold: float) -> List[Dict]:
+    """Merge rooms or doors: confirm matched unified items, append unmatched ML ones."""
+    cv_boxes = np.array([box(item) for item in cv_items], dtype=np.float64).reshape(-1, 4)
+    ml_boxes = np.array([box(item) for item in ml_items], dtype=np.float64).reshape(-1, 4)
+    matches = match_boxes(cv_boxes, ml_boxes, threshold)
+
+    # Most confident ML match per unified item
+    confirmed: Dict[int, Dict] = {}
+    for ml_item, match in zip(ml_items, matches.tolist()):
+        if match >= 0 and ml_item.get("confidence", 0) > confirmed.get(match, {}).get("confidence", -1):
+            confirmed[match] = ml_item
+
+    merged = []
+    for i, item in enumerate(cv_items):
+        ml_item = confirmed.get(i)
+        if ml_item is None:
+            merged.append({**item, "sources": ["cv"]})
+            continue
+        extra = {"confidence": ml_item.get("confidence", 0)}
+        if "class" in ml_item and "class" not in item:
+            extra["class"] = ml_item["class"]
+        merged.append({**item, **extra, "sources": ["cv", "ml"]})
+
+    for ml_item, match in zip(ml_items, matches.tolist()):
+        if match < 0:
+            merged.append({**ml_item, "id": f"ml_{ml_item['id']}", "sources": ["ml"]})
+    return merged
+
+
+def merge_walls(cv_walls: List[Dict], ml_walls: List[Dict]) -> List[Dict]:
+    """Unified wall segments plus ML wall boxes that no unified segment passes through."""
+    merged = [{**wall, "sources": ["cv"]} for wall in cv_walls]
+    segments = np.array([
+        [w["position"]["start"]["x"], w["position"]["start"]["y"],
+         w["position"]["end"]["x"], w["position"]["end"]["y"]]
+        for w in cv_walls
+    ], dtype=np.float64).reshape(-1, 4)
+
+    for wall in ml_walls:
+        if len(segments) and segments_intersect_box(segments, room_box(wall)).any():
+            continue
+        merged.append({**wall, "id": f"ml_{wall['id']}", "sources": ["ml"]})
+    return merged
+
+
+def merge_detections(cv: Dict[str, List[Dict]], ml: Dict[str, List[Dict]],
+                     merge_iou: float = 0.3) -> Dict[str, List[Dict]]:
+    """
+    Merge unified and ML rooms, doors and walls.
+
+    Args:
+        cv: Unified detections (missing keys count as empty)
+        ml: ML detections in the /detect-roboflow format
+        merge_iou: IoU above which an ML room or door is the same object as
+            a unified one
+
+    Returns:
+        Dict with merged "rooms", "doors" and "walls"
+    """
+    return {
+        "rooms": _merge_boxed(cv.get("rooms", []), ml.get("rooms", []), room_box, merge_iou),
+        "doors": _merge_boxed(cv.get("doors", []), ml.get("doors", []), door_box, merge_iou),
+        "walls": merge_walls(cv.get("walls", []), ml.get("walls", [])),
+    }
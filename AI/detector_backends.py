@@ -0,0 +1,326 @@
+"""
+Detector Backends
+
+Pluggable object detectors for the ML side of the pipeline. A backend takes
+a BGR image and returns Roboflow-style prediction dicts (center x/y, width,
+height, confidence, class), so its output can go straight into
+process_roboflow_result or the /detect-roboflow post-processing.
+
+OnnxDetectorBackend runs an exported YOLO-style model locally on the CPU
+with ONNX Runtime: letterboxed input of a configurable size, optional
+tiling for plans much larger than the model input, a bounded thread count
+and optional INT8 dynamic quantization.
+
+Usage:
+    from detector_backends import OnnxDetectorBackend
+
+    backend = OnnxDetectorBackend("weights/floorplan.onnx",
+                                  class_names=["door", "room", "wall"],
+                                  input_size=640, tile="auto", threads=4)
+    predictions = backend.predict(image, confidence=0.4, overlap=0.3)
+    result = process_roboflow_result({"predictions": predictions}, w, h)
+
+Environment Variables (see backend_from_env):
+    DETECTOR_BACKEND - "roboflow" (default) or "onnx"
+    ONNX_MODEL_PATH - Exported model file
+    ONNX_CLASSES - Comma-separated class names in model output order
+    ONNX_INPUT_SIZE - Square model input size (default: 640)
+    ONNX_TILE - "auto" (default), "on" or "off"
+    ONNX_TILE_OVERLAP - Overlap between tiles as a fraction in [0, 1) (default: 0.2)
+    ONNX_THREADS - ONNX Runtime intra-op threads (default: 4)
+    ONNX_INT8 - Use an INT8-quantized copy of the model (default: false)
+"""
+
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from nms import nms_indices
+
+try:
+    import onnxruntime as ort
+    ONNX_AVAILABLE = True
+except ImportError:
+    ort = None
+    ONNX_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class DetectorBackend(ABC):
+    """
+    Interface of an object detector backend.
+
+    Subclasses implement predict(); cache_params() identifies the model and
+    settings so cached results are invalidated when either changes.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def predict(self, image: np.ndarray, confidence: float = 0.4,
+                overlap: float = 0.3) -> List[Dict[str, Any]]:
+        """
+        Detect objects in a BGR image.
+
+        Args:
+            image: BGR image
+            confidence: Minimum confidence (0-1)
+            overlap: NMS IoU threshold (0-1)
+
+        Returns:
+            Prediction dicts with x, y (box center), width, height,
+            confidence, class and class_id, in image pixels
+        """
+
+    def cache_params(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+def letterbox(image: np.ndarray, size: int) -> Tuple[np.ndarray, float, int, int]:
+    """
+    Resize keeping the aspect ratio and pad to a size x size square.
+
+    Returns:
+        (padded image, scale, pad_x, pad_y); a model coordinate c maps back
+        to image coordinates as (c - pad) / scale
+    """
+    h, w = image.shape[:2]
+    scale = min(size / w, size / h)
+    new_w, new_h = max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+    resized = cv2.resize(image, (new_w, new_h),
+                         interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+    padded = cv2.copyMakeBorder(resized, pad_y, size - new_h - pad_y, pad_x, size - new_w - pad_x,
+                                cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return padded, scale, pad_x, pad_y
+
+
+def tile_origins(length: int, tile: int, overlap: float) -> List[int]:
+    """Start offsets of overlapping tiles covering [0, length); overlap is in [0, 1)."""
+    if not 0.0 <= overlap < 1.0:
+        raise ValueError("tile overlap must be at least 0 and below 1")
+    if length <= tile:
+        return [0]
+    step = max(1, int(tile * (1.0 - overlap)))
+    origins = list(range(0, length - tile, step))
+    origins.append(length - tile)
+    return origins
+
+
+class OnnxDetectorBackend(DetectorBackend):
+    """
+    Local CPU detector running an ONNX model with ONNX Runtime.
+
+    The model takes one (1, 3, S, S) float32 RGB image scaled to 0-1 and
+    returns YOLO-style rows of cx, cy, w, h followed by either per-class
+    scores (YOLOv8 layout) or an objectness score and per-class scores
+    (YOLOv5 layout); either orientation of the output matrix is accepted.
+
+    Args:
+        model_path: ONNX model file
+        class_names: Class names in model output order
+        input_size: Square model input size S
+        tile: "auto" tiles images larger than 1.5 x S, "on" always tiles,
+            "off" never does; tiled runs also include one whole-image pass
+            so large rooms are not cut up
+        tile_overlap: Overlap between neighbouring tiles, a fraction in [0, 1)
+        threads: ONNX Runtime intra-op thread count
+        int8: Run an INT8 dynamically quantized copy of the model, created
+            next to the model file on first use
+        session: Preconfigured inference session (skips model loading)
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path: str, class_names: Sequence[str], input_size: int = 640,
+                 tile: str = "auto", tile_overlap: float = 0.2, threads: int = 4,
+                 int8: bool = False, session: Any = None):
+        if tile not in ("auto", "on", "off"):
+            raise ValueError("tile must be 'auto', 'on' or 'off'")
+        if not 0.0 <= tile_overlap < 1.0:
+            raise ValueError("tile_overlap must be at least 0 and below 1")
+        self.model_path = model_path
+        self.class_names = list(class_names)
+        self.input_size = int(input_size)
+        self.tile = tile
+        self.tile_overlap = float(tile_overlap)
+        self.threads = int(threads)
+        self.int8 = int8
+
+        if session is None:
+            session = self._create_session()
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+
+    def _create_session(self):
+        if not ONNX_AVAILABLE:
+            raise RuntimeError("onnxruntime is not installed. Install with: pip install onnxruntime")
+
+        path = self.model_path
+        if self.int8:
+            path = quantized_model_path(self.model_path)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        logger.info(f"Loading ONNX model {path} ({self.threads} threads)")
+        return ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+    def cache_params(self) -> Dict[str, Any]:
+        try:
+            mtime = os.path.getmtime(self.model_path)
+        except OSError:
+            mtime = None
+        return {
+            "backend": self.name,
+            "model": os.path.basename(self.model_path),
+            "modelMtime": mtime,
+            "inputSize": self.input_size,
+            "tile": self.tile,
+            "tileOverlap": self.tile_overlap,
+            "int8": self.int8
+        }
+
+    def _run(self, image: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """One model pass; returns (N, 4) x1, y1, x2, y2 boxes, scores and class ids."""
+        padded, scale, pad_x, pad_y = letterbox(image, self.input_size)
+        blob = cv2.cvtColor(padded, cv2.COLOR_BGR2RGB).astype(np.float32) / 255.0
+        blob = np.ascontiguousarray(blob.transpose(2, 0, 1)[None])
+
+        output = np.asarray(self.session.run(None, {self.input_name: blob})[0], dtype=np.float32)
+        rows = output.reshape(output.shape[-2], output.shape[-1]) if output.ndim == 3 else output
+        num_classes = len(self.class_names)
+        if rows.shape[1] not in (4 + num_classes, 5 + num_classes):
+            rows = rows.T
+        if rows.shape[1] == 5 + num_classes:
+            class_scores = rows[:, 5:] * rows[:, 4:5]
+        elif rows.shape[1] == 4 + num_classes:
+            class_scores = rows[:, 4:]
+        else:
+            raise ValueError(f"Unexpected model output shape {output.shape} "
+                             f"for {num_classes} classes")
+
+        class_ids = np.argmax(class_scores, axis=1)
+        scores = class_scores[np.arange(len(rows)), class_ids]
+        cx, cy, w, h = (rows[:, k] for k in range(4))
+        boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+        boxes[:, [0, 2]] = (boxes[:, [0, 2]] - pad_x) / scale
+        boxes[:, [1, 3]] = (boxes[:, [1, 3]] - pad_y) / scale
+        return boxes, scores, class_ids
+
+    def _use_tiles(self, width: int, height: int) -> bool:
+        if self.tile == "on":
+            return True
+        if self.tile == "off":
+            return False
+        return max(width, height) > 1.5 * self.input_size
+
+    def predict(self, image: np.ndarray, confidence: float = 0.4,
+                overlap: float = 0.3) -> List[Dict[str, Any]]:
+        h, w = image.shape[:2]
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+        passes = [(0, 0, image)]
+        if self._use_tiles(w, h):
+            size = self.input_size
+            for y0 in tile_origins(h, size, self.tile_overlap):
+                for x0 in tile_origins(w, size, self.tile_overlap):
+                    passes.append((x0, y0, image[y0:y0 + size, x0:x0 + size]))
+
+        all_boxes, all_scores, all_classes = [], [], []
+        for x0, y0, crop in passes:
+            boxes, scores, class_ids = self._run(crop)
+            keep = scores >= confidence
+            if crop is not image:
+                # Objects cut by a tile edge inside the image are left to the
+                # neighbouring tile or the whole-image pass
+                ch, cw = crop.shape[:2]
+                margin = 2
+                keep &= (x0 == 0) | (boxes[:, 0] > margin)
+                keep &= (y0 == 0) | (boxes[:, 1] > margin)
+                keep &= (x0 + cw >= w) | (boxes[:, 2] < cw - margin)
+                keep &= (y0 + ch >= h) | (boxes[:, 3] < ch - margin)
+            all_boxes.append(boxes[keep] + np.array([x0, y0, x0, y0], dtype=np.float32))
+            all_scores.append(scores[keep])
+            all_classes.append(class_ids[keep])
+
+        boxes = np.concatenate(all_boxes).astype(np.float64)
+        scores = np.concatenate(all_scores).astype(np.float64)
+        class_ids = np.concatenate(all_classes)
+        if len(boxes) == 0:
+            return []
+
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+        keep, kept_scores = nms_indices(boxes, scores, overlap, classes=class_ids)
+
+        predictions = []
+        for k, score in zip(keep.tolist(), kept_scores.tolist()):
+            x1, y1, x2, y2 = boxes[k]
+            class_id = int(class_ids[k])
+            predictions.append({
+                "x": float((x1 + x2) / 2),
+                "y": float((y1 + y2) / 2),
+                "width": float(x2 - x1),
+                "height": float(y2 - y1),
+                "confidence": float(score),
+                "class": self.class_names[class_id],
+                "class_id": class_id
+            })
+        return predictions
+
+
+def quantized_model_path(model_path: str) -> str:
+    """
+    Path of the INT8 dynamically quantized copy of a model, creating it on
+    first use. A model whose name already ends in .int8.onnx is used as is.
+    """
+    if model_path.endswith(".int8.onnx"):
+        return model_path
+    quantized = os.path.splitext(model_path)[0] + ".int8.onnx"
+    if not os.path.exists(quantized) or os.path.getmtime(quantized) < os.path.getmtime(model_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        logger.info(f"Quantizing {model_path} to INT8")
+        quantize_dynamic(model_path, quantized, weight_type=QuantType.QInt8)
+    return quantized
+
+
+def backend_from_env() -> Optional[DetectorBackend]:
+    """
+    Build the detector backend selected by DETECTOR_BACKEND.
+
+    Returns:
+        An OnnxDetectorBackend for "onnx", or None for the default Roboflow
+        backend (or when the local model cannot be loaded)
+    """
+    choice = os.getenv("DETECTOR_BACKEND", "roboflow").lower()
+    if choice != "onnx":
+        return None
+
+    model_path = os.getenv("ONNX_MODEL_PATH")
+    classes = [c.strip() for c in os.getenv("ONNX_CLASSES", "").split(",") if c.strip()]
+    if not model_path or not classes:
+        logger.error("DETECTOR_BACKEND=onnx needs ONNX_MODEL_PATH and ONNX_CLASSES")
+        return None
+
+    try:
+        return OnnxDetectorBackend(
+            model_path,
+            class_names=classes,
+            input_size=int(os.getenv("ONNX_INPUT_SIZE", "640")),
+            tile=os.getenv("ONNX_TILE", "auto").lower(),
+            tile_overlap=float(os.getenv("ONNX_TILE_OVERLAP", "0.2")),
+            threads=int(os.getenv("ONNX_THREADS", "4")),
+            int8=os.getenv("ONNX_INT8", "false").lower() in ("1", "true", "yes")
+        )
+    except Exception as e:
+        logger.error(f"Failed to load ONNX detector backend: {e}")
+        return None
@@ -0,0 +1,186 @@
+"""
+Floor Spatial Index
+
+Per-floor spatial index over a unified detection result, for tap-to-locate
+("which room is this point in") and viewport ("which rooms, doors and walls
+intersect this rectangle") queries. Rooms, doors and walls are held in
+grid-hash box indexes; point-in-room lookups read the room label raster
+when the detections carry one. The floor's navigation graph gets a segment
+index for snapping points onto it (pathfinder.snap_to_graph).
+
+Indexes live in a small in-memory LRU keyed by floor id. The floor id is
+the result cache key of the detection, so a worker process that has not
+seen a floor yet rebuilds its index from the shared result cache.
+
+Usage:
+    from floor_index import FloorRegistry
+
+    floors = FloorRegistry(cache=result_cache, max_floors=32)
+    floors.register(floor_id, {"detections": ..., "navigationGraph": ...})
+    index = floors.get(floor_id)
+    room = index.locate(120.0, 340.0)
+    hits = index.query_bbox(0, 0, 500, 500)
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from geometry import door_box, room_box, segments_intersect_box
+from pathfinder import EdgeIndex
+from unified_detector import decode_label_raster
+from utils.spatial import BoxIndex
+
+logger = logging.getLogger(__name__)
+
+QUERY_TYPES = ("rooms", "doors", "walls")
+
+
+class FloorIndex:
+    """
+    Spatial index over one floor's detections.
+
+    Args:
+        detections: The "detections" dict of a unified detection result
+        graph: The floor's navigation graph
+    """
+
+    def __init__(self, detections: Dict[str, Any], graph: Optional[Dict[str, Any]] = None):
+        self.detections = detections
+        self.graph = graph or {"nodes": [], "edges": []}
+        self.rooms: List[Dict] = detections.get("rooms", [])
+        self.doors: List[Dict] = detections.get("doors", [])
+        self.walls: List[Dict] = detections.get("walls", [])
+
+        self.room_index = BoxIndex([room_box(r) for r in self.rooms])
+        self.room_areas = ((self.room_index.boxes[:, 2] - self.room_index.boxes[:, 0]) *
+                           (self.room_index.boxes[:, 3] - self.room_index.boxes[:, 1]))
+        self.door_index = BoxIndex([door_box(d) for d in self.doors])
+
+        self.wall_segments = np.array([
+            (w["position"]["start"]["x"], w["position"]["start"]["y"],
+             w["position"]["end"]["x"], w["position"]["end"]["y"])
+            for w in self.walls
+        ], dtype=np.float64).reshape(-1, 4)
+        self.wall_index = BoxIndex(np.c_[
+            np.minimum(self.wall_segments[:, 0], self.wall_segments[:, 2]),
+            np.minimum(self.wall_segments[:, 1], self.wall_segments[:, 3]),
+            np.maximum(self.wall_segments[:, 0], self.wall_segments[:, 2]),
+            np.maximum(self.wall_segments[:, 1], self.wall_segments[:, 3])
+        ])
+
+        self._edge_index = None
+
+        # The raster numbers rooms by position in the detected room list
+        self.labels = None
+        self.label_scale = 1.0
+        raster = detections.get("roomLabels")
+        if raster:
+            try:
+                labels, scale = decode_label_raster(raster)
+                if labels.max() <= len(self.rooms):
+                    self.labels, self.label_scale = labels, scale
+            except (KeyError, ValueError) as e:
+                logger.warning(f"Ignoring room label raster: {e}")
+
+    @property
+    def edge_index(self) -> EdgeIndex:
+        """Segment index over the navigation graph's edges, built on first use."""
+        if self._edge_index is None:
+            self._edge_index = EdgeIndex(self.graph)
+        return self._edge_index
+
+    def locate(self, x: float, y: float) -> Optional[Dict]:
+        """
+        Room containing (x, y), or None.
+
+        Uses the room label raster when available; otherwise the smallest
+        room whose bbox contains the point.
+        """
+        if self.labels is not None:
+            col = int(np.floor(x * self.label_scale))
+            row = int(np.floor(y * self.label_scale))
+            h, w = self.labels.shape[:2]
+            if not (0 <= row < h and 0 <= col < w):
+                return None
+            k = int(self.labels[row, col])
+            return self.rooms[k - 1] if k > 0 else None
+
+        found = self.room_index.containing(x, y)
+        if len(found) == 0:
+            return None
+        return self.rooms[int(found[np.argmin(self.room_areas[found])])]
+
+    def query_bbox(self, x1: float, y1: float, x2: float, y2: float,
+                   types: Sequence[str] = QUERY_TYPES) -> Dict[str, List[Dict]]:
+        """
+        Rooms, doors and walls intersecting the x1, y1, x2, y2 rectangle.
+
+        Rooms and doors are matched by their boxes; walls by their actual
+        segment.
+        """
+        x1, x2 = min(x1, x2), max(x1, x2)
+        y1, y2 = min(y1, y2), max(y1, y2)
+        result = {}
+        if "rooms" in types:
+            result["rooms"] = [self.rooms[i] for i in self.room_index.intersecting(x1, y1, x2, y2)]
+        if "doors" in types:
+            result["doors"] = [self.doors[i] for i in self.door_index.intersecting(x1, y1, x2, y2)]
+        if "walls" in types:
+            found = self.wall_index.intersecting(x1, y1, x2, y2)
+            if len(found):
+                found = found[segments_intersect_box(self.wall_segments[found], (x1, y1, x2, y2))]
+            result["walls"] = [self.walls[i] for i in found]
+        return result
+
+
+class FloorRegistry:
+    """
+    LRU of FloorIndex objects keyed by floor id, backed by the result cache.
+
+    Args:
+        cache: Optional ResultCache holding detection results by floor id
+        max_floors: Number of floor indexes kept in memory
+    """
+
+    def __init__(self, cache=None, max_floors: int = 32):
+        self.cache = cache
+        self.max_floors = max_floors
+        self._floors: "OrderedDict[str, FloorIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, floor_id: str, result: Dict[str, Any]) -> FloorIndex:
+        """Index a detection result ({"detections", "navigationGraph"}) under floor_id."""
+        index = FloorIndex(result["detections"], result.get("navigationGraph"))
+        with self._lock:
+            self._floors[floor_id] = index
+            self._floors.move_to_end(floor_id)
+            while len(self._floors) > self.max_floors:
+                self._floors.popitem(last=False)
+        return index
+
+    def get(self, floor_id: str, load: bool = True) -> Optional[FloorIndex]:
+        """
+        Index for floor_id, or None if it is unknown.
+
+        Args:
+            floor_id: Floor id returned by a detection endpoint
+            load: Rebuild the index from the result cache when it is not in
+                memory (reads and parses the cached result)
+        """
+        with self._lock:
+            index = self._floors.get(floor_id)
+            if index is not None:
+                self._floors.move_to_end(floor_id)
+                return index
+
+        if not load or self.cache is None:
+            return None
+        result = self.cache.get(floor_id)
+        if result is None or "detections" not in result:
+            return None
+        logger.info(f"Rebuilding spatial index for floor {floor_id[:12]} from the result cache")
+        return self.register(floor_id, result)
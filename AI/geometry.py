@@ -0,0 +1,75 @@
+"""
+Detection Geometry
+
+Box and segment helpers shared by the spatial index and detection merging:
+the axis-aligned box of a room or wall detection, the box a door's swing
+covers, and vectorized segment/box and segment/segment intersection
+tests. Only depends on numpy, so ML-only deployments can use it without
+the unified detector.
+
+Usage:
+    from geometry import door_box, room_box, segments_intersect_box, wall_segments
+
+    x1, y1, x2, y2 = room_box(room)
+    hits = segments_intersect_box(wall_segments(walls), room_box(room))
+"""
+
+from typing import Dict, Sequence
+
+import numpy as np
+
+
+def room_box(room: Dict) -> tuple:
+    start, end = room["position"]["start"], room["position"]["end"]
+    return (min(start["x"], end["x"]), min(start["y"], end["y"]),
+            max(start["x"], end["x"]), max(start["y"], end["y"]))
+
+
+def door_box(door: Dict) -> tuple:
+    """Square around the hinge covering the door's swing."""
+    x, y, r = door["hinge"]["x"], door["hinge"]["y"], door.get("width", 0)
+    return (x - r, y - r, x + r, y + r)
+
+
+def segments_intersect_box(segments: np.ndarray, box: Sequence[float]) -> np.ndarray:
+    """
+    Which (N, 4) x1, y1, x2, y2 segments touch an x1, y1, x2, y2 box
+    (Liang-Barsky clipping, vectorized over the segments).
+    """
+    x, y = segments[:, 0], segments[:, 1]
+    dx, dy = segments[:, 2] - x, segments[:, 3] - y
+    t0 = np.zeros(len(segments))
+    t1 = np.ones(len(segments))
+    hit = np.ones(len(segments), dtype=bool)
+    for p, q in ((-dx, x - box[0]), (dx, box[2] - x), (-dy, y - box[1]), (dy, box[3] - y)):
+        parallel = p == 0
+        hit &= ~(parallel & (q < 0))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = np.where(parallel, 0.0, q / np.where(parallel, 1.0, p))
+        t0 = np.where(~parallel & (p < 0), np.maximum(t0, r), t0)
+        t1 = np.where(~parallel & (p > 0), np.minimum(t1, r), t1)
+    return hit & (t0 <= t1)
+
+
+def wall_segments(walls: Sequence[Dict]) -> np.ndarray:
+    """(N, 4) x1, y1, x2, y2 array of wall detections' start and end points."""
+    return np.array([
+        [w["position"]["start"]["x"], w["position"]["start"]["y"],
+         w["position"]["end"]["x"], w["position"]["end"]["y"]]
+        for w in walls
+    ], dtype=np.float64).reshape(-1, 4)
+
+
+def segments_cross_segment(segments: np.ndarray, p1: Dict, p2: Dict) -> np.ndarray:
+    """
+    Which (N, 4) x1, y1, x2, y2 segments properly cross the segment p1-p2
+    (orientation test, vectorized over the segments; touching does not count).
+    """
+    ax, ay, bx, by = p1["x"], p1["y"], p2["x"], p2["y"]
+    cx, cy, dx, dy = segments[:, 0], segments[:, 1], segments[:, 2], segments[:, 3]
+
+    def ccw(px, py, qx, qy, rx, ry):
+        return (ry - py) * (qx - px) > (qy - py) * (rx - px)
+
+    return ((ccw(ax, ay, cx, cy, dx, dy) != ccw(bx, by, cx, cy, dx, dy)) &
+            (ccw(ax, ay, bx, by, cx, cy) != ccw(ax, ay, bx, by, dx, dy)))
@@ -0,0 +1,170 @@
+"""
+Upload Image Helpers
+
+Reads PNG and JPEG dimensions from the file header instead of decoding
+the whole image, and prepares uploads for hosted inference: the original
+bytes are passed through unchanged unless the image is larger than the
+model needs, in which case it is decoded once (at a reduced JPEG scale
+where possible), downscaled and re-encoded. Predictions made on a
+downscaled upload are mapped back to original image coordinates with
+rescale_predictions.
+
+Usage:
+    from image_io import prepare_upload, rescale_predictions
+
+    data, (width, height), scale = prepare_upload(contents, max_side=1280)
+    result = rescale_predictions(result, scale)
+"""
+
+import struct
+from typing import Any, Optional, Tuple
+
+import cv2
+import numpy as np
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# JPEG start-of-frame markers (all SOFn except DHT, JPG and DAC)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# Reduced-resolution JPEG decode flags by scale denominator
+REDUCED_DECODE_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+
+def _exif_orientation(segment: bytes) -> int:
+    """EXIF orientation tag (1-8) from an APP1 segment payload, 1 if absent."""
+    if not segment.startswith(b"Exif\x00\x00"):
+        return 1
+    tiff = segment[6:]
+    if tiff[:2] == b"II":
+        endian = "<"
+    elif tiff[:2] == b"MM":
+        endian = ">"
+    else:
+        return 1
+    try:
+        ifd = struct.unpack(endian + "I", tiff[4:8])[0]
+        count = struct.unpack(endian + "H", tiff[ifd:ifd + 2])[0]
+        for k in range(count):
+            entry = ifd + 2 + 12 * k
+            tag = struct.unpack(endian + "H", tiff[entry:entry + 2])[0]
+            if tag == 0x0112:
+                return struct.unpack(endian + "H", tiff[entry + 8:entry + 10])[0]
+    except struct.error:
+        pass
+    return 1
+
+
+def probe_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    (width, height) of a PNG or JPEG from its header, or None.
+
+    JPEG dimensions follow the EXIF orientation the way cv2.imdecode
+    applies it, so a rotated photo reports its displayed size.
+    """
+    if data[:8] == PNG_SIGNATURE and data[12:16] == b"IHDR" and len(data) >= 24:
+        width, height = struct.unpack(">II", data[16:24])
+        return int(width), int(height)
+
+    if data[:2] != b"\xff\xd8":
+        return None
+    orientation = 1
+    i = 2
+    while i + 4 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            i += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            # End of image or start of scan before any frame header
+            return None
+        length = struct.unpack(">H", data[i + 2:i + 4])[0]
+        if marker == 0xE1 and orientation == 1:
+            orientation = _exif_orientation(data[i + 4:i + 2 + length])
+        if marker in JPEG_SOF_MARKERS:
+            if i + 9 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            if orientation in (5, 6, 7, 8):
+                width, height = height, width
+            return int(width), int(height)
+        i += 2 + length
+    return None
+
+
+def prepare_upload(
+    contents: bytes,
+    max_side: int = 0,
+    quality: int = 90
+) -> Tuple[bytes, Tuple[int, int], float]:
+    """
+    Bytes to send upstream, the original (width, height), and the scale
+    applied to the sent image.
+
+    Images whose longer side fits in `max_side` (or any image when
+    `max_side` is 0) are returned unchanged with scale 1.0. Larger images
+    are downscaled to `max_side` with area interpolation and re-encoded as
+    JPEG; JPEGs are decoded at a reduced scale when that still leaves at
+    least `max_side` pixels.
+
+    Raises:
+        ValueError: The image cannot be decoded
+    """
+    size = probe_dimensions(contents)
+    image = None
+    if size is None:
+        # Not a PNG/JPEG header we understand; decode to find the size
+        image = cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Could not decode image")
+        size = (image.shape[1], image.shape[0])
+
+    width, height = size
+    longest = max(width, height)
+    if not max_side or longest <= max_side:
+        return contents, size, 1.0
+
+    if image is None:
+        flag = cv2.IMREAD_COLOR
+        if contents[:2] == b"\xff\xd8":
+            flag = next((f for d, f in REDUCED_DECODE_FLAGS if longest / d >= max_side), flag)
+        image = cv2.imdecode(np.frombuffer(contents, np.uint8), flag)
+        if image is None:
+            raise ValueError("Could not decode image")
+
+    scale = max_side / longest
+    target = (max(int(round(width * scale)), 1), max(int(round(height * scale)), 1))
+    resized = cv2.resize(image, target, interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode(".jpg", resized, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Could not encode image")
+    return buffer.tobytes(), size, scale
+
+
+def rescale_predictions(result: Any, scale: float) -> Any:
+    """
+    Map box predictions made on an image scaled by `scale` back to the
+    original image. Walks nested workflow outputs and divides x, y, width
+    and height of every prediction dict; other fields are kept.
+    """
+    if scale == 1.0:
+        return result
+    if isinstance(result, list):
+        return [rescale_predictions(item, scale) for item in result]
+    if not isinstance(result, dict):
+        return result
+    rescaled = {key: rescale_predictions(value, scale) for key, value in result.items()}
+    if all(isinstance(result.get(k), (int, float)) for k in ("x", "y", "width", "height")):
+        for k in ("x", "y", "width", "height"):
+            rescaled[k] = result[k] / scale
+    return rescaled
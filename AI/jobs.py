@@ -0,0 +1,333 @@
+"""
+Asynchronous Detection Jobs
+
+Runs the unified detection pipeline on a bounded pool of worker processes
+so uploads never block the API event loop. Each job reports per-stage
+progress back to the API process and keeps its result for a TTL after it
+finishes, so a client that disconnects can still collect it later. Jobs
+submitted with a listener also receive each stage's output as soon as the
+worker produces it, which backs the streaming detection endpoint. If a
+worker dies (crash, OOM kill) the broken pool is replaced on the next
+submit.
+
+Usage:
+    from jobs import JobManager
+
+    manager = JobManager(max_workers=2, max_queue=8, ttl_seconds=900)
+    job = manager.submit(contents, filename="floor1.png")
+    status = manager.get(job["jobId"])
+"""
+
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from unified_detector import PIPELINE_STAGES, process_floor_plan_bytes
+
+logger = logging.getLogger(__name__)
+
+# Progress queue handed to every worker process by the pool initializer
+_progress_queue = None
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has reached its depth limit."""
+
+
+def _init_worker(progress_queue) -> None:
+    """Process pool initializer: remember the shared progress queue."""
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def _run_detection_job(job_id: str, contents: bytes, stream: bool = False) -> Dict[str, Any]:
+    """Worker entry point: run detection and report each finished stage."""
+    def report(stage: str, output: Dict[str, Any]) -> None:
+        if _progress_queue is not None:
+            # Stage outputs are only shipped back when someone is streaming them
+            _progress_queue.put((job_id, stage, output if stream else None))
+
+    result = process_floor_plan_bytes(contents, on_stage=report)
+    return {"success": True, **result}
+
+
+def replay_stages(result: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Split a finished detection result into the (stage, output) events a live
+    job would have produced, e.g. to stream a cached result.
+    """
+    detections = result["detections"]
+    yield "preprocess", {"imageSize": detections["imageSize"],
+                         "processing": detections.get("processing", {})}
+    for stage in ("walls", "rooms", "doors", "hallways", "stairs"):
+        yield stage, {stage: detections.get(stage, [])}
+    yield "ocr", {"texts": detections.get("texts", []), "rooms": detections.get("rooms", [])}
+    yield "graph", {"navigationGraph": result["navigationGraph"]}
+
+
+class JobManager:
+    """
+    Bounded detection job queue backed by a process pool.
+
+    Args:
+        max_workers: Number of worker processes
+        max_queue: Jobs allowed to wait beyond the ones being processed
+        ttl_seconds: How long finished jobs (and their results) are kept
+        cache: Optional ResultCache filled with the results of successful jobs
+    """
+
+    def __init__(self, max_workers: int = 2, max_queue: int = 8,
+                 ttl_seconds: float = 900, cache=None):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.ttl_seconds = ttl_seconds
+        self.cache = cache
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._listeners: Dict[str, Callable[[str, Dict[str, Any]], None]] = {}
+        # Cache hits share one job record per cache key
+        self._cached_jobs: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._progress_queue = None
+        self._drain_thread = None
+
+    def _ensure_started(self) -> None:
+        """Start the worker pool and progress reader on first use."""
+        if self._progress_queue is None:
+            self._progress_queue = multiprocessing.Queue()
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(self._progress_queue,)
+            )
+        if self._drain_thread is None:
+            self._drain_thread = threading.Thread(target=self._drain_progress, daemon=True)
+            self._drain_thread.start()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """The worker pool, started on first use; shared with direct detection calls."""
+        with self._lock:
+            self._ensure_started()
+            return self._executor
+
+    def _restart_executor(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Replace `broken` with a fresh pool unless another thread already did."""
+        with self._lock:
+            if self._executor is broken:
+                logger.warning("Detection worker pool is broken, starting a new one")
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+                self._ensure_started()
+            return self._executor
+
+    def submit_call(self, fn: Callable, *args) -> Future:
+        """
+        Run a picklable module-level function on the worker pool.
+
+        A pool broken by a dead worker is replaced and the call retried once.
+        """
+        executor = self.executor
+        try:
+            return executor.submit(fn, *args)
+        except BrokenProcessPool:
+            return self._restart_executor(executor).submit(fn, *args)
+
+    def _drain_progress(self) -> None:
+        """Apply stage reports from worker processes to job records."""
+        while True:
+            message = self._progress_queue.get()
+            if message is None:
+                return
+            job_id, stage, output = message
+            with self._lock:
+                listener = self._listeners.get(job_id)
+                job = self._jobs.get(job_id)
+                if job is not None and job["finishedAt"] is None:
+                    job["status"] = "running"
+                    job["stage"] = stage
+                    if stage not in job["completedStages"]:
+                        job["completedStages"].append(stage)
+            if listener is not None and output is not None:
+                self._notify(job_id, listener, stage, output)
+
+    def _notify(self, job_id: str, listener: Callable, stage: str,
+                output: Dict[str, Any]) -> None:
+        """Deliver a stage event, dropping the listener after the last one."""
+        if stage in ("graph", "error"):
+            with self._lock:
+                self._listeners.pop(job_id, None)
+        try:
+            listener(stage, output)
+        except Exception as e:
+            logger.warning(f"Stage listener for job {job_id} failed: {e}")
+
+    def _active_count(self) -> int:
+        return sum(1 for job in self._jobs.values() if job["status"] in ("queued", "running"))
+
+    def _expire(self) -> None:
+        """Drop finished jobs whose TTL has passed. Caller holds the lock."""
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finishedAt"] is not None and now - job["finishedAt"] > self.ttl_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+            self._listeners.pop(job_id, None)
+        for cache_key in [k for k, job_id in self._cached_jobs.items() if job_id not in self._jobs]:
+            del self._cached_jobs[cache_key]
+
+    def _new_job(self, filename: Optional[str]) -> Dict[str, Any]:
+        job = {
+            "jobId": uuid.uuid4().hex,
+            "status": "queued",
+            "stage": None,
+            "completedStages": [],
+            "filename": filename,
+            "createdAt": time.time(),
+            "finishedAt": None,
+            "cached": False,
+            "result": None,
+            "error": None
+        }
+        self._jobs[job["jobId"]] = job
+        return job
+
+    def submit(self, contents: bytes, filename: str = None, cache_key: str = None,
+               listener: Callable[[str, Dict[str, Any]], None] = None,
+               cached: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Queue a detection job.
+
+        Args:
+            contents: Encoded image bytes
+            filename: Original upload name (informational)
+            cache_key: Result cache key the result is stored under. Results
+                carry it as "floorId", the id spatial queries take.
+            listener: Optional callback receiving (stage, output) for every
+                stage, ending with "graph" or "error". It runs on a
+                background thread and is not called for cache hits; use
+                replay_stages on the job result instead.
+            cached: The result already cached under cache_key, if any; the
+                caller reads it (off the event loop) so submit never blocks
+                on the disk. A hit completes the job immediately, reusing
+                the cache key's existing job record while it lasts.
+
+        Returns:
+            The job's public status dict
+
+        Raises:
+            QueueFullError: If max_workers + max_queue jobs are already pending
+        """
+        with self._lock:
+            self._expire()
+
+            if cached is not None:
+                job = self._jobs.get(self._cached_jobs.get(cache_key))
+                if job is None:
+                    job = self._new_job(filename)
+                    job.update({
+                        "status": "done",
+                        "completedStages": list(PIPELINE_STAGES),
+                        "cached": True,
+                        "result": {**cached, "floorId": cache_key}
+                    })
+                    self._cached_jobs[cache_key] = job["jobId"]
+                job["finishedAt"] = time.time()
+                return self._public(job)
+
+            if self._active_count() >= self.max_workers + self.max_queue:
+                raise QueueFullError("Detection queue is full, try again later")
+
+            job = self._new_job(filename)
+            job_id = job["jobId"]
+            if listener is not None:
+                self._listeners[job_id] = listener
+
+        try:
+            future = self.submit_call(_run_detection_job, job_id, contents, listener is not None)
+        except Exception:
+            # Do not leave a queued job behind that no worker will ever run
+            with self._lock:
+                self._jobs.pop(job_id, None)
+                self._listeners.pop(job_id, None)
+            raise
+        future.add_done_callback(lambda f: self._finish(job_id, cache_key, f))
+
+        with self._lock:
+            return self._public(self._jobs[job_id])
+
+    def _finish(self, job_id: str, cache_key: Optional[str], future: Future) -> None:
+        """Record a worker's result or error."""
+        error = future.exception()
+        result = None if error else future.result()
+        if result is not None and cache_key:
+            result["floorId"] = cache_key
+
+        if result is not None and self.cache is not None and cache_key:
+            self.cache.put(cache_key, result)
+
+        with self._lock:
+            listener = self._listeners.get(job_id) if error else None
+        if listener is not None:
+            self._notify(job_id, listener, "error", {"error": str(error)})
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job["finishedAt"] = time.time()
+            if error:
+                logger.error(f"Detection job {job_id} failed: {error}")
+                job["status"] = "failed"
+                job["error"] = str(error)
+            else:
+                job["status"] = "done"
+                job["completedStages"] = list(PIPELINE_STAGES)
+                job["result"] = result
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the public status of a job, or None if unknown/expired."""
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(job_id)
+            return self._public(job) if job else None
+
+    def queue_depth(self) -> int:
+        """Number of jobs queued or running."""
+        with self._lock:
+            return self._active_count()
+
+    def _public(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        completed = len(job["completedStages"])
+        return {
+            "jobId": job["jobId"],
+            "status": job["status"],
+            "stage": job["stage"],
+            "progress": {
+                "completedStages": list(job["completedStages"]),
+                "totalStages": len(PIPELINE_STAGES),
+                "percent": round(100.0 * completed / len(PIPELINE_STAGES), 1)
+            },
+            "filename": job["filename"],
+            "createdAt": job["createdAt"],
+            "finishedAt": job["finishedAt"],
+            "expiresAt": job["finishedAt"] + self.ttl_seconds if job["finishedAt"] else None,
+            "cached": job["cached"],
+            "result": job["result"],
+            "error": job["error"]
+        }
+
+    def shutdown(self) -> None:
+        """Stop the worker pool and the progress reader."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._drain_thread is not None:
+            self._progress_queue.put(None)
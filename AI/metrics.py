@@ -0,0 +1,297 @@
+"""
+Process-Safe Metrics
+
+Low-overhead counters and histograms rendered in the Prometheus text
+format. Observations only touch an in-process dict under a lock. When a
+metrics directory is configured, every process (API workers and detection
+pool workers alike) also writes its values to its own <pid>.json snapshot,
+at most once per flush interval, and rendering sums the snapshots of all
+processes. Snapshots are written atomically (temp file + os.replace), so
+no lock is shared between processes. Gauges are read from callbacks in the
+process serving the scrape.
+
+Usage:
+    from metrics import REGISTRY, REQUEST_SECONDS, configure_metrics
+
+    configure_metrics("/tmp/floorplan-metrics")   # once, in the API process
+    REQUEST_SECONDS.observe(0.12, endpoint="/pathfind", method="POST", status="200")
+    text = REGISTRY.render()
+
+Environment Variables:
+    METRICS_DIR - Directory for per-process snapshots (default: unset,
+        in-process only; run.py sets it before starting workers)
+    METRICS_FLUSH_INTERVAL - Seconds between snapshot writes (default: 1)
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Request and stage latencies, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Graph nodes visited by a path search
+NODES_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 10000)
+
+
+def _label_key(labels: Dict[str, str]) -> str:
+    return json.dumps(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    escaped = (
+        k + '="' + str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter; summed across processes."""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help: str):
+        self.registry, self.name, self.help = registry, name, help
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        self.registry._update(self.name, labels, lambda value: (value or 0.0) + amount)
+
+
+class Histogram:
+    """Cumulative-bucket histogram; summed across processes."""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help: str, buckets: Sequence[float]):
+        self.registry, self.name, self.help = registry, name, help
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        def update(state):
+            state = state or {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+            return state
+        self.registry._update(self.name, labels, update)
+
+    def time(self, **labels):
+        """Context manager observing the elapsed time of its block."""
+        return _Timer(self, labels)
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram, self.labels = histogram, labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """
+    Metric definitions plus this process's values.
+
+    Args:
+        directory: Optional directory shared by all processes for snapshots
+        flush_interval: Minimum seconds between snapshot writes
+    """
+
+    def __init__(self, directory: Optional[str] = None, flush_interval: float = 1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics: Dict[str, object] = {}
+        self._gauges: Dict[str, Tuple[str, Callable[[], Dict[str, float]]]] = {}
+        self._values: Dict[str, Dict[str, object]] = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._last_flush = 0.0
+        self._dirty = False
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._metrics.setdefault(name, Counter(self, name, help))
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(self, name, help, buckets))
+
+    def gauge(self, name: str, help: str, read: Callable[[], object]) -> None:
+        """
+        Register a gauge read at render time. `read` returns a number, or a
+        dict mapping label tuples ((name, value), ...) to numbers.
+        """
+        self._gauges[name] = (help, read)
+
+    def _update(self, name: str, labels: Dict[str, str], update: Callable) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Forked child: start from zero instead of re-reporting the parent's values
+                self._values = {}
+                self._pid = os.getpid()
+                self._last_flush = 0.0
+            values = self._values.setdefault(name, {})
+            values[key] = update(values.get(key))
+            self._dirty = True
+            due = self.directory and time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def _snapshot_path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"{pid}.json")
+
+    def flush(self) -> None:
+        """Write this process's values to its snapshot file."""
+        if not self.directory:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self._values)
+            self._dirty = False
+            self._last_flush = time.monotonic()
+            pid = self._pid
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self._snapshot_path(pid))
+        except OSError as e:
+            logger.warning(f"Metrics snapshot write failed: {e}")
+
+    def remove_dead_snapshots(self) -> None:
+        """Delete snapshots of processes that no longer exist (call at startup)."""
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            stem, ext = os.path.splitext(name)
+            if ext != ".json" or not stem.isdigit():
+                continue
+            try:
+                os.kill(int(stem), 0)
+            except ProcessLookupError:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+            except PermissionError:
+                pass
+
+    def collect(self) -> Dict[str, Dict[str, object]]:
+        """Values summed over this process and every snapshot in the directory."""
+        self.flush()
+        with self._lock:
+            local = json.loads(json.dumps(self._values))
+            pid = self._pid
+
+        snapshots = [local]
+        if self.directory and os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if not name.endswith(".json") or name == f"{pid}.json":
+                    continue
+                try:
+                    with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                        snapshots.append(json.load(f))
+                except (OSError, json.JSONDecodeError):
+                    continue
+
+        totals: Dict[str, Dict[str, object]] = {}
+        for snapshot in snapshots:
+            for name, series in snapshot.items():
+                target = totals.setdefault(name, {})
+                for key, value in series.items():
+                    if isinstance(value, dict):
+                        current = target.setdefault(key, {"buckets": [0] * len(value["buckets"]),
+                                                          "sum": 0.0, "count": 0})
+                        if len(current["buckets"]) != len(value["buckets"]):
+                            continue
+                        current["buckets"] = [a + b for a, b in zip(current["buckets"], value["buckets"])]
+                        current["sum"] += value["sum"]
+                        current["count"] += value["count"]
+                    else:
+                        target[key] = target.get(key, 0.0) + value
+        return totals
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        totals = self.collect()
+        lines: List[str] = []
+
+        for name, metric in self._metrics.items():
+            kind = "histogram" if isinstance(metric, Histogram) else "counter"
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in sorted(totals.get(name, {}).items()):
+                labels = [tuple(pair) for pair in json.loads(key)]
+                if kind == "counter":
+                    lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+                    continue
+                for bound, count in zip(metric.buckets, value["buckets"]):
+                    le = labels + [("le", _format_number(bound))]
+                    lines.append(f"{name}_bucket{_format_labels(le)} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels + [('le', '+Inf')])} {value['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(value['sum'])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+
+        for name, (help, read) in self._gauges.items():
+            try:
+                value = read()
+            except Exception as e:
+                logger.warning(f"Gauge {name} failed: {e}")
+                continue
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            series = value if isinstance(value, dict) else {(): value}
+            for labels, number in series.items():
+                lines.append(f"{name}{_format_labels(list(labels))} {_format_number(number)}")
+
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry(
+    directory=os.getenv("METRICS_DIR") or None,
+    flush_interval=float(os.getenv("METRICS_FLUSH_INTERVAL", "1"))
+)
+
+
+def configure_metrics(directory: str) -> None:
+    """
+    Share metrics through `directory`. Exported as METRICS_DIR so worker
+    processes started later (forked or spawned) write there too.
+    """
+    os.environ["METRICS_DIR"] = directory
+    REGISTRY.directory = directory
+    REGISTRY.remove_dead_snapshots()
+
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by endpoint")
+DETECTION_STAGE_SECONDS = REGISTRY.histogram(
+    "detection_stage_duration_seconds", "Unified detection stage latency (detect_all stages, OCR and graph)")
+PATH_SEARCH_SECONDS = REGISTRY.histogram(
+    "pathfinding_search_duration_seconds", "Path search time by algorithm")
+PATH_NODES_EXPLORED = REGISTRY.histogram(
+    "pathfinding_nodes_explored", "Graph nodes visited per path search", NODES_BUCKETS)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "result_cache_lookups_total", "Result cache lookups by result (hit or miss)")
+RESPONSE_CACHE = REGISTRY.counter(
+    "http_cached_responses_total", "Detection responses by endpoint and X-Cache result")
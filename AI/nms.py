@@ -0,0 +1,103 @@
+"""
+Vectorized Non-Maximum Suppression
+
+Box-array NMS for model predictions. Boxes are (N, 4) arrays of
+x1, y1, x2, y2 with parallel score and class arrays; each step compares
+the current best box with all remaining boxes at once.
+
+Usage:
+    from nms import nms_indices
+
+    keep, scores = nms_indices(boxes, scores, iou_threshold=0.3)
+    keep, scores = nms_indices(boxes, scores, 0.3, classes=classes, soft=True)
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+def box_iou(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """IoU of one x1, y1, x2, y2 box with each row of `boxes`."""
+    x_left = np.maximum(box[0], boxes[:, 0])
+    y_top = np.maximum(box[1], boxes[:, 1])
+    x_right = np.minimum(box[2], boxes[:, 2])
+    y_bottom = np.minimum(box[3], boxes[:, 3])
+
+    overlapping = (x_right >= x_left) & (y_bottom >= y_top)
+    intersection = np.where(overlapping, (x_right - x_left) * (y_bottom - y_top), 0.0)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    union = area + areas - intersection
+
+    iou = np.zeros(len(boxes))
+    np.divide(intersection, union, out=iou, where=union > 0)
+    return iou
+
+
+def nms_indices(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    iou_threshold: float,
+    classes: Optional[np.ndarray] = None,
+    soft: bool = False,
+    sigma: float = 0.5,
+    score_threshold: float = 0.001
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Greedy NMS over box arrays.
+
+    Boxes are visited by descending score (ties keep input order). Hard NMS
+    drops every remaining box whose IoU with the current one exceeds
+    `iou_threshold`. Soft-NMS instead decays those scores by
+    exp(-iou^2 / sigma) and drops boxes that fall below `score_threshold`.
+
+    Args:
+        boxes: (N, 4) x1, y1, x2, y2
+        scores: (N,) confidences
+        iou_threshold: IoU above which boxes suppress each other
+        classes: Optional (N,) class labels; boxes only suppress boxes of
+            the same class
+        soft: Use Gaussian soft-NMS
+        sigma: Soft-NMS decay width
+        score_threshold: Soft-NMS minimum score
+
+    Returns:
+        (kept indices in the order they were selected, their final scores)
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float64).copy()
+    n = len(boxes)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    if classes is not None:
+        # Shift each class into its own region so classes never overlap
+        _, class_ids = np.unique(np.asarray(classes), return_inverse=True)
+        span = float(boxes.max() - boxes.min()) + 1.0
+        boxes = boxes + (class_ids * span)[:, None]
+
+    keep, kept_scores = [], []
+    if not soft:
+        remaining = np.argsort(-scores, kind="stable")
+        while len(remaining):
+            current = remaining[0]
+            keep.append(current)
+            kept_scores.append(scores[current])
+            rest = remaining[1:]
+            remaining = rest[box_iou(boxes[current], boxes[rest]) <= iou_threshold]
+    else:
+        remaining = np.arange(n)
+        while len(remaining):
+            # Scores change every step, so pick the best of what remains
+            best = np.argmax(scores[remaining])
+            current = remaining[best]
+            keep.append(current)
+            kept_scores.append(scores[current])
+            rest = np.delete(remaining, best)
+            iou = box_iou(boxes[current], boxes[rest])
+            decay = np.where(iou > iou_threshold, np.exp(-(iou ** 2) / sigma), 1.0)
+            scores[rest] *= decay
+            remaining = rest[scores[rest] >= score_threshold]
+
+    return np.array(keep, dtype=np.int64), np.array(kept_scores)
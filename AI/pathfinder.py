@@ -5,16 +5,23 @@ Implements A* and Dijkstra algorithms for finding paths between nodes
 in the navigation graph.
 
 Usage:
-    from pathfinder import find_path, find_path_by_name
+    from pathfinder import find_path, find_path_by_name, find_path_between
     
     path = find_path(graph, "room_1", "room_5")
     path = find_path_by_name(graph, "101", "Lab B")
+    path = find_path_between(graph, {"x": 420, "y": 310}, "room_5")
 """
 
 import heapq
-from typing import List, Dict, Optional, Tuple
+import time
+from typing import List, Dict, Optional, Tuple, Union
 import math
 
+import numpy as np
+
+from utils.spatial import BoxIndex
+from metrics import PATH_NODES_EXPLORED, PATH_SEARCH_SECONDS
+
 
 def euclidean_distance(p1: Dict, p2: Dict) -> float:
     """Calculate Euclidean distance between two points."""
@@ -142,7 +149,8 @@ def dijkstra(graph: Dict, start_id: str, end_id: str) -> Optional[Dict]:
                 "path": path,
                 "pathNodes": path_nodes,
                 "totalDistance": distances[end_id],
-                "nodeCount": len(path)
+                "nodeCount": len(path),
+                "nodesExplored": len(visited)
             }
         
         for neighbor_id, edge_dist in adj[current_id]:
@@ -156,7 +164,7 @@ def dijkstra(graph: Dict, start_id: str, end_id: str) -> Optional[Dict]:
                 previous[neighbor_id] = current_id
                 heapq.heappush(pq, (new_dist, neighbor_id))
     
-    return {"found": False, "path": [], "reason": "No path exists"}
+    return {"found": False, "path": [], "reason": "No path exists", "nodesExplored": len(visited)}
 
 
 def astar(graph: Dict, start_id: str, end_id: str) -> Optional[Dict]:
@@ -237,7 +245,7 @@ def astar(graph: Dict, start_id: str, end_id: str) -> Optional[Dict]:
                 f_score = tentative_g + heuristic(neighbor_id)
                 heapq.heappush(pq, (f_score, tentative_g, neighbor_id))
     
-    return {"found": False, "path": [], "reason": "No path exists"}
+    return {"found": False, "path": [], "reason": "No path exists", "nodesExplored": len(visited)}
 
 
 def find_path(graph: Dict, start_id: str, end_id: str, 
@@ -254,10 +262,17 @@ def find_path(graph: Dict, start_id: str, end_id: str,
     Returns:
         Path result dict
     """
+    started = time.perf_counter()
     if algorithm == "dijkstra":
-        return dijkstra(graph, start_id, end_id)
+        result = dijkstra(graph, start_id, end_id)
     else:
-        return astar(graph, start_id, end_id)
+        result = astar(graph, start_id, end_id)
+    
+    algorithm = "dijkstra" if algorithm == "dijkstra" else "astar"
+    PATH_SEARCH_SECONDS.observe(time.perf_counter() - started, algorithm=algorithm)
+    if result is not None:
+        PATH_NODES_EXPLORED.observe(result["nodesExplored"], algorithm=algorithm)
+    return result
 
 
 def find_path_by_name(graph: Dict, start_query: str, end_query: str,
@@ -310,6 +325,196 @@ def find_path_by_name(graph: Dict, start_query: str, end_query: str,
     return result
 
 
+class EdgeIndex:
+    """
+    Grid index over the edge segments of a navigation graph, for finding
+    the edge nearest to an arbitrary point without scanning every edge.
+    
+    Args:
+        graph: Navigation graph; edges whose end nodes have no position are skipped
+    """
+    
+    def __init__(self, graph: Dict):
+        positions = {n["id"]: n["position"] for n in graph.get("nodes", []) if "position" in n}
+        self.edges = [
+            e for e in graph.get("edges", [])
+            if e["from"] in positions and e["to"] in positions
+        ]
+        self.segments = np.array([
+            (positions[e["from"]]["x"], positions[e["from"]]["y"],
+             positions[e["to"]]["x"], positions[e["to"]]["y"])
+            for e in self.edges
+        ], dtype=np.float64).reshape(-1, 4)
+        self.boxes = BoxIndex(np.c_[
+            np.minimum(self.segments[:, 0], self.segments[:, 2]),
+            np.minimum(self.segments[:, 1], self.segments[:, 3]),
+            np.maximum(self.segments[:, 0], self.segments[:, 2]),
+            np.maximum(self.segments[:, 1], self.segments[:, 3])
+        ])
+        if len(self.segments):
+            self.extent = float(np.ptp(self.segments.reshape(-1, 2), axis=0).max()) + 1.0
+        else:
+            self.extent = 0.0
+    
+    def nearest(self, x: float, y: float,
+                max_distance: float = float("inf")) -> Optional[Tuple[Dict, float, float, float, float]]:
+        """
+        Nearest edge to (x, y).
+        
+        Searches a window around the point that doubles until it holds a
+        segment closer than its half-width, so only nearby cells are read.
+        
+        Returns:
+            (edge, t, foot_x, foot_y, distance) with t in [0, 1] along the
+            edge from its "from" node, or None if no edge is within max_distance
+        """
+        if len(self.edges) == 0:
+            return None
+        
+        radius = max(self.boxes.cell_size, 1.0)
+        while True:
+            found = self.boxes.intersecting(x - radius, y - radius, x + radius, y + radius)
+            if len(found):
+                seg = self.segments[found]
+                dx, dy = seg[:, 2] - seg[:, 0], seg[:, 3] - seg[:, 1]
+                length_sq = dx * dx + dy * dy
+                t = np.divide((x - seg[:, 0]) * dx + (y - seg[:, 1]) * dy, length_sq,
+                              out=np.zeros(len(seg)), where=length_sq > 0)
+                t = np.clip(t, 0.0, 1.0)
+                fx, fy = seg[:, 0] + t * dx, seg[:, 1] + t * dy
+                dist = np.hypot(fx - x, fy - y)
+                best = int(np.argmin(dist))
+                # Segments outside the window are at least `radius` away
+                if dist[best] <= radius:
+                    if dist[best] > max_distance:
+                        return None
+                    return (self.edges[found[best]], float(t[best]),
+                            float(fx[best]), float(fy[best]), float(dist[best]))
+            if radius > max_distance or radius > 2 * self.extent + abs(x) + abs(y):
+                return None
+            radius *= 2
+
+
+def snap_to_graph(graph: Dict, x: float, y: float, index: EdgeIndex = None,
+                  max_distance: float = float("inf")) -> Optional[Dict]:
+    """
+    Project a point onto the nearest edge of the navigation graph.
+    
+    Args:
+        graph: Navigation graph
+        x, y: Point in image pixels (e.g. a map tap or a kiosk position)
+        index: Prebuilt EdgeIndex of the graph (built on the fly if None)
+        max_distance: Ignore edges further away than this
+        
+    Returns:
+        Dict with the edge id, end nodes, length ("edgeDistance") and
+        direction ("bidirectional"), the position along the edge ("t", 0 at
+        "from"), the snapped "position" and its "distance" from the point,
+        or None if no edge is close enough
+    """
+    index = index or EdgeIndex(graph)
+    hit = index.nearest(x, y, max_distance)
+    if hit is None:
+        return None
+    edge, t, fx, fy, dist = hit
+    return {
+        "edge": edge.get("id", f"edge_{edge['from']}_{edge['to']}"),
+        "from": edge["from"],
+        "to": edge["to"],
+        "edgeDistance": float(edge.get("distance", 1.0)),
+        "bidirectional": edge.get("bidirectional", True),
+        "t": t,
+        "position": {"x": fx, "y": fy},
+        "distance": dist
+    }
+
+
+def with_virtual_nodes(graph: Dict, snaps: Dict[str, Dict]) -> Dict:
+    """
+    Copy of the graph with a temporary node at each snapped point.
+    
+    Each virtual node splits its edge in two, in proportion to where it
+    sits along the edge; two virtual nodes on the same edge are also joined
+    directly. The stored graph is not modified.
+    
+    Args:
+        graph: Navigation graph
+        snaps: Virtual node id -> snap_to_graph result
+    """
+    nodes = list(graph.get("nodes", []))
+    edges = list(graph.get("edges", []))
+    
+    for node_id, snap in snaps.items():
+        distance = snap["edgeDistance"]
+        bidirectional = snap["bidirectional"]
+        nodes.append({
+            "id": node_id,
+            "type": "point",
+            "name": "Selected point",
+            "position": snap["position"],
+            "searchable": False
+        })
+        edges.append({"id": f"edge_{snap['from']}_{node_id}", "from": snap["from"], "to": node_id,
+                      "distance": snap["t"] * distance, "bidirectional": bidirectional})
+        edges.append({"id": f"edge_{node_id}_{snap['to']}", "from": node_id, "to": snap["to"],
+                      "distance": (1.0 - snap["t"]) * distance, "bidirectional": bidirectional})
+    
+    # Virtual nodes sharing an edge can reach each other without leaving it
+    items = list(snaps.items())
+    for i, (id_a, a) in enumerate(items):
+        for id_b, b in items[i + 1:]:
+            if (a["edge"], a["from"], a["to"]) != (b["edge"], b["from"], b["to"]):
+                continue
+            first, second = (id_a, id_b) if a["t"] <= b["t"] else (id_b, id_a)
+            edges.append({"id": f"edge_{first}_{second}", "from": first, "to": second,
+                          "distance": abs(a["t"] - b["t"]) * a["edgeDistance"],
+                          "bidirectional": a["bidirectional"]})
+    
+    return {**graph, "nodes": nodes, "edges": edges}
+
+
+def find_path_between(graph: Dict, start: Union[str, Dict], end: Union[str, Dict],
+                      algorithm: str = "astar", index: EdgeIndex = None) -> Dict:
+    """
+    Find a path between nodes and/or arbitrary points.
+    
+    Points are snapped to the nearest graph edge (snap_to_graph) and routed
+    from temporary virtual nodes, so the stored graph is left untouched.
+    
+    Args:
+        graph: Navigation graph
+        start: Start node id, or {"x", "y"} point
+        end: Destination node id, or {"x", "y"} point
+        algorithm: "astar" or "dijkstra"
+        index: Prebuilt EdgeIndex of the graph (built on the fly if needed)
+        
+    Returns:
+        Path result dict; snapped ends are reported under "snapped"
+    """
+    snaps = {}
+    ids = []
+    for name, target in (("point_start", start), ("point_end", end)):
+        if isinstance(target, str):
+            ids.append(target)
+            continue
+        if index is None:
+            index = EdgeIndex(graph)
+        snap = snap_to_graph(graph, float(target["x"]), float(target["y"]), index)
+        if snap is None:
+            return {"found": False, "path": [], "reason": "Graph has no edges to snap to"}
+        snaps[name] = snap
+        ids.append(name)
+    
+    routed = with_virtual_nodes(graph, snaps) if snaps else graph
+    result = find_path(routed, ids[0], ids[1], algorithm)
+    if result is None:
+        return {"found": False, "path": [], "reason": "Unknown start or destination node"}
+    
+    if snaps:
+        result["snapped"] = snaps
+    return result
+
+
 def get_directions(path_result: Dict) -> List[str]:
     """
     Generate human-readable directions from a path result.
@@ -0,0 +1,177 @@
+"""
+Content-Hash Result Cache
+
+Disk-backed cache for detection results, keyed by the SHA-256 of the
+uploaded image bytes plus the detection parameters and pipeline version.
+Entries are written atomically (temp file + os.replace) so several worker
+processes can share one cache directory, and the directory is kept under
+a size budget by evicting the least recently used entries. Each process
+keeps a running total of the cache size, so the directory is only walked
+when that total exceeds the budget or the last walk is older than the
+scan interval (which picks up entries written by other processes).
+
+Usage:
+    from result_cache import ResultCache, make_cache_key
+
+    cache = ResultCache("/tmp/floorplan-cache", max_bytes=512 * 1024 * 1024)
+    key = make_cache_key(contents, "detect-unified", {"version": "1"})
+    result = cache.get(key)
+    if result is None:
+        result = expensive_detection(contents)
+        cache.put(key, result)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Eviction trims the cache to this fraction of its budget, so the writes
+# that follow do not each go over budget and walk the directory again
+EVICT_TARGET = 0.9
+
+
+def make_cache_key(contents: bytes, endpoint: str, params: Dict[str, Any] = None) -> str:
+    """
+    Build a cache key from the uploaded bytes, endpoint and parameters.
+
+    Args:
+        contents: Raw uploaded image bytes
+        endpoint: Name of the endpoint/pipeline producing the result
+        params: Detection parameters and pipeline/model versions
+
+    Returns:
+        Hex SHA-256 digest identifying the result
+    """
+    digest = hashlib.sha256()
+    digest.update(hashlib.sha256(contents).digest())
+    digest.update(endpoint.encode("utf-8"))
+    digest.update(json.dumps(params or {}, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Size-bounded LRU cache of JSON results stored as one file per entry.
+
+    Recency is tracked through file modification times, which are bumped on
+    every hit, so no shared index has to be locked between processes.
+
+    Args:
+        directory: Cache directory, may be shared by several processes
+        max_bytes: Size budget for all entries
+        scan_interval: Maximum seconds between full directory walks
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024,
+                 scan_interval: float = 60.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.scan_interval = scan_interval
+        os.makedirs(directory, exist_ok=True)
+
+        # Estimated size of the directory; None until the first walk
+        self._total: Optional[int] = None
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        """Entry path, sharded by the first two hex digits of the key."""
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for `key`, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            CACHE_LOOKUPS.inc(result="miss")
+            return None
+        except OSError as e:
+            logger.warning(f"Result cache read failed for {key[:12]}: {e}")
+            CACHE_LOOKUPS.inc(result="miss")
+            return None
+        CACHE_LOOKUPS.inc(result="hit")
+
+        # Mark as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        """Store `value` under `key` atomically, then enforce the size budget."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f)
+                size = f.tell()
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Result cache write failed for {key[:12]}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            if self._total is not None:
+                self._total += size - replaced
+            due = (self._total is None or self._total > self.max_bytes
+                   or time.monotonic() - self._scanned_at >= self.scan_interval)
+        if due:
+            self.evict()
+
+    def evict(self) -> None:
+        """
+        Walk the cache and, if it exceeds max_bytes, delete least recently
+        used entries until it is under EVICT_TARGET of the budget. Resets
+        the running size total.
+        """
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        if total > self.max_bytes:
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes * EVICT_TARGET:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    # Another worker evicted it first
+                    pass
+                total -= size
+
+        with self._lock:
+            self._total = total
+            self._scanned_at = time.monotonic()
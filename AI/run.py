@@ -1,8 +1,9 @@
 """
 Floor Plan Detection API - Roboflow Version
 
-FastAPI server using Roboflow's InferenceHTTPClient for detecting 
-floor plan elements using a custom trained model.
+FastAPI server calling Roboflow's hosted inference API (through a pooled
+async HTTP client) for detecting floor plan elements using a custom
+trained model.
 
 Usage:
     python run.py --port 5000
@@ -10,41 +11,78 @@ Usage:
 API Endpoints:
     GET  /           - Visualizer interface
     POST /run-inference - Analyze a floor plan image
+    POST /detect-roboflow/sweep - Detection counts across many thresholds
+    POST /jobs/detect   - Queue unified detection, returns a job id
+    GET  /jobs/{id}     - Job status, per-stage progress and result
+    POST /detect-unified/stream - Unified detection streamed stage by stage
+    POST /detect-combined - Unified and ML detection merged, bounded by a deadline
+    GET  /locate     - Room containing a point on a detected floor
+    GET  /query-bbox - Rooms, doors and walls intersecting a viewport
+    GET  /snap       - Nearest point on a detected floor's navigation graph
     GET  /health     - Health check
+    GET  /metrics    - Prometheus metrics (latency histograms, cache, queues)
 
 Environment Variables:
     ROBOFLOW_API_KEY - Your Roboflow private API key
     ROBOFLOW_WORKSPACE - Workspace name (default: test-b5rtm)
     ROBOFLOW_WORKFLOW_ID - Workflow ID (default: classify-and-conditionally-detect)
+    ROBOFLOW_API_URL - Workflow API base URL (default: https://serverless.roboflow.com)
+    ROBOFLOW_DETECT_URL - Detection API base URL (default: https://detect.roboflow.com)
+    ROBOFLOW_CONNECT_TIMEOUT - Seconds to connect to Roboflow (default: 5)
+    ROBOFLOW_READ_TIMEOUT - Seconds to wait for a Roboflow response (default: 60)
+    ROBOFLOW_CONCURRENCY - Roboflow requests in flight at once (default: 8)
+    ROBOFLOW_RETRIES - Retries after a failed Roboflow request (default: 2)
+    ROBOFLOW_BREAKER_FAILURES - Failures in a row that open the circuit (default: 5)
+    ROBOFLOW_BREAKER_RESET - Seconds before retrying an open circuit (default: 30)
+    ROBOFLOW_UPLOAD_MAX_SIDE - Downscale uploads to this longest side before
+        sending them to Roboflow (default: 0, send the original bytes)
+    ROBOFLOW_FETCH_CONFIDENCE - Confidence (0-100) /detect-roboflow fetches
+        predictions at before thresholding locally (default: 1)
+    SWEEP_MAX_POINTS - Threshold pairs allowed per sweep (default: 500)
+    COMBINED_MAX_DEADLINE - Longest /detect-combined deadline in seconds (default: 120)
+    DETECTION_WORKERS - Detection worker processes (default: 2)
+    DETECTION_QUEUE_DEPTH - Jobs allowed to wait for a worker (default: 8)
+    DETECTION_JOB_TTL - Seconds finished jobs are kept (default: 900)
+    DETECTOR_BACKEND - "roboflow" (default) or "onnx" for a local CPU model
+        (see detector_backends.py for the ONNX_* settings)
+    FLOOR_INDEX_MAX - Floor spatial indexes kept in memory (default: 32)
+    METRICS_DIR - Directory where every process publishes its metrics
+        (default: .cache/metrics next to run.py)
 """
 
 import os
 import argparse
+import asyncio
 import base64
+import functools
+import json
+import time
 import numpy as np
-from typing import Dict, Any, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional, Tuple
 import cv2
+import httpx
 import logging
 from pydantic import BaseModel
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 
+from detection_merge import merge_detections
+from detector_backends import backend_from_env
+from image_io import prepare_upload, rescale_predictions
+from metrics import REGISTRY, REQUEST_SECONDS, RESPONSE_CACHE, configure_metrics
+from nms import nms_indices
+from result_cache import ResultCache, make_cache_key
+from upstream import CircuitBreaker, CircuitOpenError, UpstreamClient, UpstreamError
+
 # Load environment variables
 load_dotenv()
 
 # Get the directory where run.py is located
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# Try to import Roboflow inference SDK
-try:
-    from inference_sdk import InferenceHTTPClient
-    ROBOFLOW_AVAILABLE = True
-except ImportError:
-    ROBOFLOW_AVAILABLE = False
-    print("⚠️ inference-sdk not available. Install with: pip install inference-sdk")
-
 # Roboflow configuration
 ROBOFLOW_API_KEY = os.getenv("ROBOFLOW_API_KEY")
 ROBOFLOW_WORKSPACE = os.getenv("ROBOFLOW_WORKSPACE", "test-b5rtm")
@@ -57,7 +95,16 @@ ROBOFLOW_DOOR_MODEL_ID = os.getenv("ROBOFLOW_DOOR_MODEL_ID", "floor_plan_multipl
 
 # Legacy workflow (kept for backward compatibility)
 ROBOFLOW_WORKFLOW_ID = os.getenv("ROBOFLOW_WORKFLOW_ID", "detect-and-classify")
-ROBOFLOW_API_URL = "https://serverless.roboflow.com"
+ROBOFLOW_API_URL = os.getenv("ROBOFLOW_API_URL", "https://serverless.roboflow.com")
+ROBOFLOW_DETECT_URL = os.getenv("ROBOFLOW_DETECT_URL", "https://detect.roboflow.com")
+
+# Longest image side sent to Roboflow; larger uploads are downscaled (0 = never)
+ROBOFLOW_UPLOAD_MAX_SIDE = int(os.getenv("ROBOFLOW_UPLOAD_MAX_SIDE", "0"))
+
+# /detect-roboflow fetches predictions once at this confidence (0-100) and
+# re-thresholds locally; requests below it are clamped to it
+ROBOFLOW_FETCH_CONFIDENCE = float(os.getenv("ROBOFLOW_FETCH_CONFIDENCE", "1"))
+SWEEP_MAX_POINTS = int(os.getenv("SWEEP_MAX_POINTS", "500"))
 
 app = FastAPI(
     title="Floor Plan Detection API",
@@ -79,26 +126,62 @@ logger = logging.getLogger(__name__)
 
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
 
-# Initialize Roboflow client
+# Detection result cache (shared by all worker processes)
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join(BASE_DIR, ".cache", "results"))
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "512"))
+result_cache = ResultCache(RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024)
+
+# Metrics are summed over the API process and the detection worker processes
+configure_metrics(os.getenv("METRICS_DIR", os.path.join(BASE_DIR, ".cache", "metrics")))
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Observe request latency per route template, plus X-Cache results."""
+    started = time.perf_counter()
+    status, response = 500, None
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", "unmatched")
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint,
+                                method=request.method, status=status)
+        if response is not None and status == 200 and "x-cache" in response.headers:
+            RESPONSE_CACHE.inc(endpoint=endpoint, result=response.headers["x-cache"])
+
+
+def cached_response(content: Dict[str, Any], hit: bool) -> JSONResponse:
+    """Wrap a detection result with the X-Cache header."""
+    return JSONResponse(content=content, headers={"X-Cache": "hit" if hit else "miss"})
+
+# Pooled async HTTP client for Roboflow (created by initialize_roboflow_client)
 roboflow_client = None
 
+# Local detector backend (DETECTOR_BACKEND=onnx); replaces Roboflow calls when set
+local_detector = None
+
 
 def initialize_roboflow_client():
-    """Initialize the Roboflow InferenceHTTPClient."""
+    """Initialize the pooled Roboflow HTTP client."""
     global roboflow_client
     
-    if not ROBOFLOW_AVAILABLE:
-        logger.warning("Roboflow SDK not available")
-        return None
-    
     if not ROBOFLOW_API_KEY:
         logger.warning("ROBOFLOW_API_KEY not set")
         return None
     
     try:
-        roboflow_client = InferenceHTTPClient(
-            api_url=ROBOFLOW_API_URL,
-            api_key=ROBOFLOW_API_KEY
+        roboflow_client = UpstreamClient(
+            connect_timeout=float(os.getenv("ROBOFLOW_CONNECT_TIMEOUT", "5")),
+            read_timeout=float(os.getenv("ROBOFLOW_READ_TIMEOUT", "60")),
+            max_concurrency=int(os.getenv("ROBOFLOW_CONCURRENCY", "8")),
+            retries=int(os.getenv("ROBOFLOW_RETRIES", "2")),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("ROBOFLOW_BREAKER_FAILURES", "5")),
+                reset_timeout=float(os.getenv("ROBOFLOW_BREAKER_RESET", "30"))
+            )
         )
         logger.info(f"✅ Roboflow client initialized successfully")
         logger.info(f"   Workspace: {ROBOFLOW_WORKSPACE}")
@@ -109,6 +192,49 @@ def initialize_roboflow_client():
         return None
 
 
+async def call_roboflow(method: str, url: str, **kwargs):
+    """Send a Roboflow request through the pooled client, mapping failures to HTTP errors."""
+    try:
+        response = await roboflow_client.request(method, url, **kwargs)
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="Roboflow is unavailable, try again later")
+    except UpstreamError as e:
+        logger.error(f"Roboflow request failed: {str(e)}")
+        status_code = 504 if isinstance(e.__cause__, httpx.TimeoutException) else 502
+        raise HTTPException(status_code=status_code, detail=f"Roboflow request failed: {str(e)}")
+    
+    if response.status_code != 200:
+        logger.error(f"Roboflow API error: {response.status_code} - {response.text}")
+        raise HTTPException(status_code=response.status_code, detail=f"Roboflow API error: {response.text}")
+    return response.json()
+
+
+def initialize_local_detector():
+    """Load the local detector backend selected by DETECTOR_BACKEND, if any."""
+    global local_detector
+    local_detector = backend_from_env()
+    if local_detector is not None:
+        logger.info(f"✅ Local {local_detector.name} detector backend loaded")
+    return local_detector
+
+
+def detect_local(contents: bytes, *args) -> Tuple[List[Dict], Tuple[int, int]]:
+    """
+    Decode an upload and run the local detector on it; blocking, so call it
+    through run_in_thread. Extra args go to local_detector.predict.
+    
+    Returns:
+        (predictions, (width, height))
+    
+    Raises:
+        ValueError: The bytes are not a decodable image
+    """
+    img = cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Could not decode image")
+    return local_detector.predict(img, *args), (img.shape[1], img.shape[0])
+
+
 def process_roboflow_result(result: Dict, image_width: int, image_height: int) -> Dict[str, Any]:
     """
     Process Roboflow workflow result into our standard JSON format.
@@ -213,6 +339,82 @@ def process_roboflow_result(result: Dict, image_width: int, image_height: int) -
     }
 
 
+# ============================================================================
+# EXECUTION LAYER
+# ============================================================================
+# CPU-heavy work must never run on the event loop: OpenCV detection goes to
+# the detection process pool (shared with /jobs/detect), and lighter CPU or
+# blocking I/O work goes to a thread pool. Each endpoint also has its own
+# concurrency limit so one busy endpoint cannot starve the others.
+
+# Import unified detector and pathfinder
+try:
+    from unified_detector import FloorPlanDetector, DETECTOR_VERSION, PIPELINE_STAGES, process_floor_plan_bytes
+    from pathfinder import (find_path, find_path_between, find_path_by_name, get_directions,
+                            search_nodes_by_name, snap_to_graph)
+    from jobs import JobManager, QueueFullError, replay_stages
+    from floor_index import FloorRegistry, QUERY_TYPES
+    UNIFIED_DETECTOR_AVAILABLE = True
+except ImportError as e:
+    UNIFIED_DETECTOR_AVAILABLE = False
+    logger.warning(f"Unified detector not available: {e}")
+
+# Detection process pool, also behind the /jobs API (None without the
+# unified detector)
+DETECTION_WORKERS = int(os.getenv("DETECTION_WORKERS", "2"))
+DETECTION_QUEUE_DEPTH = int(os.getenv("DETECTION_QUEUE_DEPTH", "8"))
+DETECTION_JOB_TTL = float(os.getenv("DETECTION_JOB_TTL", "900"))  # seconds
+
+job_manager = JobManager(
+    max_workers=DETECTION_WORKERS,
+    max_queue=DETECTION_QUEUE_DEPTH,
+    ttl_seconds=DETECTION_JOB_TTL,
+    cache=result_cache
+) if UNIFIED_DETECTOR_AVAILABLE else None
+
+CPU_THREADS = int(os.getenv("CPU_THREADS", "4"))
+
+ENDPOINT_CONCURRENCY = {
+    "detect-unified": int(os.getenv("DETECT_UNIFIED_CONCURRENCY", "2")),
+    "detect-roboflow": int(os.getenv("DETECT_ROBOFLOW_CONCURRENCY", "4")),
+    "run-inference": int(os.getenv("RUN_INFERENCE_CONCURRENCY", "4")),
+    "rebuild-graph": int(os.getenv("REBUILD_GRAPH_CONCURRENCY", "4")),
+    "pathfind": int(os.getenv("PATHFIND_CONCURRENCY", "8")),
+    "search-nodes": int(os.getenv("SEARCH_NODES_CONCURRENCY", "16")),
+    "spatial-query": int(os.getenv("SPATIAL_QUERY_CONCURRENCY", "8")),
+    "detect-combined": int(os.getenv("DETECT_COMBINED_CONCURRENCY", "4")),
+    "metrics": int(os.getenv("METRICS_CONCURRENCY", "2")),
+}
+
+cpu_pool = ThreadPoolExecutor(max_workers=CPU_THREADS, thread_name_prefix="cpu-worker")
+endpoint_limits = {name: asyncio.Semaphore(limit) for name, limit in ENDPOINT_CONCURRENCY.items()}
+
+
+async def run_in_process(endpoint: str, fn: Callable, *args) -> Any:
+    """Run a picklable module-level function on the detection process pool."""
+    if job_manager is None:
+        raise HTTPException(status_code=500, detail="Detection worker pool not available")
+    async with endpoint_limits[endpoint]:
+        return await asyncio.wrap_future(job_manager.submit_call(fn, *args))
+
+
+async def run_in_thread(endpoint: str, fn: Callable, *args, **kwargs) -> Any:
+    """Run light CPU work or a blocking call on the shared thread pool."""
+    async with endpoint_limits[endpoint]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cpu_pool, functools.partial(fn, *args, **kwargs))
+
+
+async def cache_get(key: str) -> Optional[Dict[str, Any]]:
+    """Read a cached result off the event loop (results can be megabytes of JSON)."""
+    return await asyncio.to_thread(result_cache.get, key)
+
+
+async def cache_put(key: str, value: Dict[str, Any]) -> None:
+    """Write a result to the cache off the event loop; puts may also evict."""
+    await asyncio.to_thread(result_cache.put, key, value)
+
+
 @app.get("/", response_class=HTMLResponse)
 async def root():
     """Serve the visualizer HTML at root."""
@@ -249,13 +451,30 @@ async def health_check():
     return {
         "status": "healthy",
         "version": "3.0.0",
-        "backend": "roboflow",
+        "backend": local_detector.name if local_detector is not None else "roboflow",
         "roboflow_connected": roboflow_client is not None,
+        "roboflow_upstream": roboflow_client.stats() if roboflow_client is not None else None,
         "workspace": ROBOFLOW_WORKSPACE,
         "workflow": ROBOFLOW_WORKFLOW_ID
     }
 
 
+# Live gauges, read in the process serving the scrape
+REGISTRY.gauge("detection_queue_depth", "Detection jobs queued or running",
+               lambda: job_manager.queue_depth() if job_manager is not None else 0)
+REGISTRY.gauge("upstream_in_flight_requests", "Roboflow requests in flight",
+               lambda: roboflow_client.in_flight if roboflow_client is not None else 0)
+REGISTRY.gauge("upstream_circuit_open", "1 while the Roboflow circuit breaker rejects calls",
+               lambda: int(roboflow_client is not None and roboflow_client.breaker.state == "open"))
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text-format metrics summed over all API and worker processes."""
+    text = await run_in_thread("metrics", REGISTRY.render)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+
 # ============================================================================
 # CHATBOT ENDPOINT
 # ============================================================================
@@ -305,11 +524,11 @@ async def chat_endpoint(request: ChatRequest):
 
 @app.post("/run-inference")
 async def run_inference(image: UploadFile = File(...)):
-    """Run floor plan detection on an uploaded image using Roboflow."""
+    """Run floor plan detection on an uploaded image using Roboflow or the local backend."""
     if image.content_type not in ["image/jpeg", "image/png"]:
         raise HTTPException(status_code=400, detail="Only JPEG and PNG images are supported.")
     
-    if not roboflow_client:
+    if not roboflow_client and local_detector is None:
         raise HTTPException(
             status_code=503, 
             detail="Roboflow client not initialized. Check ROBOFLOW_API_KEY."
@@ -320,31 +539,55 @@ async def run_inference(image: UploadFile = File(...)):
         if len(contents) > MAX_FILE_SIZE:
             raise HTTPException(status_code=400, detail="File size exceeds the maximum limit of 10 MB.")
         
-        # Decode image to get dimensions
-        nparr = np.frombuffer(contents, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        if img is None:
-            raise HTTPException(status_code=400, detail="Failed to decode image.")
-        
-        image_height, image_width = img.shape[:2]
-        logger.info(f"Processing image: {image_width}x{image_height}")
-        
-        # Encode image to base64 for Roboflow
-        _, buffer = cv2.imencode('.jpg', img)
-        img_base64 = base64.b64encode(buffer).decode('utf-8')
-        
-        # Run Roboflow workflow
-        logger.info(f"Sending to Roboflow workflow: {ROBOFLOW_WORKFLOW_ID}")
-        result = roboflow_client.run_workflow(
-            workspace_name=ROBOFLOW_WORKSPACE,
-            workflow_id=ROBOFLOW_WORKFLOW_ID,
-            images={
-                "image": img_base64
-            },
-            use_cache=True
-        )
+        cache_key = make_cache_key(contents, "run-inference", local_detector.cache_params()
+                                   if local_detector is not None else {
+            "workspace": ROBOFLOW_WORKSPACE,
+            "workflow": ROBOFLOW_WORKFLOW_ID,
+            "uploadMaxSide": ROBOFLOW_UPLOAD_MAX_SIDE
+        })
+        cached = await cache_get(cache_key)
+        if cached is not None:
+            logger.info("Inference result served from cache")
+            return cached_response(cached, hit=True)
         
-        logger.info(f"Roboflow response received")
+        if local_detector is not None:
+            # Decode and run the local model off the event loop
+            logger.info(f"Running local {local_detector.name} detector")
+            try:
+                predictions, (image_width, image_height) = await run_in_thread(
+                    "run-inference", detect_local, contents
+                )
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Failed to decode image.")
+            logger.info(f"Processed image: {image_width}x{image_height}")
+            result = {"predictions": predictions}
+        else:
+            # Header-only size probe; bytes are only re-encoded when downscaling
+            try:
+                upload, (image_width, image_height), upload_scale = await run_in_thread(
+                    "run-inference", prepare_upload, contents, ROBOFLOW_UPLOAD_MAX_SIDE
+                )
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Failed to decode image.")
+            logger.info(f"Processing image: {image_width}x{image_height}")
+            img_base64 = base64.b64encode(upload).decode('utf-8')
+            
+            # Run Roboflow workflow
+            logger.info(f"Sending to Roboflow workflow: {ROBOFLOW_WORKFLOW_ID}")
+            workflow_result = await call_roboflow(
+                "POST",
+                f"{ROBOFLOW_API_URL}/{ROBOFLOW_WORKSPACE}/workflows/{ROBOFLOW_WORKFLOW_ID}",
+                json={
+                    "api_key": ROBOFLOW_API_KEY,
+                    "inputs": {
+                        "image": {"type": "base64", "value": img_base64}
+                    },
+                    "use_cache": True
+                }
+            )
+            result = rescale_predictions(workflow_result.get("outputs", []), upload_scale)
+            
+            logger.info(f"Roboflow response received")
         
         # Process the result
         processed_result = process_roboflow_result(result, image_width, image_height)
@@ -357,7 +600,8 @@ async def run_inference(image: UploadFile = File(...)):
                    f"{len(processed_result['detectionResults']['rooms'])} rooms, "
                    f"{len(processed_result['detectionResults']['doors'])} doors")
         
-        return processed_result
+        await cache_put(cache_key, processed_result)
+        return cached_response(processed_result, hit=False)
         
     except HTTPException:
         raise
@@ -369,6 +613,9 @@ async def run_inference(image: UploadFile = File(...)):
 # ============================================================================
 # ROBOFLOW WORKFLOW DETECTION ENDPOINT
 # ============================================================================
+# Predictions are fetched once per image at ROBOFLOW_FETCH_CONFIDENCE with
+# upstream NMS disabled and cached by image hash; every threshold change is
+# then a local confidence filter plus NMS on the cached predictions.
 
 class RoboflowDetectionParams(BaseModel):
     """Parameters for Roboflow detection."""
@@ -376,26 +623,307 @@ class RoboflowDetectionParams(BaseModel):
     overlap: Optional[float] = 30     # Overlap/NMS threshold (0-100)
 
 
+# Raw prediction fetches in progress, so concurrent requests share one call
+raw_prediction_fetches: Dict[str, asyncio.Task] = {}
+
+
+def extract_predictions(result: Any) -> List[Dict]:
+    """Flatten a Roboflow detection or workflow response into prediction dicts."""
+    predictions = []
+    if isinstance(result, list) and len(result) > 0:
+        for item in result:
+            if isinstance(item, dict):
+                if 'predictions' in item:
+                    predictions.extend(item.get('predictions', []))
+                elif 'output' in item:
+                    output = item['output']
+                    if isinstance(output, dict) and 'predictions' in output:
+                        predictions.extend(output['predictions'])
+    elif isinstance(result, dict):
+        if 'predictions' in result:
+            predictions = result['predictions']
+    return predictions
+
+
+def prediction_group(pred: Dict) -> str:
+    """Detection list a prediction belongs to: doors, walls or rooms."""
+    class_name = pred.get('class', '').lower()
+    if 'door' in class_name:
+        return "doors"
+    if 'wall' in class_name:
+        return "walls"
+    return "rooms"
+
+
+def group_predictions(predictions: List[Dict], min_confidence: float) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Split predictions at or above `min_confidence` into door, wall and room
+    arrays: original indices, x1, y1, x2, y2 boxes, scores and class names.
+    """
+    groups = {}
+    for name in ("rooms", "doors", "walls"):
+        idx = [i for i, pred in enumerate(predictions)
+               if pred.get('confidence', 0) >= min_confidence and prediction_group(pred) == name]
+        preds = [predictions[i] for i in idx]
+        centers = np.array([[p.get('x', 0), p.get('y', 0)] for p in preds], dtype=np.float64).reshape(-1, 2)
+        sizes = np.array([[p.get('width', 0), p.get('height', 0)] for p in preds], dtype=np.float64).reshape(-1, 2)
+        groups[name] = {
+            "indices": np.array(idx, dtype=np.int64),
+            "boxes": np.hstack([centers - sizes / 2, centers + sizes / 2]),
+            "scores": np.array([float(p.get('confidence', 0)) for p in preds], dtype=np.float64),
+            "classes": np.array([p.get('class', '').lower() for p in preds]),
+        }
+    return groups
+
+
+def suppress_group(group: Dict[str, np.ndarray], name: str, overlap_threshold: float,
+                   per_class_nms: bool, soft_nms: bool, score_threshold: float):
+    """NMS within one group; doors and walls always use hard per-class NMS."""
+    is_rooms = name == "rooms"
+    return nms_indices(
+        group["boxes"], group["scores"], overlap_threshold,
+        classes=group["classes"] if per_class_nms or not is_rooms else None,
+        soft=soft_nms and is_rooms,
+        score_threshold=score_threshold
+    )
+
+
+def threshold_predictions(
+    predictions: List[Dict],
+    confidence: float,
+    overlap: float,
+    per_class_nms: bool = False,
+    soft_nms: bool = False
+) -> Dict[str, List[Dict]]:
+    """
+    Turn raw predictions into rooms, doors and walls for one pair of
+    thresholds (both 0-100): drop predictions below `confidence`, then
+    suppress overlaps above `overlap` IoU. Rooms keep their raw prediction
+    index in their id, so ids are stable across thresholds.
+    """
+    conf_threshold = confidence / 100.0
+    overlap_threshold = overlap / 100.0
+    groups = group_predictions(predictions, conf_threshold)
+    detections = {"rooms": [], "doors": [], "walls": []}
+    
+    for name, group in groups.items():
+        keep, kept_scores = suppress_group(group, name, overlap_threshold,
+                                           per_class_nms, soft_nms, conf_threshold)
+        if name != "rooms":
+            # Doors and walls keep prediction order
+            order = np.argsort(keep, kind="stable")
+            keep, kept_scores = keep[order], kept_scores[order]
+        
+        for k, score in zip(keep.tolist(), kept_scores.tolist()):
+            i = int(group["indices"][k])
+            pred = predictions[i]
+            x1, y1, x2, y2 = group["boxes"][k].tolist()
+            x, y = pred.get('x', 0), pred.get('y', 0)
+            width, height = pred.get('width', 0), pred.get('height', 0)
+            class_name = group["classes"][k]
+            
+            if name == "doors":
+                detections["doors"].append({
+                    "id": f"door_{len(detections['doors'])+1}",
+                    "hinge": {"x": float(x), "y": float(y)},
+                    "width": float(max(width, height)),
+                    "swing_angle": 90,
+                    "confidence": float(score),
+                    "type": "door"
+                })
+            elif name == "walls":
+                detections["walls"].append({
+                    "id": f"wall_{len(detections['walls'])+1}",
+                    "position": {
+                        "start": {"x": float(x1), "y": float(y1)},
+                        "end": {"x": float(x2), "y": float(y2)}
+                    },
+                    "confidence": float(score),
+                    "type": "wall"
+                })
+            else:
+                detections["rooms"].append({
+                    "id": f"{class_name}_{i+1}",
+                    "name": pred.get('class', f'Room {i+1}'),
+                    "position": {
+                        "start": {"x": float(x1), "y": float(y1)},
+                        "end": {"x": float(x2), "y": float(y2)}
+                    },
+                    "center": {"x": float(x), "y": float(y)},
+                    "area": float(width * height),
+                    "confidence": float(score),
+                    "class": class_name,
+                    "type": "room" if 'room' in class_name or 'space' in class_name else class_name
+                })
+    
+    return detections
+
+
+def sweep_counts(
+    predictions: List[Dict],
+    confidences: List[float],
+    overlaps: List[float],
+    per_class_nms: bool = False,
+    soft_nms: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Room, door and wall counts for every confidence/overlap pair (0-100).
+
+    Hard NMS visits boxes by descending score, so the survivors at a higher
+    confidence are exactly the survivors at the lowest one that clear it:
+    each overlap needs a single NMS pass. Soft-NMS rooms are recomputed per
+    confidence because decayed scores can reorder boxes.
+    """
+    lowest = min(confidences) / 100.0
+    groups = group_predictions(predictions, lowest)
+    results = []
+    for overlap in overlaps:
+        survivors = {}
+        for name, group in groups.items():
+            if name == "rooms" and soft_nms:
+                continue
+            keep, _ = suppress_group(group, name, overlap / 100.0, per_class_nms, False, lowest)
+            survivors[name] = group["scores"][keep]
+        
+        for confidence in confidences:
+            counts = {name: int((scores >= confidence / 100.0).sum()) for name, scores in survivors.items()}
+            if soft_nms:
+                rooms = group_predictions(predictions, confidence / 100.0)["rooms"]
+                keep, _ = suppress_group(rooms, "rooms", overlap / 100.0, per_class_nms, True, confidence / 100.0)
+                counts["rooms"] = len(keep)
+            results.append({"confidence": confidence, "overlap": overlap,
+                            **{name: counts[name] for name in ("rooms", "doors", "walls")}})
+    return results
+
+
+def raw_predictions_key(contents: bytes) -> str:
+    """Cache key of an image's raw (fetch-confidence, no-NMS) predictions."""
+    return make_cache_key(contents, "detect-roboflow-raw", {
+        "model": local_detector.cache_params() if local_detector is not None else ROBOFLOW_DOOR_MODEL_ID,
+        "uploadMaxSide": ROBOFLOW_UPLOAD_MAX_SIDE if local_detector is None else None,
+        "fetchConfidence": ROBOFLOW_FETCH_CONFIDENCE
+    })
+
+
+async def fetch_raw_predictions(contents: bytes, endpoint: str) -> Dict[str, Any]:
+    """
+    Predictions for an image at ROBOFLOW_FETCH_CONFIDENCE with NMS disabled,
+    plus the image size. Fetched once per image: results are kept in the
+    result cache, and concurrent requests for the same image share a call.
+    """
+    key = raw_predictions_key(contents)
+    cached = await cache_get(key)
+    if cached is not None:
+        logger.info("Raw predictions served from cache")
+        return cached
+    
+    fetch = raw_prediction_fetches.get(key)
+    if fetch is None:
+        fetch = asyncio.ensure_future(_fetch_raw_predictions(contents, endpoint, key))
+        raw_prediction_fetches[key] = fetch
+        fetch.add_done_callback(lambda _: raw_prediction_fetches.pop(key, None))
+    return await asyncio.shield(fetch)
+
+
+async def _fetch_raw_predictions(contents: bytes, endpoint: str, key: str) -> Dict[str, Any]:
+    fetch_confidence = ROBOFLOW_FETCH_CONFIDENCE / 100.0
+    if local_detector is not None:
+        # Decode and run the local model off the event loop
+        logger.info(f"Running local {local_detector.name} detector")
+        try:
+            predictions, (image_width, image_height) = await run_in_thread(
+                endpoint, detect_local, contents, fetch_confidence, 1.0
+            )
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Could not decode image")
+    else:
+        # Header-only size probe; bytes are only re-encoded when downscaling
+        try:
+            upload, (image_width, image_height), upload_scale = await run_in_thread(
+                endpoint, prepare_upload, contents, ROBOFLOW_UPLOAD_MAX_SIDE
+            )
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Could not decode image")
+        
+        # Encode to base64
+        img_base64 = base64.b64encode(upload).decode('utf-8')
+        
+        logger.info(f"Sending to Roboflow direct detection API")
+        logger.info(f"Model: {ROBOFLOW_DOOR_MODEL_ID}, fetch confidence: {ROBOFLOW_FETCH_CONFIDENCE}%")
+        
+        # Use direct detection API instead of workflow (workflow has incompatible model)
+        detect_url = f"{ROBOFLOW_DETECT_URL}/{ROBOFLOW_DOOR_MODEL_ID}"
+        params = {
+            "api_key": ROBOFLOW_API_KEY,
+            "confidence": fetch_confidence,
+            "overlap": 1.0  # NMS runs locally
+        }
+        
+        result = await call_roboflow(
+            "POST",
+            detect_url,
+            params=params,
+            content=img_base64,
+            headers={"Content-Type": "application/x-www-form-urlencoded"}
+        )
+        predictions = extract_predictions(rescale_predictions(result, upload_scale))
+        logger.info(f"Roboflow response received")
+    
+    raw = {
+        "predictions": predictions,
+        "imageSize": {"width": image_width, "height": image_height}
+    }
+    await cache_put(key, raw)
+    return raw
+
+
+def effective_confidence(confidence: float) -> float:
+    """
+    Confidence (0-100) a request is actually thresholded at: raw predictions
+    stop at ROBOFLOW_FETCH_CONFIDENCE, so lower requests are clamped to it.
+    """
+    return max(confidence, ROBOFLOW_FETCH_CONFIDENCE)
+
+
+def parse_thresholds(value: str, name: str) -> List[float]:
+    """Parse a comma-separated list of 0-100 thresholds."""
+    try:
+        values = [float(v) for v in value.split(",") if v.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be comma-separated numbers")
+    if not values or any(v < 0 or v > 100 for v in values):
+        raise HTTPException(status_code=400, detail=f"{name} must be between 0 and 100")
+    return values
+
+
 @app.post("/detect-roboflow")
 async def detect_roboflow(
     image: UploadFile = File(...),
     confidence: float = 40,
-    overlap: float = 30
+    overlap: float = 30,
+    per_class_nms: bool = False,
+    soft_nms: bool = False
 ):
     """
     Detect floor plan elements using Roboflow's detect-and-classify workflow.
     
-    Uses the ML model for room detection with adjustable thresholds.
+    Uses the ML model for room detection with adjustable thresholds. With
+    DETECTOR_BACKEND=onnx the local model is used instead of Roboflow.
+    Predictions are fetched once per image; other thresholds on the same
+    image are applied locally without calling the model again.
     
     Args:
         image: Floor plan image
-        confidence: Confidence threshold (0-100), default 40
+        confidence: Confidence threshold (0-100), default 40; values below
+            ROBOFLOW_FETCH_CONFIDENCE are clamped to it
         overlap: Overlap/NMS threshold (0-100), default 30
+        per_class_nms: Only suppress overlapping rooms of the same class
+        soft_nms: Decay overlapping room confidences instead of dropping them
         
     Returns:
-        Detections and navigation graph
+        Detections, navigation graph and the thresholds applied
     """
-    if not roboflow_client:
+    if not roboflow_client and local_detector is None:
         raise HTTPException(status_code=500, detail="Roboflow client not available")
     
     try:
@@ -407,159 +935,60 @@ async def detect_roboflow(
         if len(contents) > MAX_FILE_SIZE:
             raise HTTPException(status_code=400, detail="File size exceeds limit")
         
-        # Decode image dimensions
-        nparr = np.frombuffer(contents, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        if img is None:
-            raise HTTPException(status_code=400, detail="Could not decode image")
-        
-        image_height, image_width = img.shape[:2]
-        
-        # Encode to base64
-        img_base64 = base64.b64encode(contents).decode('utf-8')
-        
-        logger.info(f"Sending to Roboflow direct detection API")
-        logger.info(f"Model: {ROBOFLOW_DOOR_MODEL_ID}")
-        logger.info(f"Thresholds - Confidence: {confidence}%, Overlap: {overlap}%")
-        
-        # Use direct detection API instead of workflow (workflow has incompatible model)
-        import requests
-        
-        detect_url = f"https://detect.roboflow.com/{ROBOFLOW_DOOR_MODEL_ID}"
-        params = {
-            "api_key": ROBOFLOW_API_KEY,
-            "confidence": confidence / 100.0,
-            "overlap": overlap / 100.0
-        }
-        
-        response = requests.post(
-            detect_url,
-            params=params,
-            data=img_base64,
-            headers={"Content-Type": "application/x-www-form-urlencoded"}
-        )
-        
-        if response.status_code != 200:
-            logger.error(f"Roboflow API error: {response.status_code} - {response.text}")
-            raise HTTPException(status_code=response.status_code, detail=f"Roboflow API error: {response.text}")
-        
-        result = response.json()
-        logger.info(f"Roboflow response received")
-        
-        # Process predictions with confidence threshold
-        rooms = []
-        doors = []
-        walls = []
-        
-        predictions = []
+        requested_confidence = confidence
+        confidence = effective_confidence(confidence)
+        cache_key = make_cache_key(contents, "detect-roboflow", {
+            "raw": raw_predictions_key(contents),
+            "confidence": confidence,
+            "overlap": overlap,
+            "perClassNms": per_class_nms,
+            "softNms": soft_nms,
+            "detector": DETECTOR_VERSION if UNIFIED_DETECTOR_AVAILABLE else None
+        })
+        cached = await cache_get(cache_key)
+        if cached is not None:
+            logger.info("Roboflow detection served from cache")
+            return cached_response(cached, hit=True)
         
-        # Extract predictions from Roboflow response
-        if isinstance(result, list) and len(result) > 0:
-            for item in result:
-                if isinstance(item, dict):
-                    if 'predictions' in item:
-                        predictions.extend(item.get('predictions', []))
-                    elif 'output' in item:
-                        output = item['output']
-                        if isinstance(output, dict) and 'predictions' in output:
-                            predictions.extend(output['predictions'])
-        elif isinstance(result, dict):
-            if 'predictions' in result:
-                predictions = result['predictions']
+        raw = await fetch_raw_predictions(contents, "detect-roboflow")
+        predictions = raw["predictions"]
         
         logger.info(f"Processing {len(predictions)} predictions")
+        logger.info(f"Thresholds - Confidence: {confidence}%, Overlap: {overlap}%")
         
-        conf_threshold = confidence / 100.0
-        overlap_threshold = overlap / 100.0
-        
-        for i, pred in enumerate(predictions):
-            pred_conf = pred.get('confidence', 0)
-            
-            # Apply confidence threshold
-            if pred_conf < conf_threshold:
-                continue
-            
-            x = pred.get('x', 0)
-            y = pred.get('y', 0)
-            width = pred.get('width', 0)
-            height = pred.get('height', 0)
-            
-            x1 = x - width / 2
-            y1 = y - height / 2
-            x2 = x + width / 2
-            y2 = y + height / 2
-            
-            class_name = pred.get('class', '').lower()
-            
-            item_data = {
-                "id": f"{class_name}_{i+1}",
-                "name": pred.get('class', f'Room {i+1}'),
-                "position": {
-                    "start": {"x": float(x1), "y": float(y1)},
-                    "end": {"x": float(x2), "y": float(y2)}
-                },
-                "center": {"x": float(x), "y": float(y)},
-                "area": float(width * height),
-                "confidence": float(pred_conf),
-                "class": class_name,
-                "type": "room" if 'room' in class_name or 'space' in class_name else class_name
-            }
-            
-            # Categorize by class name
-            if 'door' in class_name:
-                doors.append({
-                    "id": f"door_{len(doors)+1}",
-                    "hinge": {"x": float(x), "y": float(y)},
-                    "width": float(max(width, height)),
-                    "swing_angle": 90,
-                    "confidence": float(pred_conf),
-                    "type": "door"
-                })
-            elif 'wall' in class_name:
-                walls.append({
-                    "id": f"wall_{len(walls)+1}",
-                    "position": {
-                        "start": {"x": float(x1), "y": float(y1)},
-                        "end": {"x": float(x2), "y": float(y2)}
-                    },
-                    "confidence": float(pred_conf),
-                    "type": "wall"
-                })
-            else:
-                # Treat as room/space
-                rooms.append(item_data)
-        
-        # Apply NMS (Non-Maximum Suppression) to remove overlaps
-        rooms = apply_nms(rooms, overlap_threshold)
+        thresholded = await run_in_thread("detect-roboflow", threshold_predictions, predictions,
+                                          confidence, overlap, per_class_nms, soft_nms)
+        rooms, doors = thresholded["rooms"], thresholded["doors"]
         
         detections = {
-            "rooms": rooms,
-            "doors": doors,
-            "walls": walls,
+            **thresholded,
             "hallways": [],
             "stairs": [],
             "texts": [],
-            "imageSize": {"width": image_width, "height": image_height}
+            "imageSize": raw["imageSize"]
         }
         
         # Build navigation graph
         if UNIFIED_DETECTOR_AVAILABLE:
             detector = FloorPlanDetector()
-            graph = detector.build_navigation_graph(detections)
+            graph = await run_in_thread("detect-roboflow", detector.build_navigation_graph, detections)
         else:
             graph = {"nodes": [], "edges": [], "metadata": {}}
         
         logger.info(f"Roboflow detection complete: {len(rooms)} rooms, {len(doors)} doors")
         
-        return {
+        response_data = {
             "success": True,
             "detections": detections,
             "navigationGraph": graph,
             "thresholds": {
                 "confidence": confidence,
+                "requestedConfidence": requested_confidence,
                 "overlap": overlap
             }
         }
+        await cache_put(cache_key, response_data)
+        return cached_response(response_data, hit=False)
         
     except HTTPException:
         raise
@@ -568,77 +997,115 @@ async def detect_roboflow(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def apply_nms(items: List[Dict], threshold: float) -> List[Dict]:
-    """Apply Non-Maximum Suppression to filter overlapping detections."""
-    if not items:
-        return items
+@app.post("/detect-roboflow/sweep")
+async def detect_roboflow_sweep(
+    image: UploadFile = File(...),
+    confidences: str = ",".join(str(c) for c in range(5, 100, 5)),
+    overlaps: str = "30",
+    per_class_nms: bool = False,
+    soft_nms: bool = False
+):
+    """
+    Detection counts across many thresholds in one call, for tuning.
+    
+    Uses the same fetched-once predictions as /detect-roboflow, so after the
+    first call for an image no model or network call is made.
     
-    # Sort by confidence descending
-    sorted_items = sorted(items, key=lambda x: x.get('confidence', 0), reverse=True)
+    Args:
+        image: Floor plan image
+        confidences: Comma-separated confidence thresholds (0-100), clamped
+            to ROBOFLOW_FETCH_CONFIDENCE
+        overlaps: Comma-separated overlap/NMS thresholds (0-100)
+        per_class_nms: Only suppress overlapping rooms of the same class
+        soft_nms: Decay overlapping room confidences instead of dropping them
+        
+    Returns:
+        Room, door and wall counts for every confidence/overlap pair
+    """
+    if not roboflow_client and local_detector is None:
+        raise HTTPException(status_code=500, detail="Roboflow client not available")
     
-    kept = []
-    for item in sorted_items:
-        overlap_found = False
-        for kept_item in kept:
-            iou = calculate_iou(item, kept_item)
-            if iou > threshold:
-                overlap_found = True
-                break
-        if not overlap_found:
-            kept.append(item)
+    # Clamped points would repeat the fetch-confidence point
+    confidence_list = list(dict.fromkeys(effective_confidence(c)
+                                         for c in parse_thresholds(confidences, "confidences")))
+    overlap_list = parse_thresholds(overlaps, "overlaps")
+    if len(confidence_list) * len(overlap_list) > SWEEP_MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"At most {SWEEP_MAX_POINTS} threshold pairs per sweep")
     
-    return kept
+    try:
+        if not image.content_type.startswith('image/'):
+            raise HTTPException(status_code=400, detail="File must be an image")
+        
+        contents = await image.read()
+        if len(contents) > MAX_FILE_SIZE:
+            raise HTTPException(status_code=400, detail="File size exceeds limit")
+        
+        raw = await fetch_raw_predictions(contents, "detect-roboflow")
+        sweep = await run_in_thread("detect-roboflow", sweep_counts, raw["predictions"],
+                                    confidence_list, overlap_list, per_class_nms, soft_nms)
+        return {
+            "success": True,
+            "imageSize": raw["imageSize"],
+            "predictions": len(raw["predictions"]),
+            "sweep": sweep
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Roboflow sweep error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 
-def calculate_iou(box1: Dict, box2: Dict) -> float:
-    """Calculate Intersection over Union for two boxes."""
-    x1_1 = box1["position"]["start"]["x"]
-    y1_1 = box1["position"]["start"]["y"]
-    x2_1 = box1["position"]["end"]["x"]
-    y2_1 = box1["position"]["end"]["y"]
-    
-    x1_2 = box2["position"]["start"]["x"]
-    y1_2 = box2["position"]["start"]["y"]
-    x2_2 = box2["position"]["end"]["x"]
-    y2_2 = box2["position"]["end"]["y"]
-    
-    x_left = max(x1_1, x1_2)
-    y_top = max(y1_1, y1_2)
-    x_right = min(x2_1, x2_2)
-    y_bottom = min(y2_1, y2_2)
+def boxes_from_items(items: List[Dict]) -> np.ndarray:
+    """Convert detection dicts into an (N, 4) x1, y1, x2, y2 array."""
+    return np.array([
+        [item["position"]["start"]["x"], item["position"]["start"]["y"],
+         item["position"]["end"]["x"], item["position"]["end"]["y"]]
+        for item in items
+    ], dtype=np.float64).reshape(-1, 4)
+
+
+def apply_nms(items: List[Dict], threshold: float, per_class: bool = False,
+              soft: bool = False) -> List[Dict]:
+    """
+    Apply Non-Maximum Suppression to filter overlapping detections.
     
-    if x_right < x_left or y_bottom < y_top:
-        return 0.0
+    Args:
+        items: Detections with position.start/end and confidence
+        threshold: IoU above which the lower-confidence detection is dropped
+        per_class: Only suppress detections of the same class
+        soft: Decay overlapping confidences (soft-NMS) instead of dropping
+        
+    Returns:
+        Surviving detections, highest confidence first. With soft-NMS the
+        survivors are copies carrying their decayed confidence.
+    """
+    if not items:
+        return items
     
-    intersection = (x_right - x_left) * (y_bottom - y_top)
-    area1 = (x2_1 - x1_1) * (y2_1 - y1_1)
-    area2 = (x2_2 - x1_2) * (y2_2 - y1_2)
-    union = area1 + area2 - intersection
+    scores = np.array([item.get('confidence', 0) for item in items], dtype=np.float64)
+    classes = np.array([item.get('class', '') for item in items]) if per_class else None
+    keep, kept_scores = nms_indices(boxes_from_items(items), scores, threshold,
+                                    classes=classes, soft=soft)
     
-    return intersection / union if union > 0 else 0.0
+    if not soft:
+        return [items[i] for i in keep]
+    return [{**items[i], "confidence": float(score)} for i, score in zip(keep, kept_scores)]
 
 
 # ============================================================================
 # UNIFIED DETECTION + PATHFINDING ENDPOINTS
 # ============================================================================
 
-# Import unified detector and pathfinder
-try:
-    from unified_detector import FloorPlanDetector
-    from pathfinder import find_path, find_path_by_name, get_directions, search_nodes_by_name
-    UNIFIED_DETECTOR_AVAILABLE = True
-except ImportError as e:
-    UNIFIED_DETECTOR_AVAILABLE = False
-    logger.warning(f"Unified detector not available: {e}")
-
-
 @app.post("/detect-unified")
 async def detect_unified(image: UploadFile = File(...)):
     """
     Run unified detection pipeline (OpenCV + OCR).
     
     Returns walls, rooms with names, doors, hallways, stairs, and navigation graph.
-    This provides better room detection than Roboflow alone.
+    This provides better room detection than Roboflow alone. The floorId in
+    the response identifies the floor for /locate and /query-bbox.
     """
     if not UNIFIED_DETECTOR_AVAILABLE:
         raise HTTPException(status_code=500, detail="Unified detector not available")
@@ -652,30 +1119,35 @@ async def detect_unified(image: UploadFile = File(...)):
         if len(contents) > MAX_FILE_SIZE:
             raise HTTPException(status_code=400, detail="File size exceeds limit")
         
-        # Decode image
-        nparr = np.frombuffer(contents, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        cache_key = make_cache_key(contents, "detect-unified", {"detector": DETECTOR_VERSION})
+        cached = await cache_get(cache_key)
+        if cached is not None:
+            logger.info(f"Unified detection for {image.filename} served from cache")
+            # Entries written by detection jobs predate the floorId field
+            return cached_response({**cached, "floorId": cache_key}, hit=True)
         
-        if img is None:
+        # Run unified detection and build the navigation graph off the event loop
+        try:
+            result = await run_in_process("detect-unified", process_floor_plan_bytes, contents)
+        except ValueError:
             raise HTTPException(status_code=400, detail="Could not decode image")
+        detections = result["detections"]
+        graph = result["navigationGraph"]
         
-        logger.info(f"Processing image: {image.filename} ({img.shape[1]}x{img.shape[0]})")
-        
-        # Run unified detection
-        detector = FloorPlanDetector()
-        detections = detector.detect_all(img)
-        
-        # Build navigation graph
-        graph = detector.build_navigation_graph(detections)
-        
-        logger.info(f"Unified detection complete: {len(detections['rooms'])} rooms, "
+        size = detections["imageSize"]
+        logger.info(f"Unified detection complete for {image.filename} ({size['width']}x{size['height']}): "
+                   f"{len(detections['rooms'])} rooms, "
                    f"{len(graph['nodes'])} nodes, {len(graph['edges'])} edges")
         
-        return {
+        response_data = {
             "success": True,
+            "floorId": cache_key,
             "detections": detections,
             "navigationGraph": graph
         }
+        await cache_put(cache_key, response_data)
+        await run_in_thread("spatial-query", floor_registry.register, cache_key, response_data)
+        return cached_response(response_data, hit=False)
         
     except HTTPException:
         raise
@@ -684,6 +1156,426 @@ async def detect_unified(image: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ============================================================================
+# ASYNCHRONOUS DETECTION JOBS
+# ============================================================================
+
+FLOOR_INDEX_MAX = int(os.getenv("FLOOR_INDEX_MAX", "32"))
+
+# Spatial indexes of detected floors, keyed by floorId (the result cache key)
+floor_registry = FloorRegistry(
+    cache=result_cache,
+    max_floors=FLOOR_INDEX_MAX
+) if UNIFIED_DETECTOR_AVAILABLE else None
+
+
+@app.post("/jobs/detect", status_code=202)
+async def submit_detection_job(image: UploadFile = File(...)):
+    """
+    Queue unified detection (OpenCV + OCR) and return a job id immediately.
+    
+    Poll GET /jobs/{job_id} for per-stage progress and the result, which has
+    the same shape as the /detect-unified response. The job keeps running if
+    the client disconnects, and its result is kept for DETECTION_JOB_TTL.
+    """
+    if not UNIFIED_DETECTOR_AVAILABLE:
+        raise HTTPException(status_code=500, detail="Unified detector not available")
+    
+    if not image.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    
+    contents = await image.read()
+    if len(contents) > MAX_FILE_SIZE:
+        raise HTTPException(status_code=400, detail="File size exceeds limit")
+    
+    cache_key = make_cache_key(contents, "detect-unified", {"detector": DETECTOR_VERSION})
+    cached = await cache_get(cache_key)
+    try:
+        job = job_manager.submit(contents, filename=image.filename, cache_key=cache_key, cached=cached)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    
+    logger.info(f"Queued detection job {job['jobId']} for {image.filename} ({job['status']})")
+    job["statusUrl"] = f"/jobs/{job['jobId']}"
+    job["floorId"] = cache_key
+    return job
+
+
+@app.get("/jobs/{job_id}")
+async def get_detection_job(job_id: str):
+    """Return status, per-stage progress and (when done) the result of a job."""
+    if not UNIFIED_DETECTOR_AVAILABLE:
+        raise HTTPException(status_code=500, detail="Unified detector not available")
+    
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+
+@app.on_event("shutdown")
+def shutdown_executors():
+    """Stop detection worker processes and the CPU thread pool."""
+    if job_manager is not None:
+        job_manager.shutdown()
+    cpu_pool.shutdown(wait=False, cancel_futures=True)
+
+
+@app.on_event("shutdown")
+async def close_roboflow_client():
+    """Close pooled Roboflow connections."""
+    if roboflow_client is not None:
+        await roboflow_client.aclose()
+
+
+def encode_stage_event(stage: str, output: Dict[str, Any], stream_format: str) -> str:
+    """Serialize one detection stage as an NDJSON line or an SSE event."""
+    payload = json.dumps({"stage": stage, **output})
+    if stream_format == "sse":
+        return f"event: {stage}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+
+@app.post("/detect-unified/stream")
+async def detect_unified_stream(image: UploadFile = File(...), format: str = "ndjson"):
+    """
+    Streaming variant of /detect-unified.
+    
+    Emits each stage's output as soon as it is ready, in this order:
+    preprocess (imageSize), walls, rooms, doors, hallways, stairs,
+    ocr (texts + OCR-named rooms) and graph (navigationGraph). Failures are
+    reported as a final "error" event.
+    
+    Args:
+        image: Floor plan image
+        format: "ndjson" (newline-delimited JSON, default) or "sse"
+            (server-sent events, one event per stage)
+    """
+    if not UNIFIED_DETECTOR_AVAILABLE:
+        raise HTTPException(status_code=500, detail="Unified detector not available")
+    
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'sse'")
+    
+    if not image.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    
+    contents = await image.read()
+    if len(contents) > MAX_FILE_SIZE:
+        raise HTTPException(status_code=400, detail="File size exceeds limit")
+    
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+    
+    def on_stage(stage: str, output: Dict[str, Any]) -> None:
+        loop.call_soon_threadsafe(events.put_nowait, (stage, output))
+    
+    cache_key = make_cache_key(contents, "detect-unified", {"detector": DETECTOR_VERSION})
+    cached = await cache_get(cache_key)
+    try:
+        job = job_manager.submit(contents, filename=image.filename,
+                                 cache_key=cache_key, listener=on_stage, cached=cached)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    
+    if job["cached"]:
+        for stage, output in replay_stages(job["result"]):
+            events.put_nowait((stage, output))
+    
+    async def stream():
+        # The job keeps running (and fills the cache) if the client goes away
+        while True:
+            stage, output = await events.get()
+            yield encode_stage_event(stage, output, format)
+            if stage in ("graph", "error"):
+                return
+    
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(stream(), media_type=media_type, headers={
+        "X-Cache": "hit" if job["cached"] else "miss",
+        "X-Job-Id": job["jobId"],
+        "X-Floor-Id": cache_key
+    })
+
+
+# ============================================================================
+# COMBINED DETECTION
+# ============================================================================
+# The unified pipeline and the ML backend run concurrently; the response is
+# sent at the caller's deadline with whatever has finished. Unfinished parts
+# keep running (and fill the result cache), so a repeat call or a poll of the
+# unified job picks them up later.
+
+COMBINED_MAX_DEADLINE = float(os.getenv("COMBINED_MAX_DEADLINE", "120"))  # seconds
+
+
+# Unified runs started by /detect-combined that are still in progress, by
+# cache key, so a repeat call attaches to the running job instead of queueing
+# the same image again
+combined_cv_runs: Dict[str, Dict[str, Any]] = {}
+
+
+def _retrieve_exception(task: asyncio.Future) -> None:
+    """Done callback for background tasks nobody awaits after the deadline."""
+    if not task.cancelled():
+        task.exception()
+
+
+def start_combined_cv_run(cache_key: str, contents: bytes, filename: str,
+                          cached: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Start (or join) unified detection of an image for /detect-combined.
+    `cached` is the image's cached unified result, if any.
+    
+    Returns the run's state: jobId, the stage outputs received so far and
+    an event set once the graph or an error has arrived.
+    
+    Raises:
+        QueueFullError: If the detection queue is full
+    """
+    run = combined_cv_runs.get(cache_key)
+    if run is not None:
+        return run
+    
+    loop = asyncio.get_running_loop()
+    run = {"jobId": None, "stages": {}, "finished": asyncio.Event()}
+    
+    def record_stage(stage: str, output: Dict[str, Any]) -> None:
+        run["stages"][stage] = output
+        if stage in ("graph", "error"):
+            run["finished"].set()
+            combined_cv_runs.pop(cache_key, None)
+    
+    def on_stage(stage: str, output: Dict[str, Any]) -> None:
+        loop.call_soon_threadsafe(record_stage, stage, output)
+    
+    job = job_manager.submit(contents, filename=filename, cache_key=cache_key, listener=on_stage,
+                             cached=cached)
+    run["jobId"] = job["jobId"]
+    if job["cached"]:
+        for stage, output in replay_stages(job["result"]):
+            record_stage(stage, output)
+    else:
+        combined_cv_runs[cache_key] = run
+    return run
+
+
+@app.post("/detect-combined")
+async def detect_combined(
+    image: UploadFile = File(...),
+    deadline: float = 15.0,
+    confidence: float = 40,
+    overlap: float = 30,
+    merge_iou: float = 30,
+    per_class_nms: bool = False,
+    soft_nms: bool = False
+):
+    """
+    Run unified detection (OpenCV + OCR) and the ML backend concurrently.
+    
+    Returns by `deadline` seconds with the merged rooms, doors and walls of
+    whatever has finished. Each backend is reported under "backends" as
+    done, pending, failed or unavailable, and "pending" lists the ones still
+    running; unified stages that finished before the deadline are included
+    even if the pipeline is still running. Poll the unified job's statusUrl
+    or call again for the rest.
+    
+    Args:
+        image: Floor plan image
+        deadline: Seconds to wait for the backends (0 returns cached parts only)
+        confidence: ML confidence threshold (0-100), default 40; clamped to
+            ROBOFLOW_FETCH_CONFIDENCE
+        overlap: ML overlap/NMS threshold (0-100), default 30
+        merge_iou: IoU (0-100) above which an ML room or door is the same
+            object as a unified one, default 30
+        per_class_nms: Only suppress overlapping ML rooms of the same class
+        soft_nms: Decay overlapping ML room confidences instead of dropping them
+    """
+    ml_available = roboflow_client is not None or local_detector is not None
+    if not UNIFIED_DETECTOR_AVAILABLE and not ml_available:
+        raise HTTPException(status_code=500, detail="No detection backend available")
+    
+    if not image.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    
+    contents = await image.read()
+    if len(contents) > MAX_FILE_SIZE:
+        raise HTTPException(status_code=400, detail="File size exceeds limit")
+    
+    deadline = min(max(deadline, 0.0), COMBINED_MAX_DEADLINE)
+    backends: Dict[str, Dict[str, Any]] = {}
+    waiters = []
+    
+    # Unified pipeline: collect stage outputs as the worker reports them
+    cv_run = None
+    cv_key = None
+    if UNIFIED_DETECTOR_AVAILABLE:
+        cv_key = make_cache_key(contents, "detect-unified", {"detector": DETECTOR_VERSION})
+        cv_cached = await cache_get(cv_key)
+        try:
+            cv_run = start_combined_cv_run(cv_key, contents, image.filename, cv_cached)
+            backends["cv"] = {"jobId": cv_run["jobId"], "statusUrl": f"/jobs/{cv_run['jobId']}"}
+            if not cv_run["finished"].is_set():
+                waiters.append(asyncio.ensure_future(cv_run["finished"].wait()))
+        except QueueFullError as e:
+            backends["cv"] = {"status": "failed", "error": str(e)}
+    else:
+        backends["cv"] = {"status": "unavailable"}
+    
+    # ML backend: raw predictions are fetched once per image and cached
+    ml_task = None
+    if ml_available:
+        ml_task = asyncio.ensure_future(fetch_raw_predictions(contents, "detect-roboflow"))
+        ml_task.add_done_callback(_retrieve_exception)
+        waiters.append(ml_task)
+    else:
+        backends["ml"] = {"status": "unavailable"}
+    
+    if waiters:
+        await asyncio.wait(waiters, timeout=deadline)
+    for waiter in waiters:
+        if waiter is not ml_task and not waiter.done():
+            waiter.cancel()
+    
+    # Unified part: whatever stages arrived
+    cv_detections: Dict[str, Any] = {}
+    graph = None
+    if "status" not in backends["cv"]:
+        cv_stages = cv_run["stages"]
+        for stage in ("preprocess", "walls", "rooms", "doors", "hallways", "stairs", "ocr"):
+            cv_detections.update(cv_stages.get(stage, {}))
+        graph = cv_stages.get("graph", {}).get("navigationGraph")
+        if "error" in cv_stages:
+            backends["cv"].update(status="failed", error=cv_stages["error"].get("error"))
+        else:
+            backends["cv"]["status"] = "done" if graph is not None else "pending"
+        backends["cv"]["completedStages"] = [s for s in PIPELINE_STAGES if s in cv_stages]
+    
+    # ML part: threshold the raw predictions if they arrived in time
+    ml_detections: Dict[str, Any] = {}
+    ml_size = None
+    if ml_task is not None:
+        if not ml_task.done():
+            backends["ml"] = {"status": "pending"}
+        elif ml_task.exception() is not None:
+            error = ml_task.exception()
+            backends["ml"] = {"status": "failed",
+                              "error": error.detail if isinstance(error, HTTPException) else str(error)}
+        else:
+            raw = ml_task.result()
+            ml_size = raw["imageSize"]
+            ml_detections = await run_in_thread("detect-combined", threshold_predictions, raw["predictions"],
+                                                effective_confidence(confidence), overlap, per_class_nms, soft_nms)
+            backends["ml"] = {"status": "done", "predictions": len(raw["predictions"]),
+                              "confidence": effective_confidence(confidence)}
+    
+    merged = await run_in_thread("detect-combined", merge_detections, cv_detections, ml_detections,
+                                 merge_iou / 100.0)
+    pending = [name for name, backend in backends.items() if backend["status"] == "pending"]
+    
+    logger.info(f"Combined detection for {image.filename}: "
+               + ", ".join(f"{name} {backend['status']}" for name, backend in backends.items())
+               + f" - {len(merged['rooms'])} rooms, {len(merged['doors'])} doors")
+    
+    return {
+        "success": True,
+        "complete": not pending,
+        "pending": pending,
+        "floorId": cv_key if backends["cv"]["status"] in ("done", "pending") else None,
+        "backends": backends,
+        "detections": {
+            **merged,
+            "hallways": cv_detections.get("hallways", []),
+            "stairs": cv_detections.get("stairs", []),
+            "texts": cv_detections.get("texts", []),
+            "imageSize": cv_detections.get("imageSize") or ml_size
+        },
+        "navigationGraph": graph
+    }
+
+
+# ============================================================================
+# SPATIAL QUERIES
+# ============================================================================
+
+async def get_floor_index(floor_id: str):
+    """Spatial index of a detected floor, loading it from the result cache if needed."""
+    if not UNIFIED_DETECTOR_AVAILABLE:
+        raise HTTPException(status_code=500, detail="Unified detector not available")
+    
+    index = floor_registry.get(floor_id, load=False)
+    if index is None:
+        index = await run_in_thread("spatial-query", floor_registry.get, floor_id)
+    if index is None:
+        raise HTTPException(status_code=404, detail="Floor not found; run detection again")
+    return index
+
+
+@app.get("/locate")
+async def locate(floor_id: str, x: float, y: float):
+    """
+    Find the room containing a point (tap-to-locate).
+    
+    Args:
+        floor_id: floorId from /detect-unified, /jobs/detect or /rebuild-graph
+        x, y: Point in full-resolution image pixels
+    
+    Returns:
+        The room containing the point, or null
+    """
+    index = await get_floor_index(floor_id)
+    return {
+        "floorId": floor_id,
+        "point": {"x": x, "y": y},
+        "room": index.locate(x, y)
+    }
+
+
+@app.get("/query-bbox")
+async def query_bbox(floor_id: str, x1: float, y1: float, x2: float, y2: float,
+                     types: str = "rooms,doors,walls"):
+    """
+    Find the rooms, doors and walls intersecting a viewport (map rendering).
+    
+    Args:
+        floor_id: floorId from /detect-unified, /jobs/detect or /rebuild-graph
+        x1, y1, x2, y2: Viewport corners in full-resolution image pixels
+        types: Comma-separated subset of rooms, doors, walls
+    """
+    requested = [t.strip() for t in types.split(",") if t.strip()]
+    unknown = [t for t in requested if t not in QUERY_TYPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown types: {', '.join(unknown)}")
+    
+    index = await get_floor_index(floor_id)
+    return {
+        "floorId": floor_id,
+        "bbox": {"x1": min(x1, x2), "y1": min(y1, y2), "x2": max(x1, x2), "y2": max(y1, y2)},
+        **index.query_bbox(x1, y1, x2, y2, requested)
+    }
+
+
+@app.get("/snap")
+async def snap(floor_id: str, x: float, y: float, max_distance: Optional[float] = None):
+    """
+    Snap a point to the nearest edge of a detected floor's navigation graph.
+    
+    Args:
+        floor_id: floorId from /detect-unified, /jobs/detect or /rebuild-graph
+        x, y: Point in full-resolution image pixels
+        max_distance: Optional search radius; beyond it the result is null
+    """
+    index = await get_floor_index(floor_id)
+    # The edge index is built on first use; keep that off the event loop
+    edge_index = await run_in_thread("spatial-query", lambda: index.edge_index)
+    limit = max_distance if max_distance is not None else float("inf")
+    return {
+        "floorId": floor_id,
+        "point": {"x": x, "y": y},
+        "snapped": snap_to_graph(index.graph, x, y, edge_index, limit)
+    }
+
+
 @app.post("/find-path")
 async def api_find_path(start_id: str, end_id: str, algorithm: str = "astar"):
     """
@@ -699,21 +1591,41 @@ from pydantic import BaseModel
 from typing import Optional
 
 class PathfindRequest(BaseModel):
-    graph: Dict[str, Any]  # Navigation graph from detect-unified
-    start_query: str       # Search query for start location
-    end_query: str         # Search query for destination
+    graph: Optional[Dict[str, Any]] = None  # Navigation graph from detect-unified
+    floor_id: Optional[str] = None          # ...or the floorId of a detected floor
+    start_query: Optional[str] = None       # Search query for start location
+    end_query: Optional[str] = None         # Search query for destination
+    start_point: Optional[Dict[str, float]] = None  # {"x", "y"} instead of start_query
+    end_point: Optional[Dict[str, float]] = None    # {"x", "y"} instead of end_query
     algorithm: Optional[str] = "astar"  # "astar" or "dijkstra"
 
 
+def resolve_route_end(graph: Dict[str, Any], query: Optional[str],
+                      point: Optional[Dict[str, float]], label: str):
+    """Turn one end of a route request into a node id or an {"x", "y"} point."""
+    if point is not None:
+        if "x" not in point or "y" not in point:
+            raise HTTPException(status_code=400, detail=f"{label}_point needs x and y")
+        return point
+    if not query:
+        raise HTTPException(status_code=400, detail=f"Provide {label}_query or {label}_point")
+    matches = search_nodes_by_name(graph, query)
+    return matches[0]["id"] if matches else None
+
+
 @app.post("/pathfind")
 async def api_pathfind(request: PathfindRequest):
     """
-    Find path between two locations by name search.
+    Find path between two locations by name search or map coordinates.
     
     Args:
         graph: Navigation graph from /detect-unified response
+        floor_id: floorId of a detected floor, instead of sending the graph
         start_query: Room name/number to start from (e.g. "101", "Lab")
         end_query: Room name/number to go to
+        start_point: {"x", "y"} to start from instead (e.g. a map tap or a
+            kiosk position); it is snapped to the nearest graph edge
+        end_point: {"x", "y"} to go to instead
         algorithm: "astar" (default) or "dijkstra"
     
     Returns:
@@ -722,19 +1634,50 @@ async def api_pathfind(request: PathfindRequest):
     if not UNIFIED_DETECTOR_AVAILABLE:
         raise HTTPException(status_code=500, detail="Pathfinder not available")
     
+    edge_index = None
+    if request.graph is not None:
+        graph = request.graph
+    elif request.floor_id:
+        floor = await get_floor_index(request.floor_id)
+        graph = floor.graph
+        if request.start_point is not None or request.end_point is not None:
+            edge_index = await run_in_thread("spatial-query", lambda: floor.edge_index)
+    else:
+        raise HTTPException(status_code=400, detail="Provide graph or floor_id")
+    
     try:
-        result = find_path_by_name(
-            request.graph, 
-            request.start_query, 
-            request.end_query,
-            request.algorithm
-        )
+        if request.start_point is None and request.end_point is None:
+            result = await run_in_thread(
+                "pathfind",
+                find_path_by_name,
+                graph, 
+                request.start_query, 
+                request.end_query,
+                request.algorithm
+            )
+        else:
+            start = resolve_route_end(graph, request.start_query, request.start_point, "start")
+            end = resolve_route_end(graph, request.end_query, request.end_point, "end")
+            if start is None or end is None:
+                query = request.start_query if start is None else request.end_query
+                return {"found": False, "path": [], "reason": f"No node found matching '{query}'"}
+            result = await run_in_thread(
+                "pathfind",
+                find_path_between,
+                graph,
+                start,
+                end,
+                request.algorithm,
+                edge_index
+            )
         
         if result.get("found"):
             result["directions"] = get_directions(result)
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Pathfinding error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -756,7 +1699,7 @@ async def api_search_nodes(request: SearchRequest):
         raise HTTPException(status_code=500, detail="Search not available")
     
     try:
-        matches = search_nodes_by_name(request.graph, request.query)
+        matches = await run_in_thread("search-nodes", search_nodes_by_name, request.graph, request.query)
         return {
             "query": request.query,
             "results": [
@@ -793,13 +1736,23 @@ async def rebuild_graph(request: EditableGraphRequest):
         detector = FloorPlanDetector()
         
         # Build graph from user-provided detections
-        graph = detector.build_navigation_graph(request.detections)
+        graph = await run_in_thread("rebuild-graph", detector.build_navigation_graph, request.detections)
         
         logger.info(f"Rebuilt graph: {graph['metadata']['nodeCount']} nodes, "
                    f"{graph['metadata']['edgeCount']} edges")
         
+        # Register the edited floor for spatial queries; a label raster from
+        # the original detection no longer matches edited rooms
+        detections = {k: v for k, v in request.detections.items() if k != "roomLabels"}
+        floor_id = make_cache_key(json.dumps(detections, sort_keys=True).encode("utf-8"),
+                                  "rebuild-graph", {"detector": DETECTOR_VERSION})
+        floor = {"detections": detections, "navigationGraph": graph}
+        await cache_put(floor_id, floor)
+        await run_in_thread("spatial-query", floor_registry.register, floor_id, floor)
+        
         return {
             "success": True,
+            "floorId": floor_id,
             "navigationGraph": graph
         }
         
@@ -819,6 +1772,7 @@ def main():
     
     # Initialize Roboflow client
     initialize_roboflow_client()
+    initialize_local_detector()
     
     if roboflow_client:
         logger.info(f"🚀 Starting Floor Plan Detection API with Roboflow backend")
@@ -0,0 +1,59 @@
+"""
+/detect-combined with only the ML backend, as when the unified detector
+(OpenCV + Tesseract pipeline) cannot be imported.
+"""
+
+import importlib
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+PREDICTIONS = [
+    {"x": 50, "y": 50, "width": 40, "height": 40, "confidence": 0.9, "class": "room"},
+    {"x": 200, "y": 50, "width": 30, "height": 10, "confidence": 0.8, "class": "door"},
+    {"x": 150, "y": 150, "width": 200, "height": 8, "confidence": 0.7, "class": "wall"},
+]
+
+
+class FixedDetector:
+    name = "fixed"
+
+    def cache_params(self):
+        return {"backend": "fixed"}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    async def fetch_raw_predictions(contents, endpoint):
+        return {"predictions": PREDICTIONS, "imageSize": {"width": 300, "height": 300}}
+
+    # Re-import run.py with unified_detector unimportable
+    monkeypatch.setenv("RESULT_CACHE_DIR", str(tmp_path))
+    monkeypatch.setitem(sys.modules, "unified_detector", None)
+    for name in ("run", "jobs", "floor_index", "detection_merge"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    run = importlib.import_module("run")
+    assert not run.UNIFIED_DETECTOR_AVAILABLE
+
+    monkeypatch.setattr(run, "local_detector", FixedDetector())
+    monkeypatch.setattr(run, "fetch_raw_predictions", fetch_raw_predictions)
+    return TestClient(run.app)
+
+
+def test_ml_only_merges_ml_detections(client):
+    files = {"image": ("plan.png", b"not decoded", "image/png")}
+    response = client.post("/detect-combined", files=files, params={"deadline": 5})
+    assert response.status_code == 200, response.text
+
+    data = response.json()
+    assert data["complete"] and data["pending"] == []
+    assert data["backends"]["cv"] == {"status": "unavailable"}
+    assert data["backends"]["ml"]["status"] == "done"
+    assert data["floorId"] is None
+
+    detections = data["detections"]
+    assert [len(detections[name]) for name in ("rooms", "doors", "walls")] == [1, 1, 1]
+    assert all(item["sources"] == ["ml"]
+               for name in ("rooms", "doors", "walls") for item in detections[name])
+    assert detections["imageSize"] == {"width": 300, "height": 300}
@@ -0,0 +1,161 @@
+"""
+OnnxDetectorBackend on a tiny synthetic model.
+
+The model "detects" the bounding box of all dark pixels in its input and
+reports it as a single class-0 prediction with score 1 (score 0 when the
+input has no dark pixels), in YOLOv8 (cx, cy, w, h, class scores) or
+YOLOv5 (cx, cy, w, h, objectness, class scores) layout. That is enough to
+check letterboxing, coordinate mapping, tiling and the tile-edge filter
+without a trained model.
+"""
+
+import numpy as np
+import pytest
+
+from detector_backends import DetectorBackend, OnnxDetectorBackend, letterbox, tile_origins
+
+CLASSES = ["door", "room"]
+
+
+def build_dark_box_model(path: str, size: int, yolov5: bool = False, rows_first: bool = False) -> None:
+    onnx = pytest.importorskip("onnx")
+    from onnx import TensorProto, helper, numpy_helper
+
+    xs = np.tile(np.arange(size, dtype=np.float32), (size, 1))[None]
+    ys = np.ascontiguousarray(xs.transpose(0, 2, 1))
+    consts = {
+        "X": xs, "Y": ys, "X1": xs + 1, "Y1": ys + 1,
+        "half": np.array(0.5, np.float32), "one": np.array(1.0, np.float32),
+        # Darker than the letterbox padding (114 / 255)
+        "dark": np.array(0.25, np.float32),
+        "big": np.array(1e6, np.float32), "zero": np.zeros((1, 1, 1), np.float32),
+        "shape": np.array([1, 1, 1], np.int64),
+    }
+    nodes = [
+        helper.make_node("ReduceMean", ["images"], ["gray"], axes=[1], keepdims=0),
+        helper.make_node("Less", ["gray", "dark"], ["is_dark"]),
+        helper.make_node("Cast", ["is_dark"], ["mask"], to=TensorProto.FLOAT),
+        helper.make_node("Sub", ["one", "mask"], ["light"]),
+        helper.make_node("Mul", ["light", "big"], ["penalty"]),
+    ]
+    for axis, (c, c1) in {"x": ("X", "X1"), "y": ("Y", "Y1")}.items():
+        nodes += [
+            helper.make_node("Add", [c, "penalty"], [f"{axis}_free"]),
+            helper.make_node("ReduceMin", [f"{axis}_free"], [f"{axis}1"], keepdims=0),
+            helper.make_node("Mul", [c1, "mask"], [f"{axis}_dark"]),
+            helper.make_node("ReduceMax", [f"{axis}_dark"], [f"{axis}2"], keepdims=0),
+            helper.make_node("Add", [f"{axis}1", f"{axis}2"], [f"{axis}_sum"]),
+            helper.make_node("Mul", [f"{axis}_sum", "half"], [f"c{axis}"]),
+            helper.make_node("Sub", [f"{axis}2", f"{axis}1"], [f"{axis}_len"]),
+        ]
+    nodes.append(helper.make_node("ReduceMax", ["mask"], ["score"], keepdims=0))
+
+    columns = ["cx", "cy", "x_len", "y_len"] + (["score", "one_col", "zero_col"] if yolov5
+                                                else ["score_col", "zero_col"])
+    nodes.append(helper.make_node("Reshape", ["score", "shape"], ["score_col"]))
+    nodes.append(helper.make_node("Reshape", ["one", "shape"], ["one_col"]))
+    nodes.append(helper.make_node("Identity", ["zero"], ["zero_col"]))
+    reshaped = []
+    for name in columns:
+        if name.endswith("_col"):
+            reshaped.append(name)
+            continue
+        nodes.append(helper.make_node("Reshape", [name, "shape"], [f"{name}_r"]))
+        reshaped.append(f"{name}_r")
+    # (1, 1, K) rows-first layout or (1, K, 1) YOLOv8 export layout
+    nodes.append(helper.make_node("Concat", reshaped, ["output"], axis=2 if rows_first else 1))
+
+    graph = helper.make_graph(
+        nodes, "dark_box",
+        [helper.make_tensor_value_info("images", TensorProto.FLOAT, [1, 3, size, size])],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, None)],
+        initializer=[numpy_helper.from_array(v, k) for k, v in consts.items()],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, path)
+
+
+def make_backend(tmp_path, size: int, tile: str = "off", **layout) -> OnnxDetectorBackend:
+    pytest.importorskip("onnxruntime")
+    path = str(tmp_path / "dark_box.onnx")
+    build_dark_box_model(path, size, **layout)
+    return OnnxDetectorBackend(path, CLASSES, input_size=size, tile=tile, threads=1)
+
+
+def plan(width: int, height: int, *boxes) -> np.ndarray:
+    image = np.full((height, width, 3), 255, np.uint8)
+    for x1, y1, x2, y2 in boxes:
+        image[y1:y2, x1:x2] = 0
+    return image
+
+
+def corners(prediction):
+    return (prediction["x"] - prediction["width"] / 2, prediction["y"] - prediction["height"] / 2,
+            prediction["x"] + prediction["width"] / 2, prediction["y"] + prediction["height"] / 2)
+
+
+def test_letterbox_maps_back_to_image_coordinates():
+    padded, scale, pad_x, pad_y = letterbox(np.zeros((100, 300, 3), np.uint8), 150)
+    assert padded.shape == (150, 150, 3)
+    assert scale == 0.5 and pad_x == 0 and pad_y == 50
+    # A model coordinate c maps back as (c - pad) / scale: the centre row
+    assert (75 - pad_y) / scale == 50
+
+
+def test_tile_origins_cover_the_image():
+    assert tile_origins(100, 128, 0.2) == [0]
+    origins = tile_origins(1000, 100, 0.2)
+    assert origins[0] == 0 and origins[-1] == 900
+    assert all(b - a <= 100 for a, b in zip(origins, origins[1:]))
+
+
+@pytest.mark.parametrize("overlap", [-0.1, 1.0, 1.5])
+def test_tile_overlap_outside_unit_interval_is_rejected(overlap):
+    with pytest.raises(ValueError):
+        tile_origins(1000, 100, overlap)
+    with pytest.raises(ValueError):
+        OnnxDetectorBackend("model.onnx", CLASSES, tile_overlap=overlap)
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        DetectorBackend()
+
+
+@pytest.mark.parametrize("layout", [{}, {"yolov5": True}, {"rows_first": True},
+                                    {"yolov5": True, "rows_first": True}])
+def test_whole_image_pass_maps_box_back(tmp_path, layout):
+    backend = make_backend(tmp_path, 64, **layout)
+    predictions = backend.predict(plan(320, 200, (40, 60, 120, 140)), confidence=0.5)
+
+    assert len(predictions) == 1
+    assert predictions[0]["class"] == "door" and predictions[0]["confidence"] == 1.0
+    # One model pixel is 320 / 64 = 5 image pixels
+    assert corners(predictions[0]) == pytest.approx((40, 60, 120, 140), abs=5)
+
+
+def test_no_detection_below_confidence(tmp_path):
+    backend = make_backend(tmp_path, 64)
+    assert backend.predict(plan(200, 200), confidence=0.5) == []
+
+
+def test_tiles_find_objects_too_small_for_the_whole_image_pass(tmp_path):
+    image = plan(1000, 1000, (500, 520, 506, 526))
+
+    assert make_backend(tmp_path, 100, tile="off").predict(image) == []
+
+    predictions = make_backend(tmp_path, 100, tile="auto").predict(image)
+    assert len(predictions) == 1
+    # Tiles run at full resolution, so the box is exact
+    assert corners(predictions[0]) == pytest.approx((500, 520, 506, 526))
+
+
+def test_objects_cut_by_a_tile_edge_come_from_the_tile_containing_them(tmp_path):
+    # Straddles the right edge of the first tile (0-100); the tile starting
+    # at 80 contains it whole
+    image = plan(1000, 1000, (97, 97, 103, 103))
+    predictions = make_backend(tmp_path, 100, tile="on").predict(image)
+
+    assert len(predictions) == 1
+    assert corners(predictions[0]) == pytest.approx((97, 97, 103, 103))
@@ -0,0 +1,38 @@
+"""
+JobManager cache hits: no worker pool, no cache reads, one record per key.
+"""
+
+from jobs import JobManager
+
+RESULT = {"success": True, "detections": {}, "navigationGraph": {"nodes": [], "edges": []}}
+
+
+class UnreadableCache:
+    def get(self, key):
+        raise AssertionError("submit must not read the cache")
+
+    def put(self, key, value):
+        raise AssertionError("cache hits are not written back")
+
+
+def test_cache_hits_share_one_job_record():
+    manager = JobManager(cache=UnreadableCache())
+    first = manager.submit(b"image", filename="a.png", cache_key="floor", cached=RESULT)
+    second = manager.submit(b"image", filename="b.png", cache_key="floor", cached=RESULT)
+
+    assert first["status"] == "done" and first["cached"]
+    assert first["result"] == {**RESULT, "floorId": "floor"}
+    assert second["jobId"] == first["jobId"]
+    assert len(manager._jobs) == 1
+    assert manager._executor is None
+
+
+def test_expired_cache_hit_gets_a_new_record():
+    manager = JobManager(ttl_seconds=0)
+    first = manager.submit(b"image", cache_key="floor", cached=RESULT)
+    manager._jobs[first["jobId"]]["finishedAt"] -= 1
+    second = manager.submit(b"image", cache_key="floor", cached=RESULT)
+
+    assert second["jobId"] != first["jobId"]
+    assert list(manager._jobs) == [second["jobId"]]
+    assert manager.get(first["jobId"]) is None
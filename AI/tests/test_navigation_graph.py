@@ -0,0 +1,124 @@
+"""
+build_navigation_graph connectivity on hand-built detections.
+"""
+
+from typing import Dict, List
+
+import numpy as np
+import pytest
+
+from geometry import segments_cross_segment, wall_segments
+from unified_detector import FloorPlanDetector
+
+
+def wall(k: int, x1: float, y1: float, x2: float, y2: float) -> Dict:
+    return {"id": f"wall_{k}", "position": {"start": {"x": x1, "y": y1}, "end": {"x": x2, "y": y2}}}
+
+
+def room(k: int, x1: float, y1: float, x2: float, y2: float) -> Dict:
+    return {
+        "id": f"room_{k}",
+        "name": f"Room {k}",
+        "position": {"start": {"x": x1, "y": y1}, "end": {"x": x2, "y": y2}},
+        "center": {"x": (x1 + x2) / 2, "y": (y1 + y2) / 2},
+    }
+
+
+def door(k: int, x: float, y: float) -> Dict:
+    return {"id": f"door_{k}", "hinge": {"x": x, "y": y}, "width": 40}
+
+
+def hallway(k: int, *points) -> Dict:
+    return {"id": f"hallway_{k}", "polyline": [{"x": x, "y": y} for x, y in points]}
+
+
+def components(graph: Dict) -> List[set]:
+    neighbours = {node["id"]: set() for node in graph["nodes"]}
+    for edge in graph["edges"]:
+        neighbours[edge["from"]].add(edge["to"])
+        neighbours[edge["to"]].add(edge["from"])
+    seen, parts = set(), []
+    for start in neighbours:
+        if start in seen:
+            continue
+        part, stack = set(), [start]
+        while stack:
+            node = stack.pop()
+            if node not in part:
+                part.add(node)
+                stack.extend(neighbours[node] - part)
+        seen |= part
+        parts.append(part)
+    return parts
+
+
+def corridor_rooms(count: int = 12) -> Dict:
+    """
+    Rooms side by side above a corridor, each with one door onto it. Doors
+    sit near alternate room edges, so each door's nearest neighbour is the
+    door next to it on one side only.
+    """
+    rooms, doors, walls = [], [], []
+    for k in range(count):
+        x = k * 150
+        rooms.append(room(k, x, 0, x + 150, 200))
+        doors.append(door(k, x + (30 if k % 2 == 0 else 120), 210))
+        walls.append(wall(k, x, 0, x, 200))
+    walls.append(wall(count, 0, 320, count * 150, 320))
+    return {"rooms": rooms, "doors": doors, "walls": walls, "hallways": [], "stairs": []}
+
+
+def test_doors_without_hallways_stay_connected():
+    # /detect-roboflow graphs never have hallways
+    graph = FloorPlanDetector().build_navigation_graph(corridor_rooms())
+    assert len(components(graph)) == 1
+
+
+def test_hallways_crossing_without_a_shared_point_are_joined():
+    detections = {
+        "rooms": [], "walls": [], "stairs": [],
+        "doors": [door(0, 0, 510), door(1, 1000, 510), door(2, 510, 0), door(3, 510, 1000)],
+        "hallways": [hallway(0, (0, 500), (1000, 500)), hallway(1, (500, 0), (500, 1000))],
+    }
+    graph = FloorPlanDetector().build_navigation_graph(detections)
+
+    assert len(components(graph)) == 1
+    assert any(node["position"] == pytest.approx({"x": 500, "y": 500}) for node in graph["nodes"])
+
+
+def test_door_does_not_attach_through_a_wall():
+    # The corridor behind the wall is nearer than the one in front of the door
+    detections = {
+        "rooms": [], "stairs": [],
+        "doors": [door(0, 100, 100)],
+        "walls": [wall(0, 0, 130, 400, 130)],
+        "hallways": [hallway(0, (0, 150), (400, 150)), hallway(1, (0, 40), (400, 40))],
+    }
+    graph = FloorPlanDetector().build_navigation_graph(detections)
+    positions = {node["id"]: node["position"] for node in graph["nodes"]}
+
+    attached = [positions[e["to"] if e["from"] == "door_0" else e["from"]]
+                for e in graph["edges"] if "door_0" in (e["from"], e["to"])]
+    assert attached and all(p["y"] == pytest.approx(40) for p in attached)
+
+
+def test_separate_parts_behind_walls_stay_separate():
+    detections = corridor_rooms(2)
+    detections["walls"].append(wall(9, 150, 0, 150, 400))
+    graph = FloorPlanDetector().build_navigation_graph(detections)
+    assert len(components(graph)) == 2
+
+
+def test_vectorized_wall_crossing_matches_pairwise_check():
+    rng = np.random.default_rng(0)
+    # Integer coordinates give plenty of touching and collinear cases
+    walls = [wall(k, *rng.integers(0, 20, size=4).tolist()) for k in range(200)]
+    detector = FloorPlanDetector()
+    for _ in range(200):
+        x1, y1, x2, y2 = rng.integers(0, 20, size=4).tolist()
+        p1, p2 = {"x": x1, "y": y1}, {"x": x2, "y": y2}
+        expected = [detector._segments_intersect((x1, y1), (x2, y2),
+                                                 (w["position"]["start"]["x"], w["position"]["start"]["y"]),
+                                                 (w["position"]["end"]["x"], w["position"]["end"]["y"]))
+                    for w in walls]
+        assert segments_cross_segment(wall_segments(walls), p1, p2).tolist() == expected
@@ -0,0 +1,139 @@
+"""
+Vectorized NMS must keep exactly what the original per-pair loop kept.
+
+reference_apply_nms and reference_iou are the loop implementation that
+run.py used before nms.py existed.
+"""
+
+from typing import Dict, List
+
+import numpy as np
+import pytest
+
+from nms import box_iou, nms_indices
+from run import apply_nms
+
+
+def reference_iou(box1: Dict, box2: Dict) -> float:
+    x1_1, y1_1 = box1["position"]["start"]["x"], box1["position"]["start"]["y"]
+    x2_1, y2_1 = box1["position"]["end"]["x"], box1["position"]["end"]["y"]
+    x1_2, y1_2 = box2["position"]["start"]["x"], box2["position"]["start"]["y"]
+    x2_2, y2_2 = box2["position"]["end"]["x"], box2["position"]["end"]["y"]
+
+    x_left = max(x1_1, x1_2)
+    y_top = max(y1_1, y1_2)
+    x_right = min(x2_1, x2_2)
+    y_bottom = min(y2_1, y2_2)
+    if x_right < x_left or y_bottom < y_top:
+        return 0.0
+
+    intersection = (x_right - x_left) * (y_bottom - y_top)
+    area1 = (x2_1 - x1_1) * (y2_1 - y1_1)
+    area2 = (x2_2 - x1_2) * (y2_2 - y1_2)
+    union = area1 + area2 - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def reference_apply_nms(items: List[Dict], threshold: float) -> List[Dict]:
+    kept = []
+    for item in sorted(items, key=lambda x: x.get("confidence", 0), reverse=True):
+        if not any(reference_iou(item, k) > threshold for k in kept):
+            kept.append(item)
+    return kept
+
+
+def reference_per_class(items: List[Dict], threshold: float) -> List[Dict]:
+    """The loop run separately per class, merged back in selection order."""
+    kept = []
+    for name in {item.get("class", "") for item in items}:
+        kept += reference_apply_nms([i for i in items if i.get("class", "") == name], threshold)
+    order = {id(item): k for k, item in enumerate(sorted(items, key=lambda x: x.get("confidence", 0),
+                                                          reverse=True))}
+    return sorted(kept, key=lambda item: order[id(item)])
+
+
+def make_item(k: int, x1: float, y1: float, x2: float, y2: float,
+              confidence: float, cls: str = "room") -> Dict:
+    return {
+        "id": f"room_{k}",
+        "class": cls,
+        "confidence": confidence,
+        "position": {"start": {"x": x1, "y": y1}, "end": {"x": x2, "y": y2}},
+    }
+
+
+def random_items(seed: int, n: int = 60, classes=("room",), ties: bool = False) -> List[Dict]:
+    rng = np.random.default_rng(seed)
+    items = []
+    for k in range(n):
+        x1, y1 = rng.integers(0, 400, size=2).tolist()
+        w, h = rng.integers(0, 120, size=2).tolist()
+        confidence = round(float(rng.choice([0.5, 0.7, 0.9])), 2) if ties else float(rng.random())
+        items.append(make_item(k, x1, y1, x1 + w, y1 + h, confidence, str(rng.choice(classes))))
+    return items
+
+
+def ids(items: List[Dict]) -> List[str]:
+    return [item["id"] for item in items]
+
+
+@pytest.mark.parametrize("threshold", [0.0, 0.1, 0.3, 0.5, 0.9, 1.0])
+@pytest.mark.parametrize("seed", range(5))
+def test_hard_nms_matches_reference(seed, threshold):
+    items = random_items(seed)
+    assert ids(apply_nms(items, threshold)) == ids(reference_apply_nms(items, threshold))
+
+
+@pytest.mark.parametrize("threshold", [0.0, 0.3, 1.0])
+@pytest.mark.parametrize("seed", range(5))
+def test_tied_confidences_keep_input_order(seed, threshold):
+    items = random_items(seed, ties=True)
+    assert ids(apply_nms(items, threshold)) == ids(reference_apply_nms(items, threshold))
+
+
+@pytest.mark.parametrize("threshold", [0.0, 0.3, 1.0])
+def test_zero_area_boxes(threshold):
+    items = [
+        make_item(0, 10, 10, 10, 10, 0.9),     # point
+        make_item(1, 10, 10, 10, 10, 0.8),     # same point
+        make_item(2, 0, 10, 50, 10, 0.7),      # horizontal line through it
+        make_item(3, 0, 0, 50, 50, 0.6),       # box containing all of them
+        make_item(4, 50, 0, 100, 50, 0.5),     # box touching box 3 along an edge
+        make_item(5, 0, 0, 50, 50, 0.4),       # duplicate of box 3
+    ]
+    assert ids(apply_nms(items, threshold)) == ids(reference_apply_nms(items, threshold))
+
+
+@pytest.mark.parametrize("threshold", [0.0, 0.3, 1.0])
+@pytest.mark.parametrize("seed", range(5))
+def test_per_class_matches_reference_per_class(seed, threshold):
+    items = random_items(seed, classes=("room", "door", "wall"))
+    assert ids(apply_nms(items, threshold, per_class=True)) == \
+        ids(reference_per_class(items, threshold))
+
+
+def test_box_iou_matches_reference():
+    items = random_items(7, n=40)
+    boxes = np.array([[i["position"]["start"]["x"], i["position"]["start"]["y"],
+                       i["position"]["end"]["x"], i["position"]["end"]["y"]] for i in items],
+                     dtype=np.float64)
+    for k, item in enumerate(items):
+        expected = [reference_iou(item, other) for other in items]
+        assert box_iou(boxes[k], boxes).tolist() == pytest.approx(expected, abs=1e-12)
+
+
+def test_soft_nms_only_decays_scores():
+    items = random_items(3)
+    original = {item["id"]: item["confidence"] for item in items}
+    soft = apply_nms(items, 0.3, soft=True)
+    # The top box is never decayed, the rest never gain confidence
+    assert soft[0]["id"] == reference_apply_nms(items, 0.3)[0]["id"]
+    assert soft[0]["confidence"] == original[soft[0]["id"]]
+    assert all(item["confidence"] <= original[item["id"]] for item in soft)
+    assert all(item["confidence"] >= 0.001 for item in soft)
+
+
+def test_empty_input():
+    keep, scores = nms_indices(np.zeros((0, 4)), np.zeros(0), 0.5)
+    assert keep.tolist() == [] and scores.tolist() == []
+    assert apply_nms([], 0.5) == []
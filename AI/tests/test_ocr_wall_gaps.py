@@ -0,0 +1,38 @@
+"""
+Wall-gap sweep in Shared/ocr_extract.py.
+"""
+
+import pytest
+
+pytest.importorskip("pytesseract")
+
+from batch_process import import_ocr_extract  # noqa: E402
+
+ocr_extract = import_ocr_extract()
+
+
+def horizontal(center: float, start: float, end: float):
+    return (start, center, end, center)
+
+
+def test_gap_between_walls_on_one_line():
+    walls = [horizontal(100, 0, 100), horizontal(102, 140, 300)]
+    gaps = ocr_extract.find_gaps_in_wall_group(walls, "horizontal", gap_threshold=80)
+
+    assert [(g["center"], g["width"]) for g in gaps] == [((120, 101), 40)]
+
+
+def test_rows_split_on_consecutive_centers_only():
+    # Centers 0, 15, 25: 25 is more than row_tolerance from the first
+    # center, but only 10 px from its neighbour, so all three share a row
+    walls = [horizontal(0, 0, 100), horizontal(15, 300, 400), horizontal(25, 440, 540)]
+    gaps = ocr_extract.find_gaps_in_wall_group(walls, "horizontal", gap_threshold=80)
+
+    assert [(g["endpoints"], g["width"]) for g in gaps] == [([(400, 15), (440, 25)], 40)]
+
+
+def test_vertical_gaps_swap_axes():
+    walls = [(50, 0, 50, 100), (52, 130, 52, 200)]
+    gaps = ocr_extract.find_gaps_in_wall_group(walls, "vertical", gap_threshold=80)
+
+    assert [(g["center"], g["endpoints"]) for g in gaps] == [((51, 115), [(50, 100), (52, 130)])]
@@ -0,0 +1,42 @@
+"""
+Path search metrics for found and unreachable destinations.
+"""
+
+import pytest
+
+import pathfinder
+
+
+def node(node_id: str, x: float, y: float):
+    return {"id": node_id, "name": node_id, "position": {"x": x, "y": y}}
+
+
+GRAPH = {
+    "nodes": [node("a", 0, 0), node("b", 100, 0), node("c", 200, 0), node("d", 500, 500)],
+    "edges": [{"from": "a", "to": "b"}, {"from": "b", "to": "c"}],
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.observed = []
+
+    def observe(self, value, **labels):
+        self.observed.append((value, labels["algorithm"]))
+
+
+@pytest.fixture
+def explored(monkeypatch):
+    recorder = Recorder()
+    monkeypatch.setattr(pathfinder, "PATH_NODES_EXPLORED", recorder)
+    return recorder.observed
+
+
+@pytest.mark.parametrize("algorithm", ["astar", "dijkstra"])
+def test_nodes_explored_is_recorded_for_every_search(explored, algorithm):
+    found = pathfinder.find_path(GRAPH, "a", "c", algorithm=algorithm)
+    missing = pathfinder.find_path(GRAPH, "a", "d", algorithm=algorithm)
+
+    assert found["found"] and found["nodesExplored"] == 3
+    assert not missing["found"] and missing["nodesExplored"] == 3
+    assert explored == [(3, algorithm), (3, algorithm)]
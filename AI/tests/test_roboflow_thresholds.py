@@ -0,0 +1,73 @@
+"""
+/detect-roboflow re-thresholds fetched-once predictions locally.
+
+The raw fetch is replaced by fixed predictions, so no model or network
+call is made.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import run
+from result_cache import ResultCache
+
+PREDICTIONS = [
+    {"x": 50, "y": 50, "width": 40, "height": 40, "confidence": 0.9, "class": "room"},
+    {"x": 200, "y": 50, "width": 40, "height": 40, "confidence": 0.3, "class": "room"},
+    {"x": 50, "y": 200, "width": 40, "height": 40, "confidence": 0.1, "class": "room"},
+]
+
+
+class FixedDetector:
+    name = "fixed"
+
+    def cache_params(self):
+        return {"backend": "fixed"}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    async def fetch_raw_predictions(contents, endpoint):
+        # Only what a fetch at ROBOFLOW_FETCH_CONFIDENCE would return
+        return {
+            "predictions": [p for p in PREDICTIONS
+                            if p["confidence"] * 100 >= run.ROBOFLOW_FETCH_CONFIDENCE],
+            "imageSize": {"width": 300, "height": 300},
+        }
+
+    monkeypatch.setattr(run, "result_cache", ResultCache(str(tmp_path)))
+    monkeypatch.setattr(run, "local_detector", FixedDetector())
+    monkeypatch.setattr(run, "fetch_raw_predictions", fetch_raw_predictions)
+    monkeypatch.setattr(run, "ROBOFLOW_FETCH_CONFIDENCE", 20.0)
+    return TestClient(run.app)
+
+
+def detect(client, **params):
+    files = {"image": ("plan.png", b"not decoded", "image/png")}
+    response = client.post("/detect-roboflow", files=files, params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_confidence_below_fetch_confidence_is_clamped_and_reported(client):
+    data = detect(client, confidence=5)
+
+    assert data["thresholds"] == {"confidence": 20.0, "requestedConfidence": 5.0, "overlap": 30.0}
+    assert len(data["detections"]["rooms"]) == 2
+
+
+def test_confidence_above_fetch_confidence_is_applied(client):
+    data = detect(client, confidence=50)
+
+    assert data["thresholds"]["confidence"] == 50
+    assert [room["confidence"] for room in data["detections"]["rooms"]] == [0.9]
+
+
+def test_sweep_clamps_and_deduplicates_confidences(client):
+    files = {"image": ("plan.png", b"not decoded", "image/png")}
+    response = client.post("/detect-roboflow/sweep", files=files,
+                           params={"confidences": "5,10,20,50", "overlaps": "30"})
+    assert response.status_code == 200, response.text
+
+    sweep = response.json()["sweep"]
+    assert [(point["confidence"], point["rooms"]) for point in sweep] == [(20.0, 2), (50.0, 1)]
@@ -0,0 +1,161 @@
+"""
+UpstreamClient against a local stub server.
+
+The stub answers each request with the next scripted (status, delay)
+pair, so tests can line up failures, slow responses and recovery.
+"""
+
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from upstream import CircuitBreaker, CircuitOpenError, UpstreamClient, UpstreamError
+
+
+class StubServer:
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                stub.calls += 1
+                status, delay = stub.script.pop(0) if stub.script else (200, 0)
+                time.sleep(delay)
+                body = b'{"predictions": []}'
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/detect"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(*script):
+        servers.append(StubServer(*script))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def make_client(**kwargs) -> UpstreamClient:
+    kwargs.setdefault("backoff_base", 0.0)
+    return UpstreamClient(connect_timeout=1, read_timeout=2, **kwargs)
+
+
+async def call(client: UpstreamClient, url: str) -> httpx.Response:
+    try:
+        return await client.request("POST", url, content=b"image")
+    finally:
+        await client.aclose()
+
+
+def test_retries_server_errors_and_rate_limits(stub):
+    server = stub((503, 0), (429, 0), (200, 0))
+    response = asyncio.run(call(make_client(retries=2), server.url))
+
+    assert response.status_code == 200
+    assert server.calls == 3
+
+
+def test_last_retryable_response_is_returned(stub):
+    server = stub((502, 0), (502, 0))
+    response = asyncio.run(call(make_client(retries=1), server.url))
+
+    assert response.status_code == 502
+    assert server.calls == 2
+
+
+def test_client_errors_are_not_retried(stub):
+    server = stub((400, 0))
+    client = make_client(retries=2)
+    response = asyncio.run(call(client, server.url))
+
+    assert response.status_code == 400
+    assert server.calls == 1
+    assert client.breaker.state == "closed"
+
+
+def test_read_timeout_raises_upstream_error(stub):
+    server = stub((200, 1.0))
+    client = UpstreamClient(connect_timeout=1, read_timeout=0.2, retries=0)
+
+    with pytest.raises(UpstreamError):
+        asyncio.run(call(client, server.url))
+    assert client.breaker.failures == 1
+
+
+def test_breaker_opens_and_fails_fast(stub):
+    server = stub((500, 0), (500, 0))
+    client = make_client(retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+
+    async def run():
+        for _ in range(2):
+            assert (await client.request("POST", server.url)).status_code == 500
+        with pytest.raises(CircuitOpenError):
+            await client.request("POST", server.url)
+        await client.aclose()
+
+    asyncio.run(run())
+    assert client.breaker.state == "open"
+    assert server.calls == 2
+
+
+def test_cancelled_half_open_probe_does_not_wedge_the_breaker(stub):
+    server = stub((500, 0), (200, 1.0), (200, 0))
+    client = make_client(retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.05))
+
+    async def run():
+        await client.request("POST", server.url)
+        assert client.breaker.opened_at is not None
+        await asyncio.sleep(0.06)
+
+        # The probe is cancelled while the upstream is still answering
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(client.request("POST", server.url), 0.2)
+
+        response = await client.request("POST", server.url)
+        await client.aclose()
+        return response
+
+    assert asyncio.run(run()).status_code == 200
+    assert client.breaker.state == "closed"
+
+
+def test_probe_ending_in_a_non_transport_error_reopens_the_breaker():
+    def handler(request):
+        raise httpx.DecodingError("bad gzip", request=request)
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    breaker.opened_at -= 60
+    client = make_client(breaker=breaker, transport=httpx.MockTransport(handler))
+
+    with pytest.raises(httpx.DecodingError):
+        asyncio.run(call(client, "http://upstream/detect"))
+    assert breaker.state == "open"
+    assert breaker.allow() is False
@@ -9,16 +9,25 @@ Combines multiple detection methods for maximum accuracy:
 Output: Navigation graph with named nodes
 """
 
+import base64
 import cv2
 import numpy as np
-from typing import List, Dict, Tuple, Optional
+from collections import defaultdict
+from typing import Callable, List, Dict, Tuple, Optional
 import json
 import os
 import sys
+import time
 
 # Add parent directory for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from geometry import segments_cross_segment, wall_segments
+from utils.preprocessing import PreprocessedImage
+from utils.skeleton import skeleton_graph, skeletonize
+from utils.spatial import BoxIndex, GridIndex, neighbor_pairs, union_find_labels
+from metrics import DETECTION_STAGE_SECONDS, REGISTRY
+
 try:
     import pytesseract
     # Set Tesseract path for Windows
@@ -35,6 +44,144 @@ except ImportError:
     print("Warning: pytesseract not installed. OCR will be disabled.")
 
 
+# Bump whenever detection output changes so cached results are invalidated
+DETECTOR_VERSION = "7"
+
+# Multi-resolution settings: the CV stages run on a pyramid level whose
+# longest side is at most WORKING_MAX_DIM and whose strokes are roughly
+# TARGET_STROKE_WIDTH pixels wide. Pixel constants in FloorPlanDetector are
+# full-resolution values; stages convert them to the working level with _px().
+WORKING_MAX_DIM = 2000
+TARGET_STROKE_WIDTH = 3.0
+
+# Stages reported through the `on_stage` callback, in order. Each stage is
+# reported with its output in full-resolution coordinates:
+#   preprocess -> imageSize, processing      ocr   -> texts, rooms (named)
+#   walls/rooms/doors/hallways/stairs -> that list
+#   graph      -> navigationGraph (reported by process_floor_plan_bytes)
+PIPELINE_STAGES = ["preprocess", "walls", "rooms", "doors", "hallways", "stairs", "ocr", "graph"]
+
+# Corridor skeletons are computed on a grid whose longest side is at most
+# SKELETON_MAX_DIM; doors and stairs attach to the nearest skeleton point
+# within HALLWAY_ATTACH_DISTANCE full-resolution pixels.
+SKELETON_MAX_DIM = 800
+HALLWAY_ATTACH_DISTANCE = 300
+
+# A detected room covering at least CORRIDOR_ROOM_MIN_AREA of the image
+# with solidity below CORRIDOR_ROOM_SOLIDITY is usually a corridor or lobby
+# merged with the space it opens onto; hallway tracing keeps it as free space.
+CORRIDOR_ROOM_SOLIDITY = 0.9
+CORRIDOR_ROOM_MIN_AREA = 0.01
+
+
+def estimate_stroke_width(image: PreprocessedImage, sample_step: int = 4) -> float:
+    """
+    Estimate the typical line thickness of a floor plan in pixels.
+    
+    Measures foreground run lengths along every `sample_step`-th row and
+    column of the Otsu-binarized image. Runs across a line are short and
+    far outnumber the runs along it, so the median is the stroke width.
+    """
+    binary = image.otsu_binary()
+    
+    run_lengths = []
+    for mask in (binary[::sample_step] > 0, binary.T[::sample_step] > 0):
+        padded = np.pad(mask, ((0, 0), (1, 1))).astype(np.int8)
+        diff = np.diff(padded, axis=1)
+        starts = np.nonzero(diff == 1)[1]
+        ends = np.nonzero(diff == -1)[1]
+        run_lengths.append(ends - starts)
+    
+    runs = np.concatenate(run_lengths)
+    if runs.size == 0:
+        return 1.0
+    return float(max(1.0, np.median(runs)))
+
+
+def choose_pyramid_level(img_w: int, img_h: int, stroke_width: float) -> int:
+    """
+    Pick how many times to halve the image before running CV stages.
+    
+    The level is the smallest one that brings the longest side under
+    WORKING_MAX_DIM and the stroke width down to about TARGET_STROKE_WIDTH.
+    """
+    size_level = 0
+    longest = max(img_w, img_h)
+    if longest > WORKING_MAX_DIM:
+        size_level = int(np.ceil(np.log2(longest / WORKING_MAX_DIM)))
+    
+    stroke_level = 0
+    if stroke_width > TARGET_STROKE_WIDTH:
+        stroke_level = int(np.floor(np.log2(stroke_width / TARGET_STROKE_WIDTH)))
+    
+    return max(size_level, stroke_level)
+
+
+def encode_label_raster(labels: np.ndarray, scale: float) -> Dict:
+    """
+    Pack a room label raster into a JSON-safe dict.
+    
+    The raster is stored as a base64 16-bit PNG, which is a few KB for a
+    typical plan because labels form large flat regions.
+    
+    Args:
+        labels: int32 raster, value k = rooms[k - 1], 0 = no room
+        scale: Raster / full-resolution ratio
+    """
+    ok, buffer = cv2.imencode(".png", np.clip(labels, 0, 65535).astype(np.uint16))
+    return {
+        "scale": float(scale),
+        "width": int(labels.shape[1]),
+        "height": int(labels.shape[0]),
+        "png": base64.b64encode(buffer.tobytes()).decode("ascii")
+    }
+
+
+def decode_label_raster(data: Dict) -> Tuple[np.ndarray, float]:
+    """Inverse of encode_label_raster: returns (int32 raster, scale)."""
+    buffer = np.frombuffer(base64.b64decode(data["png"]), np.uint8)
+    labels = cv2.imdecode(buffer, cv2.IMREAD_UNCHANGED)
+    if labels is None:
+        raise ValueError("Could not decode room label raster")
+    return labels.astype(np.int32), float(data["scale"])
+
+
+def segment_crossings(segments: List[Tuple[Dict, Dict]], eps: float = 1e-6) -> List[Tuple]:
+    """
+    Where hallway segments cross, or where one ends on another, without
+    sharing a node there.
+    
+    Args:
+        segments: (start node, end node) pairs
+    
+    Returns:
+        (k, l, t, u, point) per crossing of segments k < l; t and u are the
+        crossing's position (0-1) along segment k and l
+    """
+    if len(segments) < 2:
+        return []
+    starts = np.array([[a["position"]["x"], a["position"]["y"]] for a, _ in segments], dtype=np.float64)
+    ends = np.array([[b["position"]["x"], b["position"]["y"]] for _, b in segments], dtype=np.float64)
+    dirs = ends - starts
+    
+    crossings = []
+    for k in range(len(segments) - 1):
+        d, others, e = dirs[k], starts[k + 1:], dirs[k + 1:]
+        w = others - starts[k]
+        denom = d[0] * e[:, 1] - d[1] * e[:, 0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = (w[:, 0] * e[:, 1] - w[:, 1] * e[:, 0]) / denom
+            u = (w[:, 0] * d[1] - w[:, 1] * d[0]) / denom
+        hit = (denom != 0) & (t >= -eps) & (t <= 1 + eps) & (u >= -eps) & (u <= 1 + eps)
+        # Segments touching end to end already share a node
+        hit &= ~(((t <= eps) | (t >= 1 - eps)) & ((u <= eps) | (u >= 1 - eps)))
+        for m in np.flatnonzero(hit).tolist():
+            tk, ul = float(min(max(t[m], 0.0), 1.0)), float(min(max(u[m], 0.0), 1.0))
+            point = {"x": float(starts[k, 0] + tk * d[0]), "y": float(starts[k, 1] + tk * d[1])}
+            crossings.append((k, k + 1 + m, tk, ul, point))
+    return crossings
+
+
 class FloorPlanDetector:
     """
     Unified floor plan detection combining ML and traditional CV.
@@ -43,32 +190,95 @@ class FloorPlanDetector:
     def __init__(self, roboflow_api_key: str = None, roboflow_model_id: str = None):
         self.roboflow_api_key = roboflow_api_key
         self.roboflow_model_id = roboflow_model_id
+        # Working-level / full-resolution ratio of the image being processed
+        self.scale = 1.0
+        # Working-level room label raster of the image being processed
+        self.room_labels = None
         
-    def detect_all(self, image: np.ndarray) -> Dict:
+    def detect_all(self, image,
+                   on_stage: Optional[Callable[[str, Dict], None]] = None) -> Dict:
         """
         Run complete detection pipeline on a floor plan image.
         
+        Walls, rooms, doors, hallways and stairs are detected on a downscaled
+        pyramid level chosen from the image size and stroke width, so the cost
+        does not grow with the upload resolution. Wall candidates are then
+        refined against the full-resolution image and all coordinates are
+        reported in full-resolution pixels. OCR always runs at full resolution.
+        
+        Args:
+            image: BGR or grayscale floor plan image, or a PreprocessedImage
+                whose cached rasters should be reused
+            on_stage: Optional callback invoked as on_stage(stage, output) as
+                soon as each stage in PIPELINE_STAGES has finished
+        
         Returns:
-            Dict with walls, rooms, doors, windows, stairs, hallways, and texts
+            Dict with walls, rooms, doors, windows, stairs, hallways, texts,
+            and the room label raster (roomLabels, see encode_label_raster)
         """
-        img_h, img_w = image.shape[:2]
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+        started = time.perf_counter()
+        full = image if isinstance(image, PreprocessedImage) else PreprocessedImage(image)
+        img_h, img_w = full.height, full.width
+        
+        # Pick the working resolution
+        stroke_width = estimate_stroke_width(full)
+        level = choose_pyramid_level(img_w, img_h, stroke_width)
+        work = full.pyramid(level)
+        self.scale = work.width / img_w
+        work_h, work_w = work.height, work.width
+        
+        stage_started = started
+        
+        def report(stage: str, output: Dict) -> None:
+            nonlocal stage_started
+            now = time.perf_counter()
+            DETECTION_STAGE_SECONDS.observe(now - stage_started, stage=stage)
+            stage_started = now
+            if on_stage:
+                on_stage(stage, output)
+        
+        factor = 1.0 / self.scale
+        processing = {
+            "strokeWidth": stroke_width,
+            "pyramidLevel": level,
+            "workingSize": {"width": work_w, "height": work_h}
+        }
         
         # Preprocess
-        processed = self._preprocess(gray)
+        processed = self._preprocess(work)
+        report("preprocess", {"imageSize": {"width": img_w, "height": img_h},
+                              "processing": processing})
         
-        # Detect elements
+        # Detect elements on the working level, mapping each result back to
+        # full resolution as soon as it is available
         walls = self._detect_walls(processed)
-        rooms = self._detect_rooms(processed, walls, img_w, img_h)
+        if level > 0:
+            self._rescale_detections(factor, walls=walls)
+            walls = self._refine_walls(full, work, walls)
+        report("walls", {"walls": walls})
+        
+        rooms = self._detect_rooms(processed, walls, work_w, work_h)
+        self._rescale_detections(factor, rooms=rooms)
+        report("rooms", {"rooms": rooms})
+        
         doors = self._detect_doors(processed, walls)
-        hallways = self._detect_hallways(processed)
+        self._rescale_detections(factor, doors=doors)
+        report("doors", {"doors": doors})
+        
+        hallways = self._detect_hallways(processed, self.room_labels, rooms)
+        self._rescale_detections(factor, hallways=hallways)
+        report("hallways", {"hallways": hallways})
+        
         stairs = self._detect_stairs(processed)
+        self._rescale_detections(factor, stairs=stairs)
+        report("stairs", {"stairs": stairs})
         
         # OCR for room names
-        texts = self._extract_text(image)
+        texts = self._extract_text(full)
         
         # Associate text with rooms
-        rooms = self._associate_text_with_rooms(rooms, texts)
+        rooms = self._associate_text_with_rooms(rooms, texts, self.room_labels, self.scale)
+        report("ocr", {"texts": texts, "rooms": rooms})
         
         return {
             "walls": walls,
@@ -77,28 +287,25 @@ class FloorPlanDetector:
             "hallways": hallways,
             "stairs": stairs,
             "texts": texts,
-            "imageSize": {"width": img_w, "height": img_h}
+            "imageSize": {"width": img_w, "height": img_h},
+            "processing": processing,
+            "roomLabels": encode_label_raster(self.room_labels, self.scale)
         }
     
-    def _preprocess(self, gray: np.ndarray) -> np.ndarray:
-        """Preprocess image for detection."""
-        # Denoise
-        denoised = cv2.fastNlMeansDenoising(gray, None, 10, 7, 21)
-        
-        # Adaptive threshold for better line detection
-        binary = cv2.adaptiveThreshold(
-            denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-            cv2.THRESH_BINARY_INV, 11, 2
-        )
-        
-        return binary
+    def _px(self, value: float, minimum: int = 1) -> int:
+        """Convert a full-resolution pixel constant to the working level."""
+        return max(minimum, int(round(value * self.scale)))
+    
+    def _preprocess(self, image: PreprocessedImage) -> np.ndarray:
+        """Preprocess image for detection: denoise, then adaptive threshold."""
+        return image.adaptive_binary(block_size=11, c=2, inverse=True, denoise=True)
     
     def _detect_walls(self, binary: np.ndarray) -> List[Dict]:
         """Detect walls using Hough Line Transform."""
         # Detect lines
         lines = cv2.HoughLinesP(
-            binary, rho=1, theta=np.pi/180, threshold=50,
-            minLineLength=30, maxLineGap=10
+            binary, rho=1, theta=np.pi/180, threshold=self._px(50, 10),
+            minLineLength=self._px(30, 5), maxLineGap=self._px(10, 2)
         )
         
         walls = []
@@ -108,7 +315,7 @@ class FloorPlanDetector:
                 length = np.sqrt((x2-x1)**2 + (y2-y1)**2)
                 
                 # Filter short lines
-                if length < 20:
+                if length < self._px(20, 4):
                     continue
                 
                 walls.append({
@@ -125,42 +332,58 @@ class FloorPlanDetector:
     
     def _detect_rooms(self, binary: np.ndarray, walls: List[Dict], 
                       img_w: int, img_h: int) -> List[Dict]:
-        """Detect rooms as enclosed contours."""
+        """
+        Detect rooms as enclosed regions of free space.
+        
+        The free space is labelled once with connectedComponentsWithStats,
+        which gives the bbox of every region; the cheap filters run on those
+        arrays and outlines are only traced for the regions that pass them.
+        A room's area includes the text and fixtures drawn inside it.
+        
+        Also stores the working-level room label raster in self.room_labels
+        (int32, value k = rooms[k - 1], 0 = no room).
+        """
         # Close gaps in walls
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (self._px(5, 3),) * 2)
         closed = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel, iterations=2)
         
         # Invert to find enclosed spaces
         inverted = cv2.bitwise_not(closed)
         
-        # Find contours (rooms are enclosed spaces)
-        contours, hierarchy = cv2.findContours(
-            inverted, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE
+        count, components, stats, _ = cv2.connectedComponentsWithStats(
+            inverted, connectivity=4, ltype=cv2.CV_32S
         )
+        x = stats[:, cv2.CC_STAT_LEFT]
+        y = stats[:, cv2.CC_STAT_TOP]
+        w = stats[:, cv2.CC_STAT_WIDTH]
+        h = stats[:, cv2.CC_STAT_HEIGHT]
         
-        rooms = []
         total_area = img_w * img_h
         min_room_area = total_area * 0.002   # Min 0.2% of image (increased from 0.1%)
         max_room_area = total_area * 0.15    # Max 15% of image (reduced from 50%)
         
-        for i, contour in enumerate(contours):
+        # Filter very thin rectangles (likely corridors, not rooms) and
+        # regions whose bbox cannot hold a room; the bbox bounds the area
+        aspect_ratio = np.maximum(w, h) / np.maximum(np.minimum(w, h), 1)
+        candidate = (w * h >= min_room_area) & (aspect_ratio <= 4)
+        candidate[0] = False  # Walls
+        
+        rooms = []
+        outlines = []
+        for label in np.flatnonzero(candidate).tolist():
+            rx, ry, rw, rh = int(x[label]), int(y[label]), int(w[label]), int(h[label])
+            mask = (components[ry:ry + rh, rx:rx + rw] == label).astype(np.uint8)
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE,
+                                           offset=(rx, ry))
+            contour = max(contours, key=cv2.contourArea)
             area = cv2.contourArea(contour)
             
             # Filter by area - exclude very small and very large (building outline)
             if area < min_room_area or area > max_room_area:
                 continue
             
-            # Get bounding box
-            x, y, w, h = cv2.boundingRect(contour)
-            
-            # Filter very thin rectangles (likely corridors, not rooms)
-            aspect_ratio = max(w, h) / min(w, h) if min(w, h) > 0 else 999
-            if aspect_ratio > 4:  # Reduced from 5 - stricter filtering
-                continue
-            
             # Filter by solidity (ratio of contour area to convex hull area)
-            hull = cv2.convexHull(contour)
-            hull_area = cv2.contourArea(hull)
+            hull_area = cv2.contourArea(cv2.convexHull(contour))
             solidity = area / hull_area if hull_area > 0 else 0
             if solidity < 0.5:  # Rooms should be fairly solid shapes
                 continue
@@ -171,20 +394,27 @@ class FloorPlanDetector:
                 cx = int(M["m10"] / M["m00"])
                 cy = int(M["m01"] / M["m00"])
             else:
-                cx, cy = x + w // 2, y + h // 2
+                cx, cy = rx + rw // 2, ry + rh // 2
             
             rooms.append({
-                "id": f"room_{i+1}",
+                "id": f"room_{label}",
                 "name": f"Room {len(rooms)+1}",  # Will be updated by OCR
                 "position": {
-                    "start": {"x": float(x), "y": float(y)},
-                    "end": {"x": float(x + w), "y": float(y + h)}
+                    "start": {"x": float(rx), "y": float(ry)},
+                    "end": {"x": float(rx + rw), "y": float(ry + rh)}
                 },
                 "center": {"x": float(cx), "y": float(cy)},
                 "area": float(area),
                 "solidity": float(solidity),
                 "type": "room"
             })
+            outlines.append(contour)
+        
+        # Paint filled outlines, largest first, so a room nested inside
+        # another one keeps its own label
+        self.room_labels = np.zeros(components.shape, dtype=np.int32)
+        for k in sorted(range(len(rooms)), key=lambda k: -rooms[k]["area"]):
+            cv2.drawContours(self.room_labels, outlines, k, k + 1, thickness=-1)
         
         return rooms
     
@@ -207,7 +437,8 @@ class FloorPlanDetector:
             circularity = 4 * np.pi * area / (perimeter ** 2)
             
             # Doors have arc-like shapes (partial circles)
-            if 0.1 < circularity < 0.7 and 100 < area < 5000:
+            area_scale = self.scale ** 2
+            if 0.1 < circularity < 0.7 and 100 * area_scale < area < 5000 * area_scale:
                 x, y, w, h = cv2.boundingRect(contour)
                 
                 # Check if near a wall gap
@@ -223,46 +454,96 @@ class FloorPlanDetector:
         
         return doors
     
-    def _detect_hallways(self, binary: np.ndarray) -> List[Dict]:
-        """Detect hallways as long narrow corridors."""
-        # Find long horizontal/vertical lines
-        horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (50, 1))
-        vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 50))
+    def _detect_hallways(self, binary: np.ndarray, room_labels: Optional[np.ndarray] = None,
+                         rooms: List[Dict] = ()) -> List[Dict]:
+        """
+        Detect hallways as the medial-axis skeleton of the free space.
         
-        horizontal = cv2.morphologyEx(binary, cv2.MORPH_OPEN, horizontal_kernel)
-        vertical = cv2.morphologyEx(binary, cv2.MORPH_OPEN, vertical_kernel)
+        Free space is everything that is not ink, not outside the building
+        and not inside a detected room. Rooms are masked with their filled
+        outlines from the label raster rather than their bounding boxes, so
+        an L-shaped room does not erase the corridors its bbox overlaps.
+        Large, far-from-convex "rooms" (see CORRIDOR_ROOM_SOLIDITY) are
+        corridors detected as rooms and are not masked. The free space is
+        thinned to a skeleton, which is split into segments between
+        junctions and dead ends; each segment becomes one hallway polyline
+        centred in its corridor. Segments meeting at a junction share the
+        junction's exact coordinates, which is how build_navigation_graph
+        links them.
         
-        hallways = []
+        Args:
+            binary: Working-level ink mask (walls white)
+            room_labels: Working-level room label raster (see _detect_rooms)
+            rooms: The rooms the raster labels, in full-resolution coordinates
+        """
+        img_h, img_w = binary.shape[:2]
         
-        # Process horizontal hallways
-        contours, _ = cv2.findContours(horizontal, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        for i, contour in enumerate(contours):
-            x, y, w, h = cv2.boundingRect(contour)
-            if w > 100:  # Minimum hallway length
-                hallways.append({
-                    "id": f"hallway_h_{i+1}",
-                    "orientation": "horizontal",
-                    "polyline": [
-                        {"x": float(x), "y": float(y + h // 2)},
-                        {"x": float(x + w), "y": float(y + h // 2)}
-                    ],
-                    "type": "hallway"
-                })
+        # Ink without small specks such as text, slightly thickened
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        extent = np.maximum(stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT])
+        keep = extent >= self._px(25)
+        keep[0] = False
+        ink = keep[labels].astype(np.uint8) * 255
+        ink = cv2.dilate(ink, cv2.getStructuringElement(cv2.MORPH_RECT, (self._px(5, 3),) * 2))
         
-        # Process vertical hallways
-        contours, _ = cv2.findContours(vertical, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        for i, contour in enumerate(contours):
-            x, y, w, h = cv2.boundingRect(contour)
-            if h > 100:
-                hallways.append({
-                    "id": f"hallway_v_{i+1}",
-                    "orientation": "vertical",
-                    "polyline": [
-                        {"x": float(x + w // 2), "y": float(y)},
-                        {"x": float(x + w // 2), "y": float(y + h)}
-                    ],
-                    "type": "hallway"
-                })
+        # Outside of the building: free space reachable from the border once
+        # door-sized gaps are closed
+        seal = cv2.getStructuringElement(cv2.MORPH_RECT, (self._px(60, 5),) * 2)
+        sealed_free = cv2.bitwise_not(cv2.morphologyEx(ink, cv2.MORPH_CLOSE, seal))
+        count, labels = cv2.connectedComponents(sealed_free, connectivity=4)
+        border = np.unique(np.concatenate([labels[0], labels[-1], labels[:, 0], labels[:, -1]]))
+        outside = np.isin(labels, border[border > 0])
+        
+        free = (ink == 0) & ~outside
+        if room_labels is not None:
+            min_area = CORRIDOR_ROOM_MIN_AREA * binary.size / self.scale ** 2
+            masked = np.array([False] + [
+                room["solidity"] >= CORRIDOR_ROOM_SOLIDITY or room["area"] < min_area
+                for room in rooms
+            ])
+            free &= ~masked[room_labels]
+        
+        # Drop slivers narrower than a corridor and small pockets
+        free = cv2.morphologyEx(free.astype(np.uint8) * 255, cv2.MORPH_OPEN,
+                                cv2.getStructuringElement(cv2.MORPH_RECT, (self._px(15, 3),) * 2))
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(free, connectivity=8)
+        keep = stats[:, cv2.CC_STAT_AREA] >= self._px(100) * self._px(30)
+        keep[0] = False
+        free = keep[labels].astype(np.uint8) * 255
+        
+        # Skeletonize on a coarser grid; corridors only need a few pixels
+        grid = min(1.0, SKELETON_MAX_DIM / max(img_w, img_h))
+        if grid < 1.0:
+            free = cv2.resize(free, None, fx=grid, fy=grid, interpolation=cv2.INTER_AREA)
+            free = np.where(free > 127, 255, 0).astype(np.uint8)
+        nodes, segments = skeleton_graph(skeletonize(free), min_spur_length=self._px(60) * grid)
+        
+        # Short isolated skeletons are the insides of undetected rooms
+        if segments:
+            ends = np.array([seg["nodes"] for seg in segments], dtype=np.int64)
+            group = union_find_labels(len(nodes), ends[:, 0], ends[:, 1])[ends[:, 0]]
+            lengths = np.array([cv2.arcLength(np.array(seg["path"], dtype=np.float32), False)
+                                for seg in segments])
+            total = np.bincount(group, lengths, minlength=len(nodes))
+            segments = [seg for seg, g in zip(segments, group) if total[g] >= self._px(250) * grid]
+        
+        hallways = []
+        for i, segment in enumerate(segments):
+            path = np.array(segment["path"], dtype=np.float32).reshape(-1, 1, 2)
+            simplified = cv2.approxPolyDP(path, 1.5, False).reshape(-1, 2).tolist()
+            # Pin both ends to the shared node positions
+            simplified[0] = list(nodes[segment["nodes"][0]])
+            simplified[-1] = list(nodes[segment["nodes"][1]])
+            polyline = [{"x": float(x / grid), "y": float(y / grid)} for x, y in simplified]
+            
+            dx = abs(polyline[-1]["x"] - polyline[0]["x"])
+            dy = abs(polyline[-1]["y"] - polyline[0]["y"])
+            hallways.append({
+                "id": f"hallway_{i+1}",
+                "orientation": "horizontal" if dx >= dy else "vertical",
+                "polyline": polyline,
+                "type": "hallway"
+            })
         
         return hallways
     
@@ -271,7 +552,7 @@ class FloorPlanDetector:
         stairs = []
         
         # Find parallel horizontal lines (stair steps)
-        horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (20, 1))
+        horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (self._px(20, 3), 1))
         steps = cv2.morphologyEx(binary, cv2.MORPH_OPEN, horizontal_kernel)
         
         contours, _ = cv2.findContours(steps, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -280,7 +561,7 @@ class FloorPlanDetector:
         step_lines = []
         for contour in contours:
             x, y, w, h = cv2.boundingRect(contour)
-            if 15 < w < 100 and h < 10:
+            if self._px(15) < w < self._px(100) and h < self._px(10, 2):
                 step_lines.append((x, y, w, h))
         
         # Find groups of parallel lines (stairs)
@@ -295,7 +576,8 @@ class FloorPlanDetector:
                 curr = step_lines[i]
                 
                 # Check if same stair group (similar x, consecutive y)
-                if abs(curr[0] - prev[0]) < 30 and 5 < (curr[1] - prev[1]) < 30:
+                if (abs(curr[0] - prev[0]) < self._px(30) and
+                        self._px(5) < (curr[1] - prev[1]) < self._px(30)):
                     current_group.append(curr)
                 else:
                     if len(current_group) >= 3:
@@ -325,19 +607,110 @@ class FloorPlanDetector:
         
         return stairs
     
-    def _extract_text(self, image: np.ndarray) -> List[Dict]:
+    def _rescale_detections(self, factor: float, walls: List[Dict] = (),
+                            rooms: List[Dict] = (), doors: List[Dict] = (),
+                            hallways: List[Dict] = (), stairs: List[Dict] = ()) -> None:
+        """Map working-level detections back to full-resolution coordinates in place."""
+        if factor == 1.0:
+            return
+        
+        def pt(p: Dict) -> Dict:
+            return {"x": float(p["x"] * factor), "y": float(p["y"] * factor)}
+        
+        for wall in walls:
+            wall["position"] = {
+                "start": pt(wall["position"]["start"]),
+                "end": pt(wall["position"]["end"])
+            }
+            wall["length"] = float(wall["length"] * factor)
+        
+        for room in rooms:
+            room["position"] = {
+                "start": pt(room["position"]["start"]),
+                "end": pt(room["position"]["end"])
+            }
+            room["center"] = pt(room["center"])
+            room["area"] = float(room["area"] * factor * factor)
+        
+        for door in doors:
+            door["hinge"] = pt(door["hinge"])
+            door["width"] = float(door["width"] * factor)
+        
+        for hallway in hallways:
+            hallway["polyline"] = [pt(p) for p in hallway["polyline"]]
+        
+        for stair in stairs:
+            stair["bbox"] = {k: float(v * factor) for k, v in stair["bbox"].items()}
+    
+    def _refine_walls(self, image: PreprocessedImage, work: PreprocessedImage,
+                      walls: List[Dict]) -> List[Dict]:
+        """
+        Refine upscaled wall segments against the full-resolution image.
+        
+        Only a thin band around each candidate is examined: dark pixels in the
+        band are fitted with a line and the extreme projections become the new
+        endpoints. Candidates without enough support are kept as they are.
+        Dark means below the Otsu threshold of the working level `work`,
+        which is much cheaper to compute than the full-resolution one.
+        """
+        if not walls:
+            return walls
+        
+        gray = image.gray
+        img_h, img_w = gray.shape[:2]
+        threshold = work.otsu_threshold
+        band = int(np.ceil(1.0 / self.scale)) + 1
+        
+        for wall in walls:
+            ws = wall["position"]["start"]
+            we = wall["position"]["end"]
+            x1, y1, x2, y2 = ws["x"], ws["y"], we["x"], we["y"]
+            length = np.hypot(x2 - x1, y2 - y1)
+            if length == 0:
+                continue
+            
+            # Crop the band around the candidate
+            rx1 = max(0, int(min(x1, x2)) - band)
+            ry1 = max(0, int(min(y1, y2)) - band)
+            rx2 = min(img_w, int(max(x1, x2)) + band + 1)
+            ry2 = min(img_h, int(max(y1, y2)) + band + 1)
+            ys, xs = np.nonzero(gray[ry1:ry2, rx1:rx2] < threshold)
+            if len(xs) < 2:
+                continue
+            xs = xs + rx1
+            ys = ys + ry1
+            
+            # Keep dark pixels close to the candidate segment
+            ux, uy = (x2 - x1) / length, (y2 - y1) / length
+            t = (xs - x1) * ux + (ys - y1) * uy
+            d = np.abs((xs - x1) * uy - (ys - y1) * ux)
+            near = (d <= band) & (t >= -band) & (t <= length + band)
+            if np.count_nonzero(near) < 2:
+                continue
+            points = np.column_stack((xs[near], ys[near])).astype(np.float32)
+            
+            vx, vy, x0, y0 = cv2.fitLine(points, cv2.DIST_L2, 0, 0.01, 0.01).ravel()
+            proj = (points[:, 0] - x0) * vx + (points[:, 1] - y0) * vy
+            t_min, t_max = float(proj.min()), float(proj.max())
+            # Keep the original direction of the segment
+            if vx * ux + vy * uy < 0:
+                vx, vy, t_min, t_max = -vx, -vy, -t_max, -t_min
+            
+            wall["position"] = {
+                "start": {"x": float(x0 + vx * t_min), "y": float(y0 + vy * t_min)},
+                "end": {"x": float(x0 + vx * t_max), "y": float(y0 + vy * t_max)}
+            }
+            wall["length"] = float(t_max - t_min)
+        
+        return walls
+    
+    def _extract_text(self, image: PreprocessedImage) -> List[Dict]:
         """Extract text using Tesseract OCR."""
         if pytesseract is None:
             return []
         
-        # Convert to grayscale if needed
-        if len(image.shape) == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = image
-        
         # Preprocess for OCR
-        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        binary = image.otsu_binary(inverse=False)
         
         try:
             ocr_data = pytesseract.image_to_data(
@@ -371,29 +744,61 @@ class FloorPlanDetector:
         
         return texts
     
-    def _associate_text_with_rooms(self, rooms: List[Dict], 
-                                    texts: List[Dict]) -> List[Dict]:
-        """Associate OCR text with rooms based on position."""
-        for room in rooms:
-            rx1 = room["position"]["start"]["x"]
-            ry1 = room["position"]["start"]["y"]
-            rx2 = room["position"]["end"]["x"]
-            ry2 = room["position"]["end"]["y"]
-            
-            # Find text inside this room
-            room_texts = []
-            for text in texts:
-                tx = text["center"]["x"]
-                ty = text["center"]["y"]
-                
-                if rx1 <= tx <= rx2 and ry1 <= ty <= ry2:
-                    room_texts.append(text["text"])
-            
-            # Update room name if text found
-            if room_texts:
-                # Combine texts (room number + name)
-                room["name"] = " ".join(room_texts)
-                room["ocr_texts"] = room_texts
+    def _associate_text_with_rooms(self, rooms: List[Dict], texts: List[Dict],
+                                    labels: Optional[np.ndarray] = None,
+                                    scale: float = 1.0) -> List[Dict]:
+        """
+        Associate OCR text with rooms based on position.
+        
+        Each text center is assigned to at most one room. With a room label
+        raster (value k = rooms[k - 1]) that is a single array lookup per
+        text; without one, the smallest room whose bbox contains the center
+        is used, found through a grid index over the room bboxes.
+        
+        Args:
+            rooms: Detected rooms in full-resolution coordinates
+            texts: OCR texts in full-resolution coordinates
+            labels: Optional room label raster, e.g. self.room_labels
+            scale: Raster / full-resolution ratio
+        """
+        if not rooms or not texts:
+            return rooms
+        
+        centers = np.array([(t["center"]["x"], t["center"]["y"]) for t in texts], dtype=np.float64)
+        
+        if labels is not None and labels.max() <= len(rooms):
+            h, w = labels.shape[:2]
+            cols = np.floor(centers[:, 0] * scale).astype(np.int64)
+            rows = np.floor(centers[:, 1] * scale).astype(np.int64)
+            inside = (cols >= 0) & (cols < w) & (rows >= 0) & (rows < h)
+            owner = np.zeros(len(texts), dtype=np.int64)
+            owner[inside] = labels[rows[inside], cols[inside]]
+            owner -= 1
+        else:
+            index = BoxIndex([
+                (r["position"]["start"]["x"], r["position"]["start"]["y"],
+                 r["position"]["end"]["x"], r["position"]["end"]["y"])
+                for r in rooms
+            ])
+            areas = (index.boxes[:, 2] - index.boxes[:, 0]) * (index.boxes[:, 3] - index.boxes[:, 1])
+            text_idx, room_idx = index.containing_pairs(centers)
+            # Smallest containing room wins
+            order = np.lexsort((areas[room_idx], text_idx))
+            first = np.r_[True, np.diff(text_idx[order]) != 0]
+            owner = np.full(len(texts), -1, dtype=np.int64)
+            owner[text_idx[order][first]] = room_idx[order][first]
+        
+        # Collect texts per room, keeping OCR order
+        room_texts = defaultdict(list)
+        for text, k in zip(texts, owner.tolist()):
+            if k >= 0:
+                room_texts[k].append(text["text"])
+        
+        # Update room name if text found
+        for k, found in room_texts.items():
+            # Combine texts (room number + name)
+            rooms[k]["name"] = " ".join(found)
+            rooms[k]["ocr_texts"] = found
         
         return rooms
     
@@ -405,12 +810,38 @@ class FloorPlanDetector:
         - Room nodes are placed at room centers (searchable)
         - Door nodes are the connection points between rooms and hallways
         - Rooms connect to their nearest doors
-        - Doors connect to each other if they can see each other (no wall blocking)
-        - Hallway nodes help connect distant areas
+        - Hallway polylines (corridor skeleton segments) become chains of
+          hallway nodes; segments sharing an end point share its node
+        - Hallway segments that cross without sharing a point (e.g. drawn
+          by hand) are split at the crossing with a shared node
+        - Doors and stairs attach to the nearest point on the skeleton they
+          can see (no wall blocking), splitting that hallway edge with a
+          new node
+        - Doors with no skeleton nearby connect to every door and hallway
+          node they can see within HALLWAY_ATTACH_DISTANCE
+        - Remaining separate parts are joined by their closest visible
+          door, hallway or stair nodes within HALLWAY_ATTACH_DISTANCE
         """
         nodes = []
         edges = []
-        walls = detection_result.get("walls", [])
+        edge_ids = set()
+        walls = wall_segments(detection_result.get("walls", []))
+        
+        def blocked(p1: Dict, p2: Dict) -> bool:
+            return bool(segments_cross_segment(walls, p1, p2).any())
+        
+        def add_edge(from_id: str, to_id: str, p1: Dict, p2: Dict) -> None:
+            edge_id = f"edge_{from_id}_{to_id}"
+            if from_id == to_id or edge_id in edge_ids:
+                return
+            edge_ids.add(edge_id)
+            edges.append({
+                "id": edge_id,
+                "from": from_id,
+                "to": to_id,
+                "distance": float(np.hypot(p2["x"] - p1["x"], p2["y"] - p1["y"])),
+                "bidirectional": True
+            })
         
         # Add door nodes FIRST (these are the primary connection points)
         door_nodes = []
@@ -464,49 +895,41 @@ class FloorPlanDetector:
             
             # Create edge from room to its door
             if nearest_door:
-                edges.append({
-                    "id": f"edge_{room['id']}_{nearest_door['id']}",
-                    "from": room["id"],
-                    "to": nearest_door["id"],
-                    "distance": float(min_dist),
-                    "bidirectional": True
-                })
+                add_edge(room["id"], nearest_door["id"], room["center"], nearest_door["position"])
         
-        # Add hallway waypoints 
+        # Add hallway nodes; points at the same position (segment junctions)
+        # map to the same node
         hallway_nodes = []
-        for hallway in detection_result.get("hallways", []):
-            for i, point in enumerate(hallway.get("polyline", [])):
+        hallway_node_at: Dict[Tuple[int, int], Dict] = {}
+        
+        def hallway_node(point: Dict) -> Dict:
+            key = (int(round(point["x"])), int(round(point["y"])))
+            if key not in hallway_node_at:
                 node = {
-                    "id": f"{hallway['id']}_wp_{i}",
+                    "id": f"hallway_node_{len(hallway_nodes) + 1}",
                     "type": "hallway",
                     "name": "Hallway",
-                    "position": point,
+                    "position": {"x": float(point["x"]), "y": float(point["y"])},
                     "searchable": False
                 }
-                nodes.append(node)
+                hallway_node_at[key] = node
                 hallway_nodes.append(node)
+                nodes.append(node)
+            return hallway_node_at[key]
         
-        # Connect hallway waypoints along the same hallway
+        # Hallway segments as (start node, end node) pairs
+        segments = []
         for hallway in detection_result.get("hallways", []):
-            polyline = hallway.get("polyline", [])
-            for i in range(len(polyline) - 1):
-                node1_id = f"{hallway['id']}_wp_{i}"
-                node2_id = f"{hallway['id']}_wp_{i+1}"
-                p1 = polyline[i]
-                p2 = polyline[i+1]
-                dist = np.sqrt((p2["x"] - p1["x"])**2 + (p2["y"] - p1["y"])**2)
-                edges.append({
-                    "id": f"edge_{node1_id}_{node2_id}",
-                    "from": node1_id,
-                    "to": node2_id,
-                    "distance": float(dist),
-                    "bidirectional": True
-                })
+            chain = [hallway_node(point) for point in hallway.get("polyline", [])]
+            for n1, n2 in zip(chain, chain[1:]):
+                if n1 is not n2:
+                    segments.append((n1, n2))
         
         # Add stair nodes
+        stair_nodes = []
         for stair in detection_result.get("stairs", []):
             bbox = stair.get("bbox", {})
-            nodes.append({
+            node = {
                 "id": stair["id"],
                 "type": "stair",
                 "name": f"Staircase",
@@ -515,31 +938,90 @@ class FloorPlanDetector:
                     "y": bbox.get("y", 0) + bbox.get("height", 0) / 2
                 },
                 "searchable": True
-            })
+            }
+            nodes.append(node)
+            stair_nodes.append(node)
+        
+        # Split crossing hallway segments at a shared node
+        attach_radius = HALLWAY_ATTACH_DISTANCE
+        splits: Dict[int, List[Tuple[float, Dict]]] = defaultdict(list)
+        for k, l, t, u, point in segment_crossings(segments):
+            anchor = hallway_node(point)
+            splits[k].append((t, anchor))
+            splits[l].append((u, anchor))
         
-        # Connect doors to nearby hallway points and other doors
+        # Attach doors and stairs to their nearest visible skeleton point. Segments
+        # are sampled every few pixels so the grid index can shortlist the
+        # segments near a node; the exact projection is then computed for
+        # those segments only.
+        sample_points, sample_segment = [], []
+        for k, (n1, n2) in enumerate(segments):
+            p1, p2 = n1["position"], n2["position"]
+            steps = max(1, int(np.hypot(p2["x"] - p1["x"], p2["y"] - p1["y"]) // 25))
+            for t in np.linspace(0.0, 1.0, steps + 1):
+                sample_points.append((p1["x"] + t * (p2["x"] - p1["x"]),
+                                      p1["y"] + t * (p2["y"] - p1["y"])))
+                sample_segment.append(k)
+        index = GridIndex(sample_points, attach_radius) if sample_points else None
+        
+        unattached_doors = []
+        for node in door_nodes + stair_nodes:
+            pos = node["position"]
+            feet = []
+            if index is not None:
+                candidates = index.query_radius(pos["x"], pos["y"], attach_radius + 25)
+                for k in sorted({sample_segment[i] for i in candidates.tolist()}):
+                    p1, p2 = segments[k][0]["position"], segments[k][1]["position"]
+                    dx, dy = p2["x"] - p1["x"], p2["y"] - p1["y"]
+                    length_sq = dx * dx + dy * dy
+                    t = 0.0 if length_sq == 0 else ((pos["x"] - p1["x"]) * dx + (pos["y"] - p1["y"]) * dy) / length_sq
+                    t = min(1.0, max(0.0, t))
+                    foot = {"x": p1["x"] + t * dx, "y": p1["y"] + t * dy}
+                    dist = np.hypot(foot["x"] - pos["x"], foot["y"] - pos["y"])
+                    if dist < attach_radius:
+                        feet.append((dist, k, t, foot))
+            
+            # Nearest foot point not behind a wall
+            best = next((f for f in sorted(feet, key=lambda f: f[0])
+                         if not blocked(pos, f[3])), None)
+            if best is None:
+                if node["type"] == "door":
+                    unattached_doors.append(node)
+                continue
+            
+            _, k, t, foot = best
+            n1, n2 = segments[k]
+            if t <= 0.0:
+                anchor = n1
+            elif t >= 1.0:
+                anchor = n2
+            else:
+                anchor = hallway_node(foot)
+                splits[k].append((t, anchor))
+            add_edge(node["id"], anchor["id"], pos, anchor["position"])
+        
+        # Hallway edges, split at the attachment points in order along each segment
+        for k, (n1, n2) in enumerate(segments):
+            chain = [n1] + [anchor for _, anchor in sorted(splits[k], key=lambda s: s[0])] + [n2]
+            for a, b in zip(chain, chain[1:]):
+                add_edge(a["id"], b["id"], a["position"], b["position"])
+        
+        # Doors away from every hallway link to the doors and hallway nodes
+        # they can see, as when no skeleton exists at all (e.g. ML detections)
         connection_nodes = door_nodes + hallway_nodes
-        for i, node1 in enumerate(connection_nodes):
-            for j, node2 in enumerate(connection_nodes):
-                if i >= j:
-                    continue
-                
-                p1 = node1["position"]
-                p2 = node2["position"]
-                dist = np.sqrt((p2["x"] - p1["x"])**2 + (p2["y"] - p1["y"])**2)
-                
-                # Connect if close enough and no wall blocking
-                if dist < 300 and not self._crosses_wall(p1, p2, walls):
-                    edge_id = f"edge_{node1['id']}_{node2['id']}"
-                    # Avoid duplicates
-                    if not any(e["id"] == edge_id for e in edges):
-                        edges.append({
-                            "id": edge_id,
-                            "from": node1["id"],
-                            "to": node2["id"],
-                            "distance": float(dist),
-                            "bidirectional": True
-                        })
+        connection_index = GridIndex([(n["position"]["x"], n["position"]["y"]) for n in connection_nodes],
+                                     attach_radius)
+        for node in unattached_doors:
+            p1 = node["position"]
+            for i in connection_index.query_radius(p1["x"], p1["y"], attach_radius).tolist():
+                other = connection_nodes[i]
+                if (other is not node and f"edge_{other['id']}_{node['id']}" not in edge_ids
+                        and not blocked(p1, other["position"])):
+                    add_edge(node["id"], other["id"], p1, other["position"])
+        
+        # Join the parts that are still separate through their closest
+        # visible door, hallway or stair nodes
+        self._link_components(nodes, edges, connection_nodes + stair_nodes, blocked, add_edge)
         
         return {
             "nodes": nodes,
@@ -553,6 +1035,44 @@ class FloorPlanDetector:
             }
         }
     
+    def _link_components(self, nodes: List[Dict], edges: List[Dict], candidates: List[Dict],
+                         blocked: Callable, add_edge: Callable) -> None:
+        """
+        Add the shortest wall-free edges between `candidates` closer than
+        HALLWAY_ATTACH_DISTANCE that join separate graph components, in
+        order of length (Kruskal), until no such edge is left.
+        `blocked(p1, p2)` tells whether a wall lies between two points.
+        """
+        if len(candidates) < 2:
+            return
+        position = {node["id"]: k for k, node in enumerate(nodes)}
+        labels = union_find_labels(len(nodes),
+                                   [position[e["from"]] for e in edges],
+                                   [position[e["to"]] for e in edges])
+        points = np.array([[n["position"]["x"], n["position"]["y"]] for n in candidates], dtype=np.float64)
+        component = labels[[position[n["id"]] for n in candidates]]
+        i, j = neighbor_pairs(points, HALLWAY_ATTACH_DISTANCE)
+        apart = component[i] != component[j]
+        i, j = i[apart], j[apart]
+        if len(i) == 0:
+            return
+        
+        parent: Dict[int, int] = {}
+        
+        def find(c: int) -> int:
+            while parent.get(c, c) != c:
+                c = parent[c]
+            return c
+        
+        length = np.hypot(*(points[i] - points[j]).T)
+        for k in np.argsort(length, kind="stable").tolist():
+            a, b = candidates[i[k]], candidates[j[k]]
+            ca, cb = find(int(component[i[k]])), find(int(component[j[k]]))
+            if ca == cb or blocked(a["position"], b["position"]):
+                continue
+            parent[max(ca, cb)] = min(ca, cb)
+            add_edge(a["id"], b["id"], a["position"], b["position"])
+    
     def _create_edges(self, nodes: List[Dict], walls: List[Dict], 
                       max_distance: float = 200) -> List[Dict]:
         """Create edges between nearby nodes that don't cross walls."""
@@ -587,17 +1107,7 @@ class FloorPlanDetector:
     
     def _crosses_wall(self, p1: Dict, p2: Dict, walls: List[Dict]) -> bool:
         """Check if line segment crosses any wall."""
-        for wall in walls:
-            ws = wall["position"]["start"]
-            we = wall["position"]["end"]
-            
-            if self._segments_intersect(
-                (p1["x"], p1["y"]), (p2["x"], p2["y"]),
-                (ws["x"], ws["y"]), (we["x"], we["y"])
-            ):
-                return True
-        
-        return False
+        return bool(segments_cross_segment(wall_segments(walls), p1, p2).any())
     
     def _segments_intersect(self, p1: Tuple, p2: Tuple, 
                             p3: Tuple, p4: Tuple) -> bool:
@@ -609,6 +1119,40 @@ class FloorPlanDetector:
                 ccw(p1, p2, p3) != ccw(p1, p2, p4))
 
 
+def process_floor_plan_bytes(contents: bytes,
+                             on_stage: Optional[Callable[[str, Dict], None]] = None) -> Dict:
+    """
+    Decode an uploaded image and return detection + graph.
+    
+    Module-level so it can be submitted to a process pool.
+    
+    Args:
+        contents: Encoded image bytes (PNG/JPEG)
+        on_stage: Optional stage-completion callback (see detect_all)
+        
+    Returns:
+        Dict with detections and navigation graph
+    """
+    image = cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Could not decode image")
+    
+    detector = FloorPlanDetector()
+    detections = detector.detect_all(image, on_stage=on_stage)
+    with DETECTION_STAGE_SECONDS.time(stage="graph"):
+        graph = detector.build_navigation_graph(detections)
+    if on_stage:
+        on_stage("graph", {"navigationGraph": graph})
+    
+    # Worker processes may idle after this; publish their stage timings now
+    REGISTRY.flush()
+    
+    return {
+        "detections": detections,
+        "navigationGraph": graph
+    }
+
+
 def process_floor_plan(image_path: str, output_path: str = None) -> Dict:
     """
     Process a floor plan image and return detection + graph.
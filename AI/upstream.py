@@ -0,0 +1,245 @@
+"""
+Upstream HTTP Client
+
+Shared async HTTP client for calls to hosted inference APIs (Roboflow).
+One httpx.AsyncClient per event loop keeps connections alive between
+requests, every request has separate connect and read timeouts, and a
+semaphore bounds how many calls are in flight at once. Failed attempts
+(timeouts, connection errors, 429 and 5xx responses) are retried with
+full-jitter exponential backoff, and a circuit breaker fails fast once
+the upstream keeps failing, so a slow or dead upstream costs callers a
+quick 503 instead of a pile of hanging requests.
+
+Usage:
+    from upstream import UpstreamClient, UpstreamError
+
+    client = UpstreamClient(connect_timeout=3, read_timeout=30, max_concurrency=8)
+    response = await client.request("POST", url, params=params, content=body)
+    await client.aclose()
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Responses worth retrying: rate limiting and server-side failures
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class UpstreamError(Exception):
+    """Raised when an upstream call fails after all retries."""
+
+
+class CircuitOpenError(UpstreamError):
+    """Raised without calling the upstream while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    Closed: calls pass. After `failure_threshold` failures in a row the
+    breaker opens and rejects calls for `reset_timeout` seconds; it then
+    lets a single probe call through (half-open). A successful probe closes
+    the breaker, a failed one opens it again.
+
+    Args:
+        failure_threshold: Consecutive failures that open the breaker
+        reset_timeout: Seconds to stay open before probing again
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = max(int(failure_threshold), 1)
+        self.reset_timeout = float(reset_timeout)
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may go to the upstream now."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._probing:
+                    logger.warning(f"Upstream circuit breaker opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self) -> None:
+        """Give up a half-open probe that ended without a verdict, e.g. cancelled."""
+        with self._lock:
+            self._probing = False
+
+
+class UpstreamClient:
+    """
+    Pooled async HTTP client with timeouts, retries and a circuit breaker.
+
+    Args:
+        connect_timeout: Seconds to establish a connection
+        read_timeout: Seconds to wait for response data (also used for writes)
+        max_concurrency: Requests allowed in flight at once
+        max_keepalive: Idle connections kept open for reuse
+        retries: Extra attempts after a failed one
+        backoff_base: First backoff ceiling in seconds; doubles every attempt
+        backoff_max: Largest backoff ceiling in seconds
+        breaker: Circuit breaker (default: 5 failures, 30 s reset)
+        transport: Optional httpx transport, e.g. httpx.MockTransport in tests
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        max_concurrency: int = 8,
+        max_keepalive: int = 8,
+        retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        breaker: Optional[CircuitBreaker] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max(max_concurrency, 1),
+                                   max_keepalive_connections=max(max_keepalive, 0))
+        self.max_concurrency = max(int(max_concurrency), 1)
+        self.retries = max(int(retries), 0)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.transport = transport
+        self.in_flight = 0
+
+        # httpx clients and asyncio semaphores belong to one event loop
+        self._loop = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _ensure_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits,
+                                             transport=self.transport)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._client
+
+    def backoff(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """Full-jitter delay before retry `attempt` (0-based), honouring Retry-After."""
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        if response is not None:
+            try:
+                return min(self.backoff_max, max(float(response.headers.get("retry-after", "")), 0.0))
+            except ValueError:
+                pass
+        return random.uniform(0, ceiling)
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Send a request, retrying failed attempts.
+
+        Responses that are not retried (2xx-4xx other than 429) are returned
+        as they are; after the last attempt a retryable response is returned
+        too, so callers handle upstream status codes in one place.
+
+        Raises:
+            CircuitOpenError: The breaker is open; the upstream was not called
+            UpstreamError: Every attempt timed out or failed to connect
+            httpx.HTTPError: Other request errors (decoding, redirects) are
+                counted as breaker failures and re-raised without retrying
+        """
+        client = self._ensure_client()
+        error: Optional[Exception] = None
+
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                if error is not None:
+                    raise UpstreamError(f"{method} {url} failed: {error}") from error
+                raise CircuitOpenError("Upstream circuit breaker is open")
+
+            response = None
+            try:
+                async with self._semaphore:
+                    self.in_flight += 1
+                    try:
+                        response = await client.request(method, url, **kwargs)
+                    except httpx.TransportError as e:
+                        error = e
+                    finally:
+                        self.in_flight -= 1
+            except Exception:
+                # Undecodable responses, redirect loops, bad URLs: not retried
+                self.breaker.record_failure()
+                raise
+            except BaseException:
+                # Cancelled: says nothing about the upstream, but must not
+                # leave a half-open probe claimed forever
+                self.breaker.release()
+                raise
+
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                self.breaker.record_success()
+                return response
+
+            self.breaker.record_failure()
+            reason = f"HTTP {response.status_code}" if response is not None else type(error).__name__
+            if attempt == self.retries:
+                if response is not None:
+                    return response
+                raise UpstreamError(f"{method} {url} failed: {reason}") from error
+
+            delay = self.backoff(attempt, response)
+            logger.warning(f"Upstream {reason}, retry {attempt + 1}/{self.retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """Breaker state and in-flight request count, e.g. for /health."""
+        return {
+            "circuit": self.breaker.state,
+            "consecutiveFailures": self.breaker.failures,
+            "inFlight": self.in_flight,
+            "maxConcurrency": self.max_concurrency,
+        }
+
+    async def aclose(self) -> None:
+        """Close pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
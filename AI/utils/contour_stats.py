@@ -0,0 +1,87 @@
+"""
+Contour Statistics Module
+
+Batch statistics over the contour list returned by cv2.findContours. All
+contours are concatenated into one point array so per-contour stats
+(point count, bounding box, open arc length, maximum deviation from the
+fitted line) are computed with NumPy reductions instead of Python loops
+over individual points.
+"""
+
+import cv2
+import numpy as np
+from typing import Dict, Sequence
+
+
+def contour_stats(contours: Sequence[np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Cheap per-contour stats for pre-filtering.
+
+    Returns:
+        Dict of arrays, one entry per contour:
+        - counts: number of points
+        - x, y, w, h: bounding rectangle (same convention as cv2.boundingRect)
+        - arc_length: approximate open arc length; it matches cv2.arcLength
+          up to float rounding, so use it with a small margin and confirm
+          borderline contours with cv2.arcLength
+    """
+    n = len(contours)
+    if n == 0:
+        empty = np.zeros(0)
+        return {k: empty for k in ("counts", "x", "y", "w", "h", "arc_length")}
+
+    counts = np.array([len(c) for c in contours], dtype=np.int64)
+    points = np.concatenate([c.reshape(-1, 2) for c in contours]).astype(np.int64)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    ends = starts + counts - 1
+
+    x_min = np.minimum.reduceat(points[:, 0], starts)
+    y_min = np.minimum.reduceat(points[:, 1], starts)
+    x_max = np.maximum.reduceat(points[:, 0], starts)
+    y_max = np.maximum.reduceat(points[:, 1], starts)
+
+    # Cumulative length along the concatenated points; a contour's open
+    # length is the difference between its last and first point
+    segments = np.sqrt((np.diff(points, axis=0) ** 2).sum(axis=1))
+    cumulative = np.concatenate(([0.0], np.cumsum(segments)))
+
+    return {
+        "counts": counts,
+        "x": x_min,
+        "y": y_min,
+        "w": x_max - x_min + 1,
+        "h": y_max - y_min + 1,
+        "arc_length": cumulative[ends] - cumulative[starts]
+    }
+
+
+def max_line_deviations(
+    contours: Sequence[np.ndarray],
+    dtype=np.float64
+) -> np.ndarray:
+    """
+    Maximum perpendicular distance of each contour's points from its own
+    least-squares line (cv2.fitLine, DIST_L2).
+
+    Args:
+        contours: Contours with at least two points each
+        dtype: Float type the distances are computed in
+
+    Returns:
+        Array with one maximum deviation per contour
+    """
+    if len(contours) == 0:
+        return np.zeros(0, dtype=dtype)
+
+    lines = np.array(
+        [cv2.fitLine(c, cv2.DIST_L2, 0, 0.01, 0.01).ravel() for c in contours],
+        dtype=np.float32
+    ).astype(dtype)
+    counts = np.array([len(c) for c in contours], dtype=np.int64)
+    points = np.concatenate([c.reshape(-1, 2) for c in contours]).astype(dtype)
+
+    vx, vy, x0, y0 = (np.repeat(lines[:, k], counts) for k in range(4))
+    deviation = np.abs(vy * (points[:, 0] - x0) - vx * (points[:, 1] - y0))
+
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    return np.maximum.reduceat(deviation, starts)
@@ -0,0 +1,181 @@
+"""
+Deduplication Module
+
+Greedy duplicate suppression for detections, shared by the wall, door and
+room detectors. Kept items are stored in a grid hash, so every new item is
+only compared with kept items in the neighbouring cells instead of with
+all of them.
+
+Two criteria are supported:
+- dedup_by_distance: items whose reference points are closer than a
+  distance are duplicates; the better one (by a score) is kept
+- suppress_overlapping_boxes: boxes covering more than a fraction of the
+  smaller one are duplicates; boxes are visited best first (NMS)
+
+Usage:
+    from utils.dedup import dedup_by_distance, keep_by
+
+    walls = dedup_by_distance(walls, point=wall_center, distance=10,
+                              keep=keep_by('length'))
+"""
+
+import math
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+Point = Tuple[float, float]
+Box = Tuple[float, float, float, float]
+
+
+def keep_by(field: str) -> Callable[[Dict], float]:
+    """Keep policy scoring items by a numeric field, e.g. 'length',
+    'confidence', 'width' or 'area'; the higher score is kept."""
+    return lambda item: item[field]
+
+
+def dedup_by_distance(
+    items: Iterable[Any],
+    point: Callable[[Any], Point],
+    distance: float,
+    keep: Callable[[Any], float],
+    metric: str = "euclidean"
+) -> List[Any]:
+    """
+    Remove items whose reference points are closer than `distance`.
+
+    Items are visited in order. An item that is close to a kept item is a
+    duplicate of the earliest such kept item, and replaces it when its
+    `keep` score is strictly higher; a replacing item moves to the end of
+    the kept list.
+
+    Args:
+        items: Detections in priority order
+        point: Reference (x, y) of an item, e.g. its center or hinge
+        distance: Items strictly closer than this are duplicates
+        keep: Score of an item; the higher one survives
+        metric: "euclidean", or "chebyshev" to compare |dx| and |dy|
+            separately
+
+    Returns:
+        Kept items
+    """
+    if metric not in ("euclidean", "chebyshev"):
+        raise ValueError(f"Unknown metric: {metric}")
+
+    cell_size = max(distance, 1e-6)
+    kept: Dict[int, Any] = {}
+    positions: Dict[int, Point] = {}
+    cells: Dict[Tuple[int, int], set] = defaultdict(set)
+
+    def cell_of(x: float, y: float) -> Tuple[int, int]:
+        return int(math.floor(x / cell_size)), int(math.floor(y / cell_size))
+
+    def is_close(ax: float, ay: float, bx: float, by: float) -> bool:
+        dx, dy = ax - bx, ay - by
+        if metric == "chebyshev":
+            return abs(dx) < distance and abs(dy) < distance
+        return math.sqrt(dx * dx + dy * dy) < distance
+
+    for seq, item in enumerate(items):
+        x, y = point(item)
+        cx, cy = cell_of(x, y)
+
+        # Earliest kept item within range
+        candidates = set()
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                candidates.update(cells.get((gx, gy), ()))
+        match = next((s for s in sorted(candidates) if is_close(x, y, *positions[s])), None)
+
+        if match is not None:
+            if keep(item) <= keep(kept[match]):
+                continue
+            cells[cell_of(*positions[match])].discard(match)
+            del kept[match], positions[match]
+
+        kept[seq] = item
+        positions[seq] = (x, y)
+        cells[(cx, cy)].add(seq)
+
+    return [kept[s] for s in sorted(kept)]
+
+
+def box_intersection(a: Box, b: Box) -> float:
+    """Intersection area of two (x, y, width, height) boxes."""
+    x1 = max(a[0], b[0])
+    y1 = max(a[1], b[1])
+    x2 = min(a[0] + a[2], b[0] + b[2])
+    y2 = min(a[1] + a[3], b[1] + b[3])
+    if x1 < x2 and y1 < y2:
+        return (x2 - x1) * (y2 - y1)
+    return 0
+
+
+def suppress_overlapping_boxes(
+    items: List[Any],
+    box: Callable[[Any], Box],
+    threshold: float,
+    keep: Callable[[Any], float],
+    area: Callable[[Any], float] = None,
+    cell_size: float = None
+) -> List[Any]:
+    """
+    Greedy NMS on intersection over the smaller area.
+
+    Items are visited by descending `keep` score (ties keep input order)
+    and dropped when their intersection with a kept box exceeds
+    `threshold` times the smaller of the two areas.
+
+    Args:
+        items: Detections
+        box: (x, y, width, height) of an item
+        threshold: Maximum overlap ratio of the smaller item
+        keep: Score of an item; higher scores are kept first
+        area: Area used for the ratio (default: box area), e.g. a contour
+            area smaller than the bounding box
+        cell_size: Grid cell size (default: median box side)
+
+    Returns:
+        Kept items, best first
+    """
+    if len(items) <= 1:
+        return list(items)
+
+    area = area or (lambda item: box(item)[2] * box(item)[3])
+    ordered = sorted(items, key=keep, reverse=True)
+    boxes = [box(item) for item in ordered]
+
+    if cell_size is None:
+        sides = sorted(max(b[2], b[3]) for b in boxes)
+        cell_size = sides[len(sides) // 2]
+    cell_size = max(cell_size, 1e-6)
+
+    def cells_of(b: Box):
+        x0, y0 = int(math.floor(b[0] / cell_size)), int(math.floor(b[1] / cell_size))
+        x1 = int(math.floor((b[0] + b[2]) / cell_size))
+        y1 = int(math.floor((b[1] + b[3]) / cell_size))
+        return [(gx, gy) for gx in range(x0, x1 + 1) for gy in range(y0, y1 + 1)]
+
+    kept: List[int] = []
+    cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+
+    for i, item in enumerate(ordered):
+        item_cells = cells_of(boxes[i])
+        candidates = set()
+        for c in item_cells:
+            candidates.update(cells.get(c, ()))
+
+        suppressed = False
+        for k in sorted(candidates):
+            smaller = min(area(item), area(ordered[k]))
+            if smaller > 0 and box_intersection(boxes[i], boxes[k]) / smaller > threshold:
+                suppressed = True
+                break
+        if suppressed:
+            continue
+
+        kept.append(i)
+        for c in item_cells:
+            cells[c].append(i)
+
+    return [ordered[i] for i in kept]
@@ -9,9 +9,14 @@ import cv2
 import numpy as np
 from typing import List, Dict, Tuple
 
+from .contour_stats import contour_stats, max_line_deviations
+from .dedup import dedup_by_distance, keep_by
+from .preprocessing import PreprocessedImage
+from .spatial import GridIndex, cluster_endpoints
+
 
 def detect_doors(
-    gray_image: np.ndarray,
+    image: PreprocessedImage,
     walls: List[Dict],
     search_radius: int = 80,
     min_radius: float = 15
@@ -20,7 +25,7 @@ def detect_doors(
     Main door detection pipeline.
     
     Args:
-        gray_image: Grayscale input image
+        image: Preprocessed floor plan
         walls: List of detected walls for reference
         search_radius: Radius to search for arcs near wall endpoints
         min_radius: Minimum door arc radius
@@ -35,7 +40,7 @@ def detect_doors(
     clustered = cluster_endpoints(endpoints, distance=20)
     
     # Find arcs near wall endpoints
-    doors = find_arcs_near_walls(gray_image, clustered, search_radius)
+    doors = find_arcs_near_walls(image, clustered, search_radius)
     
     # Remove duplicates and filter by radius
     doors = remove_duplicates(doors, min_dist=35, min_radius=min_radius)
@@ -52,40 +57,8 @@ def get_wall_endpoints(walls: List[Dict]) -> List[Tuple[int, int]]:
     return endpoints
 
 
-def cluster_endpoints(
-    endpoints: List[Tuple[int, int]],
-    distance: float = 15
-) -> List[Tuple[int, int]]:
-    """Cluster nearby endpoints and return cluster centers."""
-    if not endpoints:
-        return []
-    
-    points = np.array(endpoints, dtype=np.float32)
-    clusters = []
-    used = set()
-    
-    for i, pt in enumerate(points):
-        if i in used:
-            continue
-        
-        cluster = [pt]
-        used.add(i)
-        
-        for j, pt2 in enumerate(points):
-            if j in used:
-                continue
-            if np.linalg.norm(pt - pt2) < distance:
-                cluster.append(pt2)
-                used.add(j)
-        
-        center = np.mean(cluster, axis=0)
-        clusters.append((int(center[0]), int(center[1])))
-    
-    return clusters
-
-
 def find_arcs_near_walls(
-    gray_image: np.ndarray,
+    image: PreprocessedImage,
     wall_endpoints: List[Tuple[int, int]],
     search_radius: int = 80
 ) -> List[Dict]:
@@ -93,7 +66,7 @@ def find_arcs_near_walls(
     Find door arcs by looking for curved contours near wall endpoints.
     
     Args:
-        gray_image: Grayscale input image
+        image: Preprocessed floor plan
         wall_endpoints: Clustered wall endpoint positions
         search_radius: Radius to search for arcs
         
@@ -101,46 +74,36 @@ def find_arcs_near_walls(
         List of detected door arcs
     """
     # Threshold to get lines
-    _, binary = cv2.threshold(gray_image, 200, 255, cv2.THRESH_BINARY_INV)
+    binary = image.threshold(200)
     
     # Find contours
     contours, _ = cv2.findContours(binary, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
     
+    # Batch pre-filter on cheap stats: point count, bounding box aspect ratio
+    # and approximate length (with a margin, confirmed by cv2.arcLength below)
+    stats = contour_stats(contours)
+    aspect_ratio = np.maximum(stats['w'], stats['h']) / (np.minimum(stats['w'], stats['h']) + 1)
+    keep = (
+        (stats['counts'] >= 5) & (aspect_ratio <= 4) &
+        (stats['arc_length'] >= 30 - 1e-3) & (stats['arc_length'] <= 400 + 1e-3)
+    )
+    candidates = [contours[i] for i in np.flatnonzero(keep)]
+    
+    # Skip very small or very large contours
+    arc_lengths = np.array([cv2.arcLength(c, closed=False) for c in candidates], dtype=np.float64)
+    in_range = (arc_lengths >= 30) & (arc_lengths <= 400)
+    candidates = [c for c, ok in zip(candidates, in_range) if ok]
+    arc_lengths = arc_lengths[in_range]
+    
+    # Curvature: maximum deviation from the fitted line relative to length
+    curvatures = max_line_deviations(candidates) / (arc_lengths + 1)
+    
+    # Wall endpoints indexed by grid cell for radius lookups
+    endpoint_index = GridIndex(wall_endpoints, search_radius)
+    
     arcs = []
     
-    for contour in contours:
-        # Skip very small or very large contours
-        arc_length = cv2.arcLength(contour, closed=False)
-        if arc_length < 30 or arc_length > 400:
-            continue
-        
-        if len(contour) < 5:
-            continue
-        
-        # Get bounding box
-        x, y, w, h = cv2.boundingRect(contour)
-        
-        # Skip if too elongated (likely a wall, not an arc)
-        aspect_ratio = max(w, h) / (min(w, h) + 1)
-        if aspect_ratio > 4:
-            continue
-        
-        # Fit line and check curvature
-        try:
-            vx, vy, x0, y0 = cv2.fitLine(contour, cv2.DIST_L2, 0, 0.01, 0.01)
-            vx, vy, x0, y0 = float(vx), float(vy), float(x0), float(y0)
-        except:
-            continue
-        
-        # Calculate maximum deviation from the fitted line
-        max_dev = 0
-        for pt in contour:
-            px, py = pt[0]
-            dev = abs(vy * (px - x0) - vx * (py - y0))
-            max_dev = max(max_dev, dev)
-        
-        # Check curvature
-        curvature = max_dev / (arc_length + 1)
+    for contour, curvature in zip(candidates, curvatures):
         if curvature < 0.03:  # Too straight
             continue
         
@@ -151,44 +114,45 @@ def find_arcs_near_walls(
         cx = int(M['m10'] / M['m00'])
         cy = int(M['m01'] / M['m00'])
         
-        # Check if near any wall endpoint
-        for ex, ey in wall_endpoints:
-            dist = np.sqrt((cx - ex) ** 2 + (cy - ey) ** 2)
-            if dist < search_radius:
-                # This contour is near a wall endpoint - likely a door arc
-                start_pt = contour[0][0]
-                end_pt = contour[-1][0]
-                
-                # Determine hinge (closest point to wall endpoint)
-                d_start = np.sqrt((start_pt[0] - ex) ** 2 + (start_pt[1] - ey) ** 2)
-                d_end = np.sqrt((end_pt[0] - ex) ** 2 + (end_pt[1] - ey) ** 2)
-                
-                if d_start < d_end:
-                    hinge = (int(start_pt[0]), int(start_pt[1]))
-                    swing_end = (int(end_pt[0]), int(end_pt[1]))
-                else:
-                    hinge = (int(end_pt[0]), int(end_pt[1]))
-                    swing_end = (int(start_pt[0]), int(start_pt[1]))
-                
-                # Estimate radius
-                radius = np.sqrt((swing_end[0] - hinge[0]) ** 2 + (swing_end[1] - hinge[1]) ** 2)
-                
-                # Calculate swing angle
-                swing_angle = np.degrees(np.arctan2(
-                    swing_end[1] - hinge[1],
-                    swing_end[0] - hinge[0]
-                ))
-                
-                arcs.append({
-                    'hinge': list(hinge),
-                    'arc_center': [cx, cy],
-                    'swing_start': 0.0,
-                    'swing_end': round(swing_angle % 360, 1),
-                    'radius': round(radius, 1),
-                    'wall_endpoint': [ex, ey],
-                    'confidence': 0.7 + (curvature * 2)  # Higher curvature = more likely a door
-                })
-                break
+        # Check if near any wall endpoint (the first one in list order wins)
+        nearest = endpoint_index.first_within(cx, cy, search_radius)
+        if nearest < 0:
+            continue
+        ex, ey = wall_endpoints[nearest]
+        
+        # This contour is near a wall endpoint - likely a door arc
+        start_pt = contour[0][0]
+        end_pt = contour[-1][0]
+        
+        # Determine hinge (closest point to wall endpoint)
+        d_start = np.sqrt((start_pt[0] - ex) ** 2 + (start_pt[1] - ey) ** 2)
+        d_end = np.sqrt((end_pt[0] - ex) ** 2 + (end_pt[1] - ey) ** 2)
+        
+        if d_start < d_end:
+            hinge = (int(start_pt[0]), int(start_pt[1]))
+            swing_end = (int(end_pt[0]), int(end_pt[1]))
+        else:
+            hinge = (int(end_pt[0]), int(end_pt[1]))
+            swing_end = (int(start_pt[0]), int(start_pt[1]))
+        
+        # Estimate radius
+        radius = np.sqrt((swing_end[0] - hinge[0]) ** 2 + (swing_end[1] - hinge[1]) ** 2)
+        
+        # Calculate swing angle
+        swing_angle = np.degrees(np.arctan2(
+            swing_end[1] - hinge[1],
+            swing_end[0] - hinge[0]
+        ))
+        
+        arcs.append({
+            'hinge': list(hinge),
+            'arc_center': [cx, cy],
+            'swing_start': 0.0,
+            'swing_end': round(swing_angle % 360, 1),
+            'radius': round(radius, 1),
+            'wall_endpoint': [ex, ey],
+            'confidence': 0.7 + float(curvature) * 2  # Higher curvature = more likely a door
+        })
     
     return arcs
 
@@ -216,22 +180,9 @@ def remove_duplicates(
     for door in doors:
         door['confidence'] = min(0.95, door['confidence'])
     
-    unique = []
-    for door in doors:
-        h = door['hinge']
-        is_dup = False
-        
-        for u in unique:
-            uh = u['hinge']
-            if np.sqrt((h[0] - uh[0]) ** 2 + (h[1] - uh[1]) ** 2) < min_dist:
-                # Keep the one with higher confidence
-                if door['confidence'] > u['confidence']:
-                    unique.remove(u)
-                    unique.append(door)
-                is_dup = True
-                break
-        
-        if not is_dup:
-            unique.append(door)
-    
-    return unique
+    return dedup_by_distance(
+        doors,
+        point=lambda d: d['hinge'],
+        distance=min_dist,
+        keep=keep_by('confidence')
+    )
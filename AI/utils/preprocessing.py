@@ -7,11 +7,15 @@ Preprocesses floor plan images for optimal detection:
 - Binary thresholding
 - Edge detection
 - Noise removal
+
+PreprocessedImage wraps one input image and lazily computes and memoizes
+these derived rasters, so detection stages that share it never compute
+the same raster twice.
 """
 
 import cv2
 import numpy as np
-from typing import Dict, Any
+from typing import Callable, Dict, Any, Hashable
 
 
 def remove_colored_annotations(image: np.ndarray) -> np.ndarray:
@@ -105,6 +109,135 @@ def normalize_lighting(gray_image: np.ndarray) -> np.ndarray:
     return normalized
 
 
+def deskew_image(image: np.ndarray, angle: float) -> np.ndarray:
+    """Rotate image to correct skew."""
+    h, w = image.shape[:2]
+    center = (w // 2, h // 2)
+    M = cv2.getRotationMatrix2D(center, angle, 1.0)
+    return cv2.warpAffine(image, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+
+
+class PreprocessedImage:
+    """
+    Lazily computed, memoized rasters derived from one floor plan image.
+    
+    Every raster is computed the first time a stage asks for it and cached
+    under its parameters, so stages that share this object never redo
+    grayscale conversion, thresholding or edge detection. Derived images
+    (deskewed, downscaled, enhanced) are PreprocessedImage objects as well
+    and are memoized the same way.
+    
+    Args:
+        image: BGR or grayscale input image
+    """
+    
+    def __init__(self, image: np.ndarray):
+        self.original = image
+        self.height, self.width = image.shape[:2]
+        self._cache: Dict[Hashable, Any] = {}
+    
+    def _memo(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+    
+    @property
+    def gray(self) -> np.ndarray:
+        """Grayscale version of the input."""
+        def compute():
+            if len(self.original.shape) == 3:
+                return cv2.cvtColor(self.original, cv2.COLOR_BGR2GRAY)
+            return self.original
+        return self._memo("gray", compute)
+    
+    @property
+    def otsu_threshold(self) -> float:
+        """Global Otsu threshold of the grayscale image."""
+        return self._memo("otsu_threshold", lambda: self._otsu()[0])
+    
+    def _otsu(self):
+        return self._memo("otsu", lambda: cv2.threshold(
+            self.gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU
+        ))
+    
+    def otsu_binary(self, inverse: bool = True) -> np.ndarray:
+        """Otsu-thresholded image; `inverse` makes dark lines white."""
+        if not inverse:
+            return self._otsu()[1]
+        return self._memo("otsu_inv", lambda: cv2.bitwise_not(self._otsu()[1]))
+    
+    def threshold(self, value: int, inverse: bool = True) -> np.ndarray:
+        """Fixed-level threshold of the grayscale image."""
+        mode = cv2.THRESH_BINARY_INV if inverse else cv2.THRESH_BINARY
+        return self._memo(("threshold", value, inverse),
+                          lambda: cv2.threshold(self.gray, value, 255, mode)[1])
+    
+    def denoised(self, h: float = 10) -> np.ndarray:
+        """Non-local-means denoised grayscale image."""
+        return self._memo(("denoised", h),
+                          lambda: cv2.fastNlMeansDenoising(self.gray, None, h, 7, 21))
+    
+    def adaptive_binary(self, block_size: int = 11, c: int = 2,
+                        inverse: bool = True, denoise: bool = False) -> np.ndarray:
+        """Gaussian adaptive threshold, optionally of the denoised image."""
+        def compute():
+            source = self.denoised() if denoise else self.gray
+            mode = cv2.THRESH_BINARY_INV if inverse else cv2.THRESH_BINARY
+            return cv2.adaptiveThreshold(source, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                         mode, block_size, c)
+        return self._memo(("adaptive", block_size, c, inverse, denoise), compute)
+    
+    def edges(self, low: int = 50, high: int = 150) -> np.ndarray:
+        """Canny edges of the grayscale image."""
+        return self._memo(("edges", low, high),
+                          lambda: cv2.Canny(self.gray, low, high, apertureSize=3))
+    
+    def thick_binary(self, kernel_size: int = 2) -> np.ndarray:
+        """Inverse Otsu binary with wall lines thickened by dilation."""
+        return self._memo(("thick_binary", kernel_size),
+                          lambda: thicken_walls(self.otsu_binary(), kernel_size))
+    
+    def deskewed(self, angle: float) -> "PreprocessedImage":
+        """This image rotated by `angle` degrees (self if the angle is zero)."""
+        if angle == 0:
+            return self
+        return self._memo(("deskewed", round(angle, 4)),
+                          lambda: PreprocessedImage(deskew_image(self.original, angle)))
+    
+    def pyramid(self, level: int) -> "PreprocessedImage":
+        """Grayscale image halved `level` times with cv2.pyrDown."""
+        if level <= 0:
+            return self
+        def compute():
+            image = self.pyramid(level - 1).gray
+            return PreprocessedImage(cv2.pyrDown(image))
+        return self._memo(("pyramid", level), compute)
+    
+    def enhanced(self, options: Dict = None) -> "PreprocessedImage":
+        """
+        Grayscale image cleaned by the preprocess_floor_plan pipeline
+        (color removal, lighting normalization, CLAHE, median blur).
+        See preprocess_floor_plan for the option keys.
+        """
+        options = options or {}
+        key = ("enhanced", tuple(sorted(options.items())))
+        
+        def compute():
+            image = self.original
+            if options.get('remove_colors', True) and len(image.shape) == 3:
+                image = remove_colored_annotations(image)
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+            if options.get('normalize', True):
+                gray = normalize_lighting(gray)
+            if options.get('enhance', True):
+                gray = enhance_contrast(gray)
+            if options.get('denoise', True):
+                gray = remove_noise(gray)
+            return PreprocessedImage(gray)
+        
+        return self._memo(key, compute)
+
+
 def preprocess_floor_plan(image: np.ndarray, options: Dict = None) -> Dict[str, Any]:
     """
     Main preprocessing pipeline for floor plan images.
@@ -124,53 +257,20 @@ def preprocess_floor_plan(image: np.ndarray, options: Dict = None) -> Dict[str,
             - gray: Grayscale image
             - binary: Binary thresholded image
             - edges: Edge-detected image
+            - preprocessed: The enhanced PreprocessedImage the rasters came from
     """
     if options is None:
         options = {}
     
-    # Get options with defaults
-    remove_colors = options.get('remove_colors', True)
-    enhance = options.get('enhance', True)
-    denoise = options.get('denoise', True)
     thicken = options.get('thicken', True)
-    normalize = options.get('normalize', True)
+    enhanced = PreprocessedImage(image).enhanced(
+        {k: v for k, v in options.items() if k != 'thicken'}
+    )
     
-    result = {
-        'original': image.copy()
+    return {
+        'original': image.copy(),
+        'gray': enhanced.gray,
+        'binary': enhanced.thick_binary(2) if thicken else enhanced.otsu_binary(),
+        'edges': enhanced.edges(50, 150),
+        'preprocessed': enhanced
     }
-    
-    # Step 1: Remove colored annotations
-    if remove_colors:
-        image = remove_colored_annotations(image)
-    
-    # Step 2: Convert to grayscale
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    # Step 3: Normalize lighting
-    if normalize:
-        gray = normalize_lighting(gray)
-    
-    # Step 4: Enhance contrast
-    if enhance:
-        gray = enhance_contrast(gray)
-    
-    # Step 5: Remove noise
-    if denoise:
-        gray = remove_noise(gray)
-    
-    result['gray'] = gray
-    
-    # Step 6: Binary thresholding
-    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-    
-    # Step 7: Thicken walls
-    if thicken:
-        binary = thicken_walls(binary, kernel_size=2)
-    
-    result['binary'] = binary
-    
-    # Step 8: Edge detection
-    edges = cv2.Canny(gray, 50, 150, apertureSize=3)
-    result['edges'] = edges
-    
-    return result
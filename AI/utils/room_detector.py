@@ -1,39 +1,49 @@
 """
 Room Detection Module
 
-Detects rooms in floor plan images using contour analysis.
-Rooms are identified as enclosed regions bounded by walls.
+Detects rooms in floor plan images using connected-component labelling.
+Rooms are identified as enclosed regions bounded by walls; detect_rooms can
+also return an int32 room label raster for lookups by later stages.
 """
 
 import cv2
 import numpy as np
 from typing import List, Dict, Tuple
 
+from .dedup import keep_by, suppress_overlapping_boxes
+from .preprocessing import PreprocessedImage
+
 
 def detect_rooms(
-    binary_image: np.ndarray,
+    image: PreprocessedImage,
     walls: List[Dict],
-    image_width: int,
-    image_height: int,
     min_area: int = None,
-    max_area_ratio: float = 0.6
-) -> List[Dict]:
+    max_area_ratio: float = 0.6,
+    return_labels: bool = False
+):
     """
     Detect rooms as enclosed regions in the floor plan.
-    Uses adaptive parameters and multi-pass detection for better results.
+    
+    The free space is cleaned up once and labelled with
+    cv2.connectedComponentsWithStats, which yields the area, bounding box
+    and centroid of every region in a single pass. Filtering and scoring
+    are then done on those arrays for all regions at once.
     
     Args:
-        binary_image: Binary thresholded image (walls are white)
+        image: Preprocessed floor plan (its thickened binary, walls white, is used)
         walls: List of detected walls (for validation)
-        image_width: Original image width
-        image_height: Original image height
         min_area: Minimum room area (auto-calculated if None)
         max_area_ratio: Maximum room area as ratio of image
+        return_labels: Also return the room label raster
         
     Returns:
-        List of room dictionaries with bounding box and area
+        List of room dictionaries with bounding box and area. With
+        return_labels, a (rooms, labels) tuple where labels is an int32
+        raster of the image size holding each pixel's room 'label'
+        (0 = no room).
     """
-    rooms = []
+    binary_image = image.thick_binary(2)
+    image_width, image_height = image.width, image.height
     total_area = image_width * image_height
     max_area = total_area * max_area_ratio
     
@@ -41,183 +51,139 @@ def detect_rooms(
     if min_area is None:
         min_area = max(500, total_area // 2000)  # At least 500px or 0.05% of image
     
-    # Invert binary so rooms are white (walls are black)
-    inverted = cv2.bitwise_not(binary_image)
+    # Close small gaps in walls, then invert so rooms are white (walls are
+    # black) and remove small noise
+    closed = cv2.morphologyEx(binary_image, cv2.MORPH_CLOSE,
+                              cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5)))
+    inverted = cv2.bitwise_not(closed)
+    opened = cv2.morphologyEx(inverted, cv2.MORPH_OPEN,
+                              cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2)))
     
-    # Use multiple kernel sizes to catch rooms of different detail levels
-    for kernel_size in [3, 5, 7]:
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_size, kernel_size))
-        
-        # Close small gaps in walls
-        closed = cv2.morphologyEx(inverted, cv2.MORPH_CLOSE, kernel)
-        
-        # Apply opening to remove small noise
-        opened = cv2.morphologyEx(closed, cv2.MORPH_OPEN, 
-                                   cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2)))
-        
-        # Fill holes to get solid room regions
-        filled = fill_holes(opened)
-        
-        # Find contours (potential rooms)
-        contours, hierarchy = cv2.findContours(
-            filled, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE
-        )
-        
-        if hierarchy is None:
-            continue
-        
-        for i, contour in enumerate(contours):
-            area = cv2.contourArea(contour)
-            
-            # Filter by area
-            if area < min_area or area > max_area:
-                continue
-            
-            # Get bounding rectangle
-            x, y, w, h = cv2.boundingRect(contour)
-            
-            # Skip very tiny bounding boxes
-            if w < 10 or h < 10:
-                continue
-            
-            # Filter very thin regions (likely corridors or hallways)
-            aspect_ratio = max(w, h) / (min(w, h) + 1)
-            if aspect_ratio > 8:  # Increased from 6 to allow more elongated rooms
-                continue
-            
-            # Filter regions touching multiple edges (likely background)
-            edge_count = 0
-            margin = 5
-            if x <= margin:
-                edge_count += 1
-            if y <= margin:
-                edge_count += 1
-            if (x + w) >= image_width - margin:
-                edge_count += 1
-            if (y + h) >= image_height - margin:
-                edge_count += 1
-            if edge_count >= 2:
-                continue
-            
-            # Check if this room overlaps with any existing room
-            is_duplicate = False
-            for existing in rooms:
-                overlap = calculate_overlap({'x': x, 'y': y, 'width': w, 'height': h}, existing)
-                smaller = min(area, existing['area'])
-                if smaller > 0 and overlap / smaller > 0.6:
-                    is_duplicate = True
-                    break
-            
-            if is_duplicate:
-                continue
-            
-            # Calculate confidence based on contour properties
-            confidence = calculate_room_confidence(contour, area, w, h, walls)
-            
-            # Get approximate polygon
-            epsilon = 0.02 * cv2.arcLength(contour, True)
-            approx = cv2.approxPolyDP(contour, epsilon, True)
-            
-            rooms.append({
-                'x': int(x),
-                'y': int(y),
-                'width': int(w),
-                'height': int(h),
-                'area': float(area),
-                'vertices': len(approx),
-                'name': classify_room(area, w, h, aspect_ratio, total_area),
-                'confidence': float(confidence)
-            })
+    count, components, stats, centroids = cv2.connectedComponentsWithStats(
+        opened, connectivity=4, ltype=cv2.CV_32S
+    )
+    x = stats[:, cv2.CC_STAT_LEFT]
+    y = stats[:, cv2.CC_STAT_TOP]
+    w = stats[:, cv2.CC_STAT_WIDTH]
+    h = stats[:, cv2.CC_STAT_HEIGHT]
+    area = stats[:, cv2.CC_STAT_AREA].astype(np.float64)
+    aspect_ratio = np.maximum(w, h) / (np.minimum(w, h) + 1)
+    
+    # Regions touching two or more image edges are background
+    margin = 5
+    edge_count = ((x <= margin).astype(int) + (y <= margin) +
+                  (x + w >= image_width - margin) + (y + h >= image_height - margin))
+    
+    candidate = (
+        (area >= min_area) & (area <= max_area) &
+        (w >= 10) & (h >= 10) &
+        (aspect_ratio <= 8) &  # Very thin regions are corridors or hallways
+        (edge_count < 2)
+    )
+    candidate[0] = False  # Walls
+    ids = np.flatnonzero(candidate)
+    
+    confidence = calculate_room_confidence(
+        area[ids], w[ids], h[ids], centroids[ids], walls
+    )
+    
+    rooms = []
+    outlines = {}
+    for k, label in enumerate(ids.tolist()):
+        outline = room_outline(components, label, x[label], y[label], w[label], h[label])
+        outlines[label] = outline
+        epsilon = 0.02 * cv2.arcLength(outline, True)
+        rooms.append({
+            'x': int(x[label]),
+            'y': int(y[label]),
+            'width': int(w[label]),
+            'height': int(h[label]),
+            'area': float(area[label]),
+            'vertices': len(cv2.approxPolyDP(outline, epsilon, True)),
+            'name': classify_room(area[label], w[label], h[label], aspect_ratio[label], total_area),
+            'confidence': float(confidence[k]),
+            'label': label
+        })
     
     # Remove overlapping rooms (keep larger ones)
     rooms = remove_overlapping_rooms(rooms, overlap_threshold=0.4)
     
-    # Sort by area (largest first)
+    # Sort by area (largest first) and number the rooms in that order
     rooms.sort(key=lambda r: r['area'], reverse=True)
+    if not return_labels:
+        for i, room in enumerate(rooms):
+            room['label'] = i + 1
+        return rooms
     
-    return rooms
+    # Paint filled outlines, largest first, so text inside a room and rooms
+    # nested inside another one get the right label
+    labels = np.zeros(components.shape, dtype=np.int32)
+    for i, room in enumerate(rooms):
+        cv2.drawContours(labels, [outlines[room['label']]], 0, i + 1, thickness=-1)
+        room['label'] = i + 1
+    return rooms, labels
 
 
-def fill_holes(binary_image: np.ndarray) -> np.ndarray:
-    """
-    Fill holes in a binary image using flood fill.
-    
-    Args:
-        binary_image: Binary input image
-        
-    Returns:
-        Image with holes filled
-    """
-    # Create a mask slightly larger than the image
-    h, w = binary_image.shape
-    mask = np.zeros((h + 2, w + 2), np.uint8)
-    
-    # Copy image
-    filled = binary_image.copy()
-    
-    # Flood fill from the corners (background)
-    cv2.floodFill(filled, mask, (0, 0), 128)
-    
-    # Invert the flooded image
-    filled = cv2.bitwise_not(filled)
-    
-    # Combine with original
-    result = binary_image | filled
-    
-    return result
+def room_outline(components: np.ndarray, label: int,
+                 x: int, y: int, w: int, h: int) -> np.ndarray:
+    """Outer contour of one labelled region, in image coordinates."""
+    mask = (components[y:y + h, x:x + w] == label).astype(np.uint8)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE,
+                                   offset=(int(x), int(y)))
+    return max(contours, key=len)
 
 
 def calculate_room_confidence(
-    contour: np.ndarray,
-    area: float,
-    width: int,
-    height: int,
+    area: np.ndarray,
+    width: np.ndarray,
+    height: np.ndarray,
+    centers: np.ndarray,
     walls: List[Dict]
-) -> float:
+) -> np.ndarray:
     """
-    Calculate confidence score for a room detection.
+    Calculate confidence scores for room detections.
     
     Args:
-        contour: Room contour
-        area: Room area in pixels
-        width: Bounding box width
-        height: Bounding box height
+        area: Room areas in pixels
+        width: Bounding box widths
+        height: Bounding box heights
+        centers: (N, 2) room centroids
         walls: Detected walls for validation
         
     Returns:
-        Confidence score between 0 and 1
+        Confidence scores between 0 and 1, one per room
     """
-    confidence = 0.5
+    area = np.asarray(area, dtype=np.float64)
+    width = np.asarray(width, dtype=np.float64)
+    height = np.asarray(height, dtype=np.float64)
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+    confidence = np.full(len(area), 0.5)
     
-    # Bonus for regular shape (high solidity)
-    hull = cv2.convexHull(contour)
-    hull_area = cv2.contourArea(hull)
-    if hull_area > 0:
-        solidity = area / hull_area
-        confidence += solidity * 0.2
+    # Bonus for regular shape (how much of the bounding box the room fills)
+    extent = np.divide(area, width * height, out=np.zeros_like(area), where=width * height > 0)
+    confidence += np.minimum(extent, 1.0) * 0.2
     
     # Bonus for reasonable aspect ratio
-    aspect_ratio = max(width, height) / (min(width, height) + 1)
-    if aspect_ratio < 3:
-        confidence += 0.1
+    aspect_ratio = np.maximum(width, height) / (np.minimum(width, height) + 1)
+    confidence += np.where(aspect_ratio < 3, 0.1, 0.0)
     
     # Bonus for having walls nearby
-    x, y, w, h = cv2.boundingRect(contour)
-    center_x = x + w / 2
-    center_y = y + h / 2
-    
-    walls_nearby = 0
-    for wall in walls:
-        wall_center_x = (wall['x1'] + wall['x2']) / 2
-        wall_center_y = (wall['y1'] + wall['y2']) / 2
-        dist = np.sqrt((center_x - wall_center_x) ** 2 + (center_y - wall_center_y) ** 2)
-        if dist < max(w, h) * 1.5:
-            walls_nearby += 1
-    
-    if walls_nearby > 2:
-        confidence += 0.15
+    if walls and len(area):
+        wall_centers = np.array(
+            [((wall['x1'] + wall['x2']) / 2, (wall['y1'] + wall['y2']) / 2) for wall in walls],
+            dtype=np.float64
+        )
+        reach = np.maximum(width, height) * 1.5
+        walls_nearby = np.zeros(len(area), dtype=np.int64)
+        # Chunk over rooms to bound the (rooms x walls) distance matrix
+        for start in range(0, len(area), 256):
+            block = slice(start, start + 256)
+            diff = centers[block, None, :] - wall_centers[None, :, :]
+            dist = np.sqrt((diff ** 2).sum(axis=2))
+            walls_nearby[block] = (dist < reach[block, None]).sum(axis=1)
+        confidence += np.where(walls_nearby > 2, 0.15, 0.0)
     
-    return min(0.95, confidence)
+    return np.minimum(0.95, confidence)
 
 
 def classify_room(
@@ -284,34 +250,11 @@ def remove_overlapping_rooms(
     if len(rooms) <= 1:
         return rooms
     
-    # Sort by area descending
-    sorted_rooms = sorted(rooms, key=lambda r: r['area'], reverse=True)
-    
-    unique = []
-    for room in sorted_rooms:
-        is_overlapping = False
-        
-        for existing in unique:
-            overlap = calculate_overlap(room, existing)
-            smaller_area = min(room['area'], existing['area'])
-            
-            if smaller_area > 0 and overlap / smaller_area > overlap_threshold:
-                is_overlapping = True
-                break
-        
-        if not is_overlapping:
-            unique.append(room)
-    
-    return unique
-
-
-def calculate_overlap(room1: Dict, room2: Dict) -> float:
-    """Calculate overlap area between two rooms."""
-    x1 = max(room1['x'], room2['x'])
-    y1 = max(room1['y'], room2['y'])
-    x2 = min(room1['x'] + room1['width'], room2['x'] + room2['width'])
-    y2 = min(room1['y'] + room1['height'], room2['y'] + room2['height'])
-    
-    if x1 < x2 and y1 < y2:
-        return (x2 - x1) * (y2 - y1)
-    return 0
+    # Visit larger rooms first; overlap is measured against the smaller area
+    return suppress_overlapping_boxes(
+        rooms,
+        box=lambda r: (r['x'], r['y'], r['width'], r['height']),
+        threshold=overlap_threshold,
+        keep=keep_by('area'),
+        area=lambda r: r['area']
+    )
@@ -0,0 +1,214 @@
+"""
+Skeleton Graph Module
+
+Thins a binary free-space mask to a one-pixel medial-axis skeleton and
+turns the skeleton into a sparse graph: nodes at junctions and dead ends,
+and one pixel path per segment between them.
+
+cv2.ximgproc.thinning is used when opencv-contrib is installed; otherwise
+a vectorized Zhang-Suen thinning is used.
+"""
+
+import cv2
+import numpy as np
+from typing import Dict, List, Tuple
+
+try:
+    from cv2 import ximgproc
+except ImportError:
+    ximgproc = None
+
+# 8-neighbour offsets (dy, dx), clockwise from north
+NEIGHBOURS = [(-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1)]
+
+
+def skeletonize(mask: np.ndarray) -> np.ndarray:
+    """
+    Thin a binary mask (non-zero = foreground) to a one-pixel skeleton.
+
+    Returns:
+        uint8 mask with skeleton pixels set to 1
+    """
+    binary = (mask > 0).astype(np.uint8)
+    if ximgproc is not None:
+        return (ximgproc.thinning(binary * 255) > 0).astype(np.uint8)
+
+    img = np.pad(binary, 1)
+    while True:
+        changed = False
+        for step in (0, 1):
+            p2, p3 = img[:-2, 1:-1], img[:-2, 2:]
+            p4, p5 = img[1:-1, 2:], img[2:, 2:]
+            p6, p7 = img[2:, 1:-1], img[2:, :-2]
+            p8, p9 = img[1:-1, :-2], img[:-2, :-2]
+            ring = [p2, p3, p4, p5, p6, p7, p8, p9, p2]
+
+            count = p2 + p3 + p4 + p5 + p6 + p7 + p8 + p9
+            transitions = sum(((a == 0) & (b == 1)).astype(np.uint8) for a, b in zip(ring, ring[1:]))
+            if step == 0:
+                side = (p2 * p4 * p6 == 0) & (p4 * p6 * p8 == 0)
+            else:
+                side = (p2 * p4 * p8 == 0) & (p2 * p6 * p8 == 0)
+
+            delete = (img[1:-1, 1:-1] == 1) & (count >= 2) & (count <= 6) & (transitions == 1) & side
+            if delete.any():
+                img[1:-1, 1:-1][delete] = 0
+                changed = True
+        if not changed:
+            return img[1:-1, 1:-1]
+
+
+def skeleton_graph(
+    skeleton: np.ndarray,
+    min_spur_length: float = 0
+) -> Tuple[List[Tuple[float, float]], List[Dict]]:
+    """
+    Convert a one-pixel skeleton into junction/end nodes and segments.
+
+    Neighbouring junction pixels are merged into one node at their
+    centroid. Dead-end branches shorter than `min_spur_length` pixels are
+    pruned, and nodes left with exactly two segments are dissolved so
+    every remaining node is a junction or a dead end.
+
+    Args:
+        skeleton: Binary skeleton (non-zero = skeleton pixel)
+        min_spur_length: Minimum length of a dead-end branch
+
+    Returns:
+        (nodes, segments): node (x, y) positions, and segments as dicts with
+        "nodes" (start, end node index) and "path" (list of (x, y) pixels
+        from start to end)
+    """
+    skel = (skeleton > 0).astype(np.uint8)
+    h, w = skel.shape[:2]
+    kernel = np.ones((3, 3), np.float32)
+    kernel[1, 1] = 0
+    degree = cv2.filter2D(skel, cv2.CV_8U, kernel, borderType=cv2.BORDER_CONSTANT) * skel
+
+    # Node pixels: anything that is not a plain path pixel
+    node_mask = ((degree != 2) & (skel == 1)).astype(np.uint8)
+    count, labels = cv2.connectedComponents(node_mask, connectivity=8)
+    node_of = labels - 1  # -1 for non-node pixels
+
+    nodes: List[Tuple[float, float]] = []
+    if count > 1:
+        ys, xs = np.nonzero(node_mask)
+        ids = node_of[ys, xs]
+        n = count - 1
+        cx = np.bincount(ids, xs, n) / np.bincount(ids, minlength=n)
+        cy = np.bincount(ids, ys, n) / np.bincount(ids, minlength=n)
+        nodes = list(zip(cx.tolist(), cy.tolist()))
+
+    visited = np.zeros_like(skel, dtype=bool)
+    segments: List[Dict] = []
+
+    def skeleton_neighbours(y: int, x: int):
+        for dy, dx in NEIGHBOURS:
+            ny, nx = y + dy, x + dx
+            if 0 <= ny < h and 0 <= nx < w and skel[ny, nx]:
+                yield ny, nx
+
+    def trace(start_node: int, path: List[Tuple[int, int]]) -> None:
+        """Follow path pixels from path[-1] until another node is reached."""
+        prev = path[-2] if len(path) > 1 else None
+        while True:
+            y, x = path[-1]
+            step = None
+            for ny, nx in skeleton_neighbours(y, x):
+                if (ny, nx) == prev:
+                    continue
+                if node_of[ny, nx] >= 0 and (len(path) > 2 or node_of[ny, nx] != start_node):
+                    path.append((ny, nx))
+                    segments.append({"nodes": [start_node, int(node_of[ny, nx])], "path": path})
+                    return
+                if node_of[ny, nx] < 0 and not visited[ny, nx]:
+                    step = (ny, nx)
+            if step is None:
+                # Loop back onto itself without meeting a node
+                nodes.append((float(x), float(y)))
+                segments.append({"nodes": [start_node, len(nodes) - 1], "path": path})
+                return
+            visited[step] = True
+            prev = (y, x)
+            path.append(step)
+
+    # Segments leaving every node, plus direct node-to-node links
+    node_pixels = list(zip(*np.nonzero(node_mask)))
+    linked = set()
+    for y, x in node_pixels:
+        start = int(node_of[y, x])
+        for ny, nx in skeleton_neighbours(y, x):
+            other = int(node_of[ny, nx])
+            if other < 0 and not visited[ny, nx]:
+                visited[ny, nx] = True
+                trace(start, [(y, x), (ny, nx)])
+            elif other >= 0 and other != start and (min(start, other), max(start, other)) not in linked:
+                linked.add((min(start, other), max(start, other)))
+                segments.append({"nodes": [start, other], "path": [(y, x), (ny, nx)]})
+
+    # Closed loops with no node on them
+    for y, x in zip(*np.nonzero(skel & ~visited & (node_of < 0))):
+        if visited[y, x]:
+            continue
+        visited[y, x] = True
+        nodes.append((float(x), float(y)))
+        trace(len(nodes) - 1, [(y, x)])
+
+    segments = _prune_and_dissolve(nodes, segments, min_spur_length)
+
+    for segment in segments:
+        segment["path"] = [(float(x), float(y)) for y, x in segment["path"]]
+    return nodes, segments
+
+
+def _path_length(path: List[Tuple[int, int]]) -> float:
+    pts = np.asarray(path, dtype=np.float64)
+    return float(np.sqrt((np.diff(pts, axis=0) ** 2).sum(axis=1)).sum()) if len(pts) > 1 else 0.0
+
+
+def _prune_and_dissolve(nodes: List, segments: List[Dict], min_spur_length: float) -> List[Dict]:
+    """Drop short dead-end spurs, then merge segments through degree-2 nodes."""
+    def degrees(segs):
+        deg = np.zeros(len(nodes), dtype=np.int64)
+        for seg in segs:
+            for node in seg["nodes"]:
+                deg[node] += 1
+        return deg
+
+    if min_spur_length > 0:
+        deg = degrees(segments)
+        segments = [
+            seg for seg in segments
+            if not ((deg[seg["nodes"][0]] == 1) != (deg[seg["nodes"][1]] == 1)
+                    and _path_length(seg["path"]) < min_spur_length)
+        ]
+
+    # Dissolve nodes that now sit in the middle of a single corridor
+    deg = degrees(segments)
+    incident: Dict[int, List[int]] = {}
+    for i, seg in enumerate(segments):
+        for node in seg["nodes"]:
+            incident.setdefault(node, []).append(i)
+
+    alive = [True] * len(segments)
+    for node, segs in incident.items():
+        segs = [s for s in segs if alive[s]]
+        if deg[node] != 2 or len(segs) != 2:
+            continue
+        a, b = segs
+        if a == b:
+            continue
+        seg_a, seg_b = segments[a], segments[b]
+        path_a = seg_a["path"] if seg_a["nodes"][1] == node else seg_a["path"][::-1]
+        path_b = seg_b["path"] if seg_b["nodes"][0] == node else seg_b["path"][::-1]
+        start = seg_a["nodes"][0] if seg_a["nodes"][1] == node else seg_a["nodes"][1]
+        end = seg_b["nodes"][1] if seg_b["nodes"][0] == node else seg_b["nodes"][0]
+        if start == end == node:
+            continue
+        segments[a] = {"nodes": [start, end], "path": path_a + path_b[1:]}
+        alive[b] = False
+        # Segment b's other node now belongs to segment a
+        if end in incident:
+            incident[end] = [a if s == b else s for s in incident[end]]
+
+    return [seg for seg, keep in zip(segments, alive) if keep]
@@ -0,0 +1,294 @@
+"""
+Spatial Index Module
+
+Uniform grid hash for fixed-radius neighbour queries on 2D points. Points
+are bucketed into square cells of the query radius, so a radius query only
+has to look at the 3x3 block of cells around the query point instead of
+every point. BoxIndex does the same for point-in-box and window queries
+over axis-aligned boxes.
+
+Usage:
+    python -m utils.spatial    # endpoint clustering benchmark (run from AI/)
+"""
+
+import time
+
+import numpy as np
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+
+class GridIndex:
+    """
+    Grid hash over a fixed set of 2D points.
+
+    Args:
+        points: Sequence of (x, y) points; query results are indices into it
+        cell_size: Grid cell size, normally the largest query radius
+    """
+
+    def __init__(self, points: Sequence[Tuple[float, float]], cell_size: float):
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self.cell_size = float(max(cell_size, 1e-6))
+        self.cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+
+        keys = np.floor(self.points / self.cell_size).astype(np.int64)
+        for i, (cx, cy) in enumerate(keys.tolist()):
+            self.cells[(cx, cy)].append(i)
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def candidates(self, x: float, y: float, radius: float) -> np.ndarray:
+        """Indices of points in the cells overlapping the query circle, sorted."""
+        r = int(np.ceil(radius / self.cell_size))
+        cx, cy = int(np.floor(x / self.cell_size)), int(np.floor(y / self.cell_size))
+        found = []
+        for gx in range(cx - r, cx + r + 1):
+            for gy in range(cy - r, cy + r + 1):
+                found.extend(self.cells.get((gx, gy), ()))
+        return np.array(sorted(found), dtype=np.int64)
+
+    def query_radius(self, x: float, y: float, radius: float) -> np.ndarray:
+        """Indices of points strictly closer than `radius` to (x, y), in input order."""
+        idx = self.candidates(x, y, radius)
+        if len(idx) == 0:
+            return idx
+        pts = self.points[idx]
+        dist = np.sqrt((pts[:, 0] - x) ** 2 + (pts[:, 1] - y) ** 2)
+        return idx[dist < radius]
+
+    def first_within(self, x: float, y: float, radius: float) -> int:
+        """Lowest index of a point closer than `radius`, or -1 if there is none."""
+        idx = self.query_radius(x, y, radius)
+        return int(idx[0]) if len(idx) else -1
+
+
+class BoxIndex:
+    """
+    Grid hash over a fixed set of axis-aligned boxes.
+
+    Each box is registered in every cell it overlaps, so point and window
+    queries only test the boxes in the cells they touch.
+
+    Args:
+        boxes: Sequence of (x1, y1, x2, y2) boxes; query results are indices into it
+        cell_size: Grid cell size (default: median box side)
+    """
+
+    def __init__(self, boxes: Sequence[Tuple[float, float, float, float]], cell_size: float = None):
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        if cell_size is None:
+            sides = np.maximum(self.boxes[:, 2] - self.boxes[:, 0], self.boxes[:, 3] - self.boxes[:, 1])
+            cell_size = float(np.median(sides)) if len(sides) else 1.0
+        self.cell_size = float(max(cell_size, 1e-6))
+        self.cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+
+        keys = np.floor(self.boxes / self.cell_size).astype(np.int64)
+        for i, (x0, y0, x1, y1) in enumerate(keys.tolist()):
+            for gx in range(x0, x1 + 1):
+                for gy in range(y0, y1 + 1):
+                    self.cells[(gx, gy)].append(i)
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    def containing(self, x: float, y: float) -> np.ndarray:
+        """Indices of boxes containing (x, y), edges included, in input order."""
+        key = (int(np.floor(x / self.cell_size)), int(np.floor(y / self.cell_size)))
+        idx = np.array(sorted(self.cells.get(key, ())), dtype=np.int64)
+        if len(idx) == 0:
+            return idx
+        b = self.boxes[idx]
+        return idx[(b[:, 0] <= x) & (x <= b[:, 2]) & (b[:, 1] <= y) & (y <= b[:, 3])]
+
+    def containing_pairs(self, points: Sequence[Tuple[float, float]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        All (point index, box index) pairs with the box containing the point.
+
+        Points are grouped by grid cell and each group is tested against the
+        boxes of its cell in one vectorized comparison.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        keys = np.floor(points / self.cell_size).astype(np.int64)
+        order = np.lexsort((keys[:, 1], keys[:, 0]))
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, (np.diff(sorted_keys, axis=0) != 0).any(axis=1)])
+        ends = np.r_[starts[1:], len(order)]
+
+        point_idx, box_idx = [], []
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            members = self.cells.get(tuple(sorted_keys[start].tolist()))
+            if not members:
+                continue
+            group = order[start:end]
+            p = points[group][:, None, :]
+            b = self.boxes[members][None, :, :]
+            inside = ((b[..., 0] <= p[..., 0]) & (p[..., 0] <= b[..., 2]) &
+                      (b[..., 1] <= p[..., 1]) & (p[..., 1] <= b[..., 3]))
+            pi, bi = np.nonzero(inside)
+            point_idx.append(group[pi])
+            box_idx.append(np.asarray(members, dtype=np.int64)[bi])
+
+        if not point_idx:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        return np.concatenate(point_idx), np.concatenate(box_idx)
+
+    def intersecting(self, x1: float, y1: float, x2: float, y2: float) -> np.ndarray:
+        """Indices of boxes intersecting the window, edges included, in input order."""
+        gx0, gy0 = int(np.floor(x1 / self.cell_size)), int(np.floor(y1 / self.cell_size))
+        gx1, gy1 = int(np.floor(x2 / self.cell_size)), int(np.floor(y2 / self.cell_size))
+        found = set()
+        if (gx1 - gx0 + 1) * (gy1 - gy0 + 1) > len(self.cells):
+            # Window covers more cells than are occupied; walk the occupied ones
+            for (gx, gy), members in self.cells.items():
+                if gx0 <= gx <= gx1 and gy0 <= gy <= gy1:
+                    found.update(members)
+        else:
+            for gx in range(gx0, gx1 + 1):
+                for gy in range(gy0, gy1 + 1):
+                    found.update(self.cells.get((gx, gy), ()))
+        idx = np.array(sorted(found), dtype=np.int64)
+        if len(idx) == 0:
+            return idx
+        b = self.boxes[idx]
+        return idx[(b[:, 0] <= x2) & (x1 <= b[:, 2]) & (b[:, 1] <= y2) & (y1 <= b[:, 3])]
+
+
+def cluster_endpoints(
+    endpoints: Sequence[Tuple[int, int]],
+    distance: float = 15
+) -> List[Tuple[int, int]]:
+    """
+    Cluster nearby endpoints and return cluster centers.
+
+    Greedy leader clustering: in input order, each point not yet clustered
+    starts a cluster and absorbs every unclustered point closer than
+    `distance` to it. Only the grid cells around the leader are searched.
+
+    Args:
+        endpoints: (x, y) points, e.g. from get_wall_endpoints
+        distance: Maximum distance from a cluster's first point
+
+    Returns:
+        Integer (x, y) cluster centers, in order of each cluster's first point
+    """
+    if not endpoints:
+        return []
+
+    points = np.array(endpoints, dtype=np.float32).reshape(-1, 2)
+    index = GridIndex(points, distance)
+    used = np.zeros(len(points), dtype=bool)
+    clusters = []
+
+    for i in range(len(points)):
+        if used[i]:
+            continue
+
+        idx = index.candidates(points[i, 0], points[i, 1], distance)
+        idx = idx[~used[idx]]
+        diff = points[idx] - points[i]
+        members = idx[np.sqrt((diff ** 2).sum(axis=1)) < distance]
+        used[members] = True
+
+        center = np.mean(points[members], axis=0)
+        clusters.append((int(center[0]), int(center[1])))
+
+    return clusters
+
+
+def neighbor_pairs(points: np.ndarray, radius: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    All index pairs (i, j), i < j, of points closer than `radius`.
+
+    Fully vectorized grid hash: points are sorted by cell key and each
+    point's 3x3 cell neighbourhood is located with searchsorted, so the
+    cost is proportional to the number of nearby pairs rather than n^2.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    n = len(points)
+    if n < 2:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+
+    keys = np.floor(points / max(radius, 1e-6)).astype(np.int64)
+    kx = keys[:, 0] - keys[:, 0].min()
+    ky = keys[:, 1] - keys[:, 1].min() + 1
+    width = int(ky.max()) + 2
+    cell = kx * width + ky
+    order = np.argsort(cell, kind="stable")
+    sorted_cells = cell[order]
+
+    first, second = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            target = cell + dx * width + dy
+            lo = np.searchsorted(sorted_cells, target, side="left")
+            hi = np.searchsorted(sorted_cells, target, side="right")
+            counts = hi - lo
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            a = np.repeat(np.arange(n), counts)
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            b = order[np.repeat(lo, counts) + offsets]
+            keep = a < b
+            first.append(a[keep])
+            second.append(b[keep])
+
+    if not first:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    i, j = np.concatenate(first), np.concatenate(second)
+    diff = points[i] - points[j]
+    close = np.sqrt((diff ** 2).sum(axis=1)) < radius
+    return i[close], j[close]
+
+
+def union_find_labels(n: int, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """
+    Connected components of n items joined by the pairs (i[k], j[k]).
+
+    Vectorized union-find: every round hooks each pair's larger root onto
+    the smaller one and then compresses paths by pointer jumping, until
+    no pair spans two components.
+
+    Returns:
+        Array of component labels; each label is the smallest member index
+    """
+    labels = np.arange(n)
+    i = np.asarray(i, dtype=np.int64)
+    j = np.asarray(j, dtype=np.int64)
+    while True:
+        li, lj = labels[i], labels[j]
+        pending = li != lj
+        if not pending.any():
+            return labels
+        li, lj = li[pending], lj[pending]
+        low = np.minimum(li, lj)
+        np.minimum.at(labels, np.maximum(li, lj), low)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+
+
+def _benchmark_clustering(sizes=(1000, 10000, 50000), distance: float = 20) -> None:
+    """Time cluster_endpoints on synthetic Hough-like endpoint sets."""
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        # Endpoints concentrate around wall corners, as HoughLinesP output does
+        corners = rng.uniform(0, 4000, size=(max(n // 8, 1), 2))
+        points = corners[rng.integers(0, len(corners), n)] + rng.normal(0, 6, size=(n, 2))
+        endpoints = [(int(x), int(y)) for x, y in points]
+
+        started = time.perf_counter()
+        clusters = cluster_endpoints(endpoints, distance)
+        elapsed = time.perf_counter() - started
+        print(f"{n:>6} endpoints -> {len(clusters):>6} clusters in {elapsed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    _benchmark_clustering()
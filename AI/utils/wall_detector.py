@@ -9,10 +9,13 @@ import cv2
 import numpy as np
 from typing import List, Dict, Tuple
 
+from .dedup import dedup_by_distance, keep_by
+from .preprocessing import PreprocessedImage
+from .spatial import cluster_endpoints, neighbor_pairs, union_find_labels
+
 
 def detect_walls(
-    binary_image: np.ndarray,
-    edges_image: np.ndarray,
+    image: PreprocessedImage,
     min_length: int = None,
     max_gap: int = None
 ) -> List[Dict]:
@@ -21,8 +24,7 @@ def detect_walls(
     Uses adaptive parameters based on image size for better detection.
     
     Args:
-        binary_image: Binary thresholded image
-        edges_image: Edge-detected image
+        image: Preprocessed floor plan (its Canny edges are used)
         min_length: Minimum line length (auto-calculated if None)
         max_gap: Maximum gap between segments (auto-calculated if None)
         
@@ -30,6 +32,7 @@ def detect_walls(
         List of wall dictionaries with x1, y1, x2, y2, confidence
     """
     walls = []
+    edges_image = image.edges(50, 150)
     h, w = edges_image.shape[:2]
     
     # Adaptive parameters based on image size
@@ -122,148 +125,138 @@ def merge_nearby_walls(
     """
     Merge nearby parallel wall segments into longer walls.
     
+    Two walls are linked when their angles differ by at most
+    `angle_threshold`, one's midpoint lies within `distance_threshold` of
+    the other's line, and their closest endpoints are less than
+    3 * `distance_threshold` apart. Linked walls are grouped transitively,
+    so a wall broken into several collinear pieces becomes one segment.
+    
     Args:
         walls: List of wall dictionaries
         distance_threshold: Maximum perpendicular distance to merge
         angle_threshold: Maximum angle difference (degrees) to merge
         
     Returns:
-        List of merged walls
+        List of merged walls, in order of each group's first wall
     """
     if len(walls) <= 1:
         return walls
     
-    # Calculate angles for all walls
-    for wall in walls:
-        dx = wall['x2'] - wall['x1']
-        dy = wall['y2'] - wall['y1']
-        wall['angle'] = np.degrees(np.arctan2(dy, dx)) % 180
+    coords = np.array([[w['x1'], w['y1'], w['x2'], w['y2']] for w in walls], dtype=np.float64)
+    dx = coords[:, 2] - coords[:, 0]
+    dy = coords[:, 3] - coords[:, 1]
+    angles = np.degrees(np.arctan2(dy, dx)) % 180
+    for wall, angle in zip(walls, angles):
+        wall['angle'] = float(angle)
     
-    merged = []
-    used = set()
+    # Candidate pairs: walls with endpoints close together (grid hash)
+    endpoints = coords.reshape(-1, 2)
+    ei, ej = neighbor_pairs(endpoints, distance_threshold * 3)
+    wi, wj = ei // 2, ej // 2
+    distinct = wi != wj
+    pair_keys = np.unique(np.minimum(wi, wj)[distinct] * len(walls) + np.maximum(wi, wj)[distinct])
+    wi, wj = pair_keys // len(walls), pair_keys % len(walls)
     
-    for i, wall in enumerate(walls):
-        if i in used:
-            continue
-        
-        # Find walls to merge with this one
-        merge_group = [wall]
-        used.add(i)
-        
-        for j, other in enumerate(walls):
-            if j in used:
-                continue
-            
-            # Check if parallel
-            angle_diff = abs(wall['angle'] - other['angle'])
-            if angle_diff > 90:
-                angle_diff = 180 - angle_diff
-            
-            if angle_diff > angle_threshold:
-                continue
-            
-            # Check if close enough
-            if walls_are_close(wall, other, distance_threshold):
-                merge_group.append(other)
-                used.add(j)
-        
-        # Merge the group
-        if len(merge_group) > 1:
-            merged_wall = merge_wall_group(merge_group)
-            merged.append(merged_wall)
-        else:
-            merged.append(wall)
+    # Parallel: angle difference, wrapping around 180 degrees
+    angle_diff = np.abs(angles[wi] - angles[wj])
+    angle_diff = np.minimum(angle_diff, 180 - angle_diff)
     
-    return merged
-
-
-def walls_are_close(wall1: Dict, wall2: Dict, threshold: float) -> bool:
-    """Check if two walls are close enough to merge."""
-    # Get all endpoints
-    p1 = np.array([wall1['x1'], wall1['y1']])
-    p2 = np.array([wall1['x2'], wall1['y2']])
-    p3 = np.array([wall2['x1'], wall2['y1']])
-    p4 = np.array([wall2['x2'], wall2['y2']])
+    # Collinear: perpendicular offset of either midpoint from the other line
+    lengths = np.maximum(np.hypot(dx, dy), 1e-9)
+    nx, ny = -dy / lengths, dx / lengths
+    mx = (coords[:, 0] + coords[:, 2]) / 2
+    my = (coords[:, 1] + coords[:, 3]) / 2
+    offset_ij = np.abs(nx[wi] * (mx[wj] - coords[wi, 0]) + ny[wi] * (my[wj] - coords[wi, 1]))
+    offset_ji = np.abs(nx[wj] * (mx[wi] - coords[wj, 0]) + ny[wj] * (my[wi] - coords[wj, 1]))
+    offset = np.minimum(offset_ij, offset_ji)
     
-    # Check minimum distance between any endpoints
-    distances = [
-        np.linalg.norm(p1 - p3),
-        np.linalg.norm(p1 - p4),
-        np.linalg.norm(p2 - p3),
-        np.linalg.norm(p2 - p4)
-    ]
+    linked = (angle_diff <= angle_threshold) & (offset <= distance_threshold)
+    labels = union_find_labels(len(walls), wi[linked], wj[linked])
+    
+    group_ids, group_of, group_sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    fitted = merge_wall_groups(walls, coords, group_of, len(group_ids))
     
-    return min(distances) < threshold * 3
+    # Walls that were not merged are passed through unchanged
+    return [
+        walls[first] if size == 1 else fitted[g]
+        for g, (first, size) in enumerate(zip(group_ids, group_sizes))
+    ]
 
 
-def merge_wall_group(walls: List[Dict]) -> Dict:
-    """Merge a group of walls into a single wall."""
-    # Get all endpoints
-    points = []
-    for wall in walls:
-        points.append([wall['x1'], wall['y1']])
-        points.append([wall['x2'], wall['y2']])
+def merge_wall_groups(
+    walls: List[Dict],
+    coords: np.ndarray,
+    group_of: np.ndarray,
+    group_count: int
+) -> List[Dict]:
+    """
+    Merge every group of walls into a single wall in one batch.
     
-    points = np.array(points)
+    Each group's endpoints are fitted with a least-squares line (the same
+    fit as cv2.fitLine with DIST_L2, from per-group moments), and the
+    endpoints with the extreme projections onto it become the new wall.
     
-    # Fit a line to all points
-    vx, vy, x0, y0 = cv2.fitLine(points, cv2.DIST_L2, 0, 0.01, 0.01)
-    vx, vy, x0, y0 = float(vx), float(vy), float(x0), float(y0)
+    Args:
+        walls: List of wall dictionaries
+        coords: (N, 4) array of x1, y1, x2, y2 per wall
+        group_of: Group index of each wall
+        group_count: Number of groups
+        
+    Returns:
+        One merged wall dictionary per group
+    """
+    points = coords.reshape(-1, 2)
+    point_group = np.repeat(group_of, 2)
     
-    # Project all points onto the line
-    projections = []
-    for px, py in points:
-        t = vx * (px - x0) + vy * (py - y0)
-        projections.append((t, px, py))
+    # Per-group centroid and covariance
+    count = np.bincount(point_group, minlength=group_count).astype(np.float64)
+    x0 = np.bincount(point_group, points[:, 0], group_count) / count
+    y0 = np.bincount(point_group, points[:, 1], group_count) / count
+    cx = points[:, 0] - x0[point_group]
+    cy = points[:, 1] - y0[point_group]
+    sxx = np.bincount(point_group, cx * cx, group_count)
+    syy = np.bincount(point_group, cy * cy, group_count)
+    sxy = np.bincount(point_group, cx * cy, group_count)
     
-    # Get extreme points
-    projections.sort(key=lambda x: x[0])
-    _, x1, y1 = projections[0]
-    _, x2, y2 = projections[-1]
+    # Principal direction of each group
+    theta = 0.5 * np.arctan2(2 * sxy, sxx - syy)
+    vx, vy = np.cos(theta), np.sin(theta)
     
-    # Calculate merged confidence
-    avg_confidence = np.mean([w['confidence'] for w in walls])
+    # Extreme projections onto the fitted line
+    t = vx[point_group] * cx + vy[point_group] * cy
+    order = np.lexsort((t, point_group))
+    group_start = np.searchsorted(point_group[order], np.arange(group_count), side='left')
+    group_end = np.searchsorted(point_group[order], np.arange(group_count), side='right') - 1
+    start_pts = points[order[group_start]]
+    end_pts = points[order[group_end]]
     
-    return {
-        'x1': int(x1),
-        'y1': int(y1),
-        'x2': int(x2),
-        'y2': int(y2),
-        'length': float(np.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)),
-        'confidence': float(min(0.95, avg_confidence + 0.05))
-    }
+    confidence = np.array([w['confidence'] for w in walls], dtype=np.float64)
+    avg_confidence = np.bincount(group_of, confidence, group_count) / (count / 2)
+    
+    merged = []
+    for (x1, y1), (x2, y2), conf in zip(start_pts, end_pts, avg_confidence):
+        merged.append({
+            'x1': int(x1),
+            'y1': int(y1),
+            'x2': int(x2),
+            'y2': int(y2),
+            'length': float(np.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)),
+            'confidence': float(min(0.95, conf + 0.05))
+        })
+    return merged
 
 
 def filter_duplicate_walls(walls: List[Dict], min_distance: float = 10) -> List[Dict]:
-    """Remove nearly identical wall segments."""
+    """Remove nearly identical wall segments (close centers), keeping the longer one."""
     if len(walls) <= 1:
         return walls
     
-    unique = []
-    
-    for wall in walls:
-        is_duplicate = False
-        center = ((wall['x1'] + wall['x2']) / 2, (wall['y1'] + wall['y2']) / 2)
-        
-        for existing in unique:
-            existing_center = ((existing['x1'] + existing['x2']) / 2, 
-                              (existing['y1'] + existing['y2']) / 2)
-            
-            dist = np.sqrt((center[0] - existing_center[0]) ** 2 + 
-                          (center[1] - existing_center[1]) ** 2)
-            
-            if dist < min_distance:
-                # Keep the longer one
-                if wall['length'] > existing['length']:
-                    unique.remove(existing)
-                    unique.append(wall)
-                is_duplicate = True
-                break
-        
-        if not is_duplicate:
-            unique.append(wall)
-    
-    return unique
+    return dedup_by_distance(
+        walls,
+        point=lambda w: ((w['x1'] + w['x2']) / 2, (w['y1'] + w['y2']) / 2),
+        distance=min_distance,
+        keep=keep_by('length')
+    )
 
 
 def get_wall_endpoints(walls: List[Dict]) -> List[Tuple[int, int]]:
@@ -273,35 +266,3 @@ def get_wall_endpoints(walls: List[Dict]) -> List[Tuple[int, int]]:
         endpoints.append((wall['x1'], wall['y1']))
         endpoints.append((wall['x2'], wall['y2']))
     return endpoints
-
-
-def cluster_endpoints(
-    endpoints: List[Tuple[int, int]],
-    distance: float = 15
-) -> List[Tuple[int, int]]:
-    """Cluster nearby endpoints and return cluster centers."""
-    if not endpoints:
-        return []
-    
-    points = np.array(endpoints, dtype=np.float32)
-    clusters = []
-    used = set()
-    
-    for i, pt in enumerate(points):
-        if i in used:
-            continue
-        
-        cluster = [pt]
-        used.add(i)
-        
-        for j, pt2 in enumerate(points):
-            if j in used:
-                continue
-            if np.linalg.norm(pt - pt2) < distance:
-                cluster.append(pt2)
-                used.add(j)
-        
-        center = np.mean(cluster, axis=0)
-        clusters.append((int(center[0]), int(center[1])))
-    
-    return clusters
@@ -17,6 +17,7 @@ import pytesseract
 import json
 import sys
 import os
+from collections import defaultdict
 
 # Configure Tesseract path for Windows
 if sys.platform == 'win32':
@@ -29,15 +30,21 @@ if sys.platform == 'win32':
             pytesseract.pytesseract.tesseract_cmd = path
             break
 
+# Share lazily computed rasters with the AI detection pipeline
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'AI'))
+from utils.contour_stats import contour_stats, max_line_deviations
+from utils.dedup import dedup_by_distance, keep_by
+from utils.preprocessing import PreprocessedImage
+from utils.spatial import GridIndex
 
-def detect_skew_angle(image: np.ndarray) -> float:
+# Bump whenever the extracted output changes, so batch_process.py
+# reprocesses images whose -ocr.json was written by an older version
+OCR_VERSION = "2"
+
+
+def detect_skew_angle(image: PreprocessedImage) -> float:
     """Detect skew angle using Hough Line Transform."""
-    if len(image.shape) == 3:
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    else:
-        gray = image.copy()
-    
-    edges = cv2.Canny(gray, 50, 150, apertureSize=3)
+    edges = image.edges(50, 150)
     lines = cv2.HoughLines(edges, 1, np.pi / 180, threshold=200)
     
     if lines is None:
@@ -58,14 +65,6 @@ def detect_skew_angle(image: np.ndarray) -> float:
     return float(np.median(angles)) if angles else 0.0
 
 
-def deskew_image(image: np.ndarray, angle: float) -> np.ndarray:
-    """Rotate image to correct skew."""
-    h, w = image.shape[:2]
-    center = (w // 2, h // 2)
-    M = cv2.getRotationMatrix2D(center, angle, 1.0)
-    return cv2.warpAffine(image, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
-
-
 def transform_coordinates(x: int, y: int, w: int, h: int, 
                          angle: float, img_w: int, img_h: int) -> tuple:
     """Transform coordinates from deskewed image back to original."""
@@ -98,18 +97,22 @@ def transform_point(px: int, py: int, angle: float, img_w: int, img_h: int) -> t
     return int(cx + dx * cos_a - dy * sin_a), int(cy + dx * sin_a + dy * cos_a)
 
 
-def preprocess_image(image: np.ndarray) -> tuple:
-    """Preprocess image for OCR with improved contrast handling."""
+def preprocess_image(image: PreprocessedImage) -> tuple:
+    """
+    Preprocess image for OCR with improved contrast handling.
+    
+    Returns:
+        (binary OCR image, skew angle, deskewed PreprocessedImage). The
+        deskewed image is `image` itself when no rotation was needed, so its
+        cached edges are shared with skew detection.
+    """
     # Detect and correct skew
     skew_angle = detect_skew_angle(image)
-    if abs(skew_angle) > 1.0:
-        image = deskew_image(image, skew_angle)
-    else:
+    if abs(skew_angle) <= 1.0:
         skew_angle = 0.0
+    deskewed = image.deskewed(skew_angle)
     
-    # Convert to grayscale
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image.copy()
-    deskewed_gray = gray.copy()
+    gray = deskewed.gray
     
     # Noise removal with bilateral filter (preserves edges better)
     denoised = cv2.bilateralFilter(gray, 9, 75, 75)
@@ -132,52 +135,52 @@ def preprocess_image(image: np.ndarray) -> tuple:
     kernel = np.ones((2, 2), np.uint8)
     cleaned = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
     
-    return cleaned, skew_angle, deskewed_gray
+    return cleaned, skew_angle, deskewed
 
 
 def simplify_polyline(polyline: list, epsilon: float = 10.0) -> list:
-    """Simplify polyline using Douglas-Peucker algorithm (Ramer-Douglas-Peucker)."""
+    """
+    Simplify polyline using Douglas-Peucker algorithm (Ramer-Douglas-Peucker).
+    
+    Iterative and index-based: a stack of (start, end) index ranges replaces
+    the recursion, and points are only marked as kept, never copied.
+    """
     if len(polyline) < 3:
         return polyline
     
-    # Convert to numpy array
     points = np.array(polyline, dtype=float)
-    
-    # Find point with max distance from line between first and last
-    start, end = points[0], points[-1]
-    
-    # Distance from each point to line
-    line_vec = end - start
-    line_len = np.linalg.norm(line_vec)
-    if line_len == 0:
+    if np.array_equal(points[0], points[-1]):
         return [polyline[0]]
     
-    line_unit = line_vec / line_len
-    
-    # Calculate perpendicular distance for all intermediate points
-    distances = []
-    for i in range(1, len(points) - 1):
-        point_vec = points[i] - start
-        proj_len = np.dot(point_vec, line_unit)
-        proj = start + proj_len * line_unit
-        dist = np.linalg.norm(points[i] - proj)
-        distances.append((i, dist))
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
     
-    if not distances:
-        return [polyline[0], polyline[-1]]
-    
-    max_idx, max_dist = max(distances, key=lambda x: x[1])
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        
+        # Perpendicular distance of the intermediate points to start-end
+        line_vec = points[end] - points[start]
+        line_len = np.hypot(line_vec[0], line_vec[1])
+        offsets = points[start + 1:end] - points[start]
+        if line_len == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(offsets[:, 0] * line_vec[1] - offsets[:, 1] * line_vec[0]) / line_len
+        
+        max_idx = int(np.argmax(distances))
+        if distances[max_idx] > epsilon:
+            split = start + 1 + max_idx
+            keep[split] = True
+            stack.append((split, end))
+            stack.append((start, split))
     
-    if max_dist > epsilon:
-        # Recursively simplify
-        left = simplify_polyline([list(p) for p in points[:max_idx+1]], epsilon)
-        right = simplify_polyline([list(p) for p in points[max_idx:]], epsilon)
-        return left[:-1] + right
-    else:
-        return [polyline[0], polyline[-1]]
+    return [polyline[i] for i in np.flatnonzero(keep)]
 
 
-def detect_hallways(gray_image: np.ndarray, skew_angle: float, 
+def detect_hallways(image: PreprocessedImage, skew_angle: float, 
                     img_w: int, img_h: int, min_length: int = 300) -> list:
     """
     Detect hallways by finding long horizontal and vertical lines.
@@ -185,7 +188,7 @@ def detect_hallways(gray_image: np.ndarray, skew_angle: float,
     Returns list of hallways with simplified polylines.
     """
     # Edge detection
-    edges = cv2.Canny(gray_image, 50, 150, apertureSize=3)
+    edges = image.edges(50, 150)
     
     # Dilate edges to connect nearby lines
     kernel = np.ones((3, 3), np.uint8)
@@ -219,7 +222,6 @@ def detect_hallways(gray_image: np.ndarray, skew_angle: float,
             vertical_lines.append((x1, y1, x2, y2, length))
     
     # Merge and create polylines for horizontal corridors
-    horizontal_lines.sort(key=lambda l: l[1])
     merged_h = merge_parallel_lines(horizontal_lines, 'horizontal', 50)
     
     for line_group in merged_h:
@@ -234,7 +236,6 @@ def detect_hallways(gray_image: np.ndarray, skew_angle: float,
             hallways.append({"polyline": polyline})
     
     # Merge and create polylines for vertical corridors
-    vertical_lines.sort(key=lambda l: l[0])
     merged_v = merge_parallel_lines(vertical_lines, 'vertical', 50)
     
     for line_group in merged_v:
@@ -261,41 +262,29 @@ def detect_hallways(gray_image: np.ndarray, skew_angle: float,
 
 
 def merge_parallel_lines(lines: list, axis: str, merge_distance: int = 50) -> list:
-    """Merge lines that are parallel and close together."""
+    """
+    Merge lines that are parallel and close together.
+    
+    Single sort + sweep over the line centers across the axis: a group
+    starts at the smallest ungrouped center and takes every following line
+    whose center is less than `merge_distance` beyond it.
+    """
     if not lines:
         return []
     
-    groups = []
-    used = set()
+    if axis == 'horizontal':
+        centers = [(y1 + y2) / 2 for _, y1, _, y2, _ in lines]
+    else:
+        centers = [(x1 + x2) / 2 for x1, _, x2, _, _ in lines]
+    order = sorted(range(len(lines)), key=lambda i: centers[i])
     
-    for i, line1 in enumerate(lines):
-        if i in used:
-            continue
-        
-        group = [line1]
-        used.add(i)
-        x1_1, y1_1, x2_1, y2_1, _ = line1
-        
-        for j, line2 in enumerate(lines):
-            if j in used:
-                continue
-            
-            x1_2, y1_2, x2_2, y2_2, _ = line2
-            
-            if axis == 'horizontal':
-                y_center1 = (y1_1 + y2_1) / 2
-                y_center2 = (y1_2 + y2_2) / 2
-                if abs(y_center1 - y_center2) < merge_distance:
-                    group.append(line2)
-                    used.add(j)
-            else:
-                x_center1 = (x1_1 + x2_1) / 2
-                x_center2 = (x1_2 + x2_2) / 2
-                if abs(x_center1 - x_center2) < merge_distance:
-                    group.append(line2)
-                    used.add(j)
-        
-        groups.append(group)
+    groups = []
+    group_start = None
+    for i in order:
+        if group_start is None or centers[i] - group_start >= merge_distance:
+            groups.append([])
+            group_start = centers[i]
+        groups[-1].append(lines[i])
     
     return groups
 
@@ -304,13 +293,13 @@ def merge_parallel_lines(lines: list, axis: str, merge_distance: int = 50) -> li
 # DOOR DETECTION
 # =============================================================================
 
-def detect_walls(gray_image: np.ndarray, min_length: int = 50) -> list:
+def detect_walls(image: PreprocessedImage, min_length: int = 50) -> list:
     """
     Detect walls as long straight Hough lines only.
     Returns list of wall line segments: [(x1, y1, x2, y2), ...]
     """
     # Edge detection
-    edges = cv2.Canny(gray_image, 50, 150, apertureSize=3)
+    edges = image.edges(50, 150)
     
     # Detect straight lines using Hough Transform
     lines = cv2.HoughLinesP(
@@ -332,50 +321,33 @@ def detect_walls(gray_image: np.ndarray, min_length: int = 50) -> list:
     return walls
 
 
-def detect_curved_contours(gray_image: np.ndarray, min_arc_length: int = 20) -> list:
+def detect_curved_contours(image: PreprocessedImage, min_arc_length: int = 20) -> list:
     """
     Detect curved contours (door swing arcs) separately from straight walls.
     Returns list of arc contours with their properties.
     """
     # Threshold
-    _, binary = cv2.threshold(gray_image, 200, 255, cv2.THRESH_BINARY_INV)
+    binary = image.threshold(200)
     
     # Find all contours
     contours, _ = cv2.findContours(binary, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
     
+    # Batch pre-filter: enough points for a fit and long enough (approximate
+    # length with a margin, confirmed with cv2.arcLength)
+    stats = contour_stats(contours)
+    keep = (stats['counts'] >= 5) & (stats['arc_length'] >= min_arc_length - 1e-3)
+    candidates = [contours[i] for i in np.flatnonzero(keep)]
+    arc_lengths = np.array([cv2.arcLength(c, closed=False) for c in candidates], dtype=np.float64)
+    long_enough = arc_lengths >= min_arc_length
+    candidates = [c for c, ok in zip(candidates, long_enough) if ok]
+    arc_lengths = arc_lengths[long_enough]
+    
+    # Curved arcs deviate from their best-fit line; straight walls do not.
+    # Max distance from the fitted line, relative to the arc length
+    curvature_ratios = max_line_deviations(candidates) / np.maximum(arc_lengths, 1)
+    
     arcs = []
-    for contour in contours:
-        arc_length = cv2.arcLength(contour, closed=False)
-        
-        if arc_length < min_arc_length:
-            continue
-        
-        # Fit ellipse to detect curved shapes
-        if len(contour) < 5:
-            continue
-        
-        # Calculate circularity: 4*pi*area / perimeter^2
-        area = cv2.contourArea(contour)
-        if arc_length > 0:
-            circularity = 4 * np.pi * area / (arc_length ** 2)
-        else:
-            continue
-        
-        # Curved arcs have low circularity (not full circles) but are curved
-        # Fit a line and check residual to determine if curved
-        [vx, vy, x0, y0] = cv2.fitLine(contour, cv2.DIST_L2, 0, 0.01, 0.01)
-        
-        # Calculate max distance from fitted line
-        max_dist = 0
-        for point in contour:
-            px, py = point[0]
-            # Distance from point to line
-            dist = abs(vy * (px - x0) - vx * (py - y0))
-            max_dist = max(max_dist, dist)
-        
-        # If max distance from line is significant, it's curved
-        curvature_ratio = float(max_dist) / max(arc_length, 1)
-        
+    for contour, arc_length, curvature_ratio in zip(candidates, arc_lengths, curvature_ratios):
         if curvature_ratio > 0.05:  # More curved than a straight line
             # Get bounding box and center
             x, y, w, h = cv2.boundingRect(contour)
@@ -448,108 +420,70 @@ def find_wall_gaps(walls: list, gap_threshold: int = 80) -> list:
         elif 60 < angle < 120:
             vertical_walls.append((x1, y1, x2, y2))
     
-    # Find gaps in horizontal walls (sorted by Y, then X)
-    horizontal_walls.sort(key=lambda w: (w[1] + w[3]) // 2)
     gaps.extend(find_gaps_in_wall_group(horizontal_walls, 'horizontal', gap_threshold))
-    
-    # Find gaps in vertical walls
-    vertical_walls.sort(key=lambda w: (w[0] + w[2]) // 2)
     gaps.extend(find_gaps_in_wall_group(vertical_walls, 'vertical', gap_threshold))
     
     return gaps
 
 
-def find_gaps_in_wall_group(walls: list, orientation: str, gap_threshold: int) -> list:
-    """Find gaps between wall segments in a group."""
+def find_gaps_in_wall_group(walls: list, orientation: str, gap_threshold: int,
+                            row_tolerance: int = 20) -> list:
+    """
+    Find gaps between wall segments in a group.
+    
+    Sort-and-sweep: walls are sorted by their center across the wall
+    direction and split into collinear rows wherever consecutive centers
+    are more than `row_tolerance` apart. Each row is sorted by extent and
+    swept once; a gap is the space between the furthest extent covered so
+    far and the next wall's start, if their centers are within
+    `row_tolerance`.
+    """
     gaps = []
     
     if len(walls) < 2:
         return gaps
     
-    for i, wall1 in enumerate(walls):
-        x1_1, y1_1, x2_1, y2_1 = wall1
+    # (center across, start along, end along) per wall
+    if orientation == 'horizontal':
+        spans = [((y1 + y2) / 2, min(x1, x2), max(x1, x2)) for x1, y1, x2, y2 in walls]
+    else:
+        spans = [((x1 + x2) / 2, min(y1, y2), max(y1, y2)) for x1, y1, x2, y2 in walls]
+    spans.sort()
+    
+    rows = [[spans[0]]]
+    for span in spans[1:]:
+        if span[0] - rows[-1][-1][0] > row_tolerance:
+            rows.append([])
+        rows[-1].append(span)
+    
+    for row in rows:
+        row.sort(key=lambda span: (span[1], span[2]))
+        center1, _, end1 = row[0]
         
-        for wall2 in walls[i+1:]:
-            x1_2, y1_2, x2_2, y2_2 = wall2
-            
-            if orientation == 'horizontal':
-                # Check if walls are on same horizontal line
-                y_center1 = (y1_1 + y2_1) / 2
-                y_center2 = (y1_2 + y2_2) / 2
-                
-                if abs(y_center1 - y_center2) > 20:
-                    continue
-                
-                # Find horizontal gap
-                right1 = max(x1_1, x2_1)
-                left2 = min(x1_2, x2_2)
-                left1 = min(x1_1, x2_1)
-                right2 = max(x1_2, x2_2)
-                
-                if left2 > right1:
-                    gap_width = left2 - right1
-                    if 15 < gap_width < gap_threshold:
-                        gap_center_x = (right1 + left2) // 2
-                        gap_center_y = int((y_center1 + y_center2) / 2)
-                        gaps.append({
-                            'center': (gap_center_x, gap_center_y),
-                            'width': int(gap_width),
-                            'orientation': orientation,
-                            'endpoints': [(right1, int(y_center1)), (left2, int(y_center2))]
-                        })
-                elif left1 > right2:
-                    gap_width = left1 - right2
-                    if 15 < gap_width < gap_threshold:
-                        gap_center_x = (right2 + left1) // 2
-                        gap_center_y = int((y_center1 + y_center2) / 2)
-                        gaps.append({
-                            'center': (gap_center_x, gap_center_y),
-                            'width': int(gap_width),
-                            'orientation': orientation,
-                            'endpoints': [(right2, int(y_center2)), (left1, int(y_center1))]
-                        })
+        for center2, start2, end2 in row[1:]:
+            gap_width = start2 - end1
+            if 15 < gap_width < gap_threshold and abs(center1 - center2) <= row_tolerance:
+                along = (end1 + start2) // 2
+                across = int((center1 + center2) / 2)
+                endpoints = [(end1, int(center1)), (start2, int(center2))]
+                if orientation == 'vertical':
+                    along, across = across, along
+                    endpoints = [(c, e) for e, c in endpoints]
+                gaps.append({
+                    'center': (along, across),
+                    'width': int(gap_width),
+                    'orientation': orientation,
+                    'endpoints': endpoints
+                })
             
-            else:  # vertical
-                # Check if walls are on same vertical line
-                x_center1 = (x1_1 + x2_1) / 2
-                x_center2 = (x1_2 + x2_2) / 2
-                
-                if abs(x_center1 - x_center2) > 20:
-                    continue
-                
-                # Find vertical gap
-                bottom1 = max(y1_1, y2_1)
-                top2 = min(y1_2, y2_2)
-                top1 = min(y1_1, y2_1)
-                bottom2 = max(y1_2, y2_2)
-                
-                if top2 > bottom1:
-                    gap_width = top2 - bottom1
-                    if 15 < gap_width < gap_threshold:
-                        gap_center_x = int((x_center1 + x_center2) / 2)
-                        gap_center_y = (bottom1 + top2) // 2
-                        gaps.append({
-                            'center': (gap_center_x, gap_center_y),
-                            'width': int(gap_width),
-                            'orientation': orientation,
-                            'endpoints': [(int(x_center1), bottom1), (int(x_center2), top2)]
-                        })
-                elif top1 > bottom2:
-                    gap_width = top1 - bottom2
-                    if 15 < gap_width < gap_threshold:
-                        gap_center_x = int((x_center1 + x_center2) / 2)
-                        gap_center_y = (bottom2 + top1) // 2
-                        gaps.append({
-                            'center': (gap_center_x, gap_center_y),
-                            'width': int(gap_width),
-                            'orientation': orientation,
-                            'endpoints': [(int(x_center2), bottom2), (int(x_center1), top1)]
-                        })
+            # Keep the wall reaching furthest as the left side of the next gap
+            if end2 > end1:
+                center1, end1 = center2, end2
     
     return gaps
 
 
-def detect_doors(gray_image: np.ndarray, skew_angle: float, 
+def detect_doors(image: PreprocessedImage, skew_angle: float, 
                  img_w: int, img_h: int) -> list:
     """
     Detect doors by finding wall gaps with curved contours (door swing arcs).
@@ -562,10 +496,10 @@ def detect_doors(gray_image: np.ndarray, skew_angle: float,
     Returns list of door objects with center, width, and swing direction.
     """
     # Step 1: Detect straight wall lines
-    walls = detect_walls(gray_image, min_length=50)
+    walls = detect_walls(image, min_length=50)
     
     # Step 2: Detect curved arc contours
-    arcs = detect_curved_contours(gray_image, min_arc_length=30)
+    arcs = detect_curved_contours(image, min_arc_length=30)
     
     # Step 3: Find wall gaps
     gaps = find_wall_gaps(walls, gap_threshold=80)
@@ -573,98 +507,96 @@ def detect_doors(gray_image: np.ndarray, skew_angle: float,
     doors = []
     used_arcs = set()
     
-    # Step 4: Match gaps with nearby arcs
+    # Step 4: Match gaps with nearby arcs (indexed by arc center)
+    arc_index = GridIndex([arc['center'] for arc in arcs], 100)
     for gap in gaps:
         gap_cx, gap_cy = gap['center']
         gap_width = gap['width']
         
-        # Look for arcs near this gap
-        for i, arc in enumerate(arcs):
-            if i in used_arcs:
-                continue
-            
-            arc_cx, arc_cy = arc['center']
-            arc_bbox = arc['bbox']
-            
-            # Check if arc is near the gap (within ~100px)
-            distance = np.sqrt((arc_cx - gap_cx)**2 + (arc_cy - gap_cy)**2)
-            
-            if distance < max(gap_width * 2, 100):
-                # This arc is near the gap - likely a door
-                # Transform coordinates back to original
-                tx, ty = transform_point(gap_cx, gap_cy, skew_angle, img_w, img_h)
-                
-                doors.append({
-                    'center_x': tx,
-                    'center_y': ty,
-                    'width': gap_width,
-                    'swing_direction': arc['swing_direction'],
-                    'orientation': gap['orientation']
-                })
-                
-                used_arcs.add(i)
-                break
+        # First unused arc near the gap (within ~100px)
+        nearby = arc_index.query_radius(gap_cx, gap_cy, max(gap_width * 2, 100))
+        match = next((i for i in nearby.tolist() if i not in used_arcs), None)
+        if match is None:
+            continue
+        
+        # This arc is near the gap - likely a door
+        # Transform coordinates back to original
+        tx, ty = transform_point(gap_cx, gap_cy, skew_angle, img_w, img_h)
+        
+        doors.append({
+            'center_x': tx,
+            'center_y': ty,
+            'width': gap_width,
+            'swing_direction': arcs[match]['swing_direction'],
+            'orientation': gap['orientation']
+        })
+        
+        used_arcs.add(match)
+    
+    # Door centers bucketed in 20px cells for the "already matched" check
+    door_cells = defaultdict(list)
+    
+    def add_door_cell(door):
+        cell = (int(door['center_x'] // 20), int(door['center_y'] // 20))
+        door_cells[cell].append((door['center_x'], door['center_y']))
+    
+    for door in doors:
+        add_door_cell(door)
     
     # Also detect doors at gaps without arcs (open doorways)
     for gap in gaps:
         gap_cx, gap_cy = gap['center']
         
         # Check if this gap already matched
-        already_matched = False
-        for door in doors:
-            if abs(door['center_x'] - gap_cx) < 20 and abs(door['center_y'] - gap_cy) < 20:
-                already_matched = True
-                break
+        cx, cy = int(gap_cx // 20), int(gap_cy // 20)
+        already_matched = any(
+            abs(dx - gap_cx) < 20 and abs(dy - gap_cy) < 20
+            for gx in (cx - 1, cx, cx + 1)
+            for gy in (cy - 1, cy, cy + 1)
+            for dx, dy in door_cells.get((gx, gy), ())
+        )
         
         if not already_matched and gap['width'] > 25:
             tx, ty = transform_point(gap_cx, gap_cy, skew_angle, img_w, img_h)
-            doors.append({
+            door = {
                 'center_x': tx,
                 'center_y': ty,
                 'width': gap['width'],
                 'swing_direction': 'unknown',
                 'orientation': gap['orientation']
-            })
+            }
+            doors.append(door)
+            add_door_cell(door)
     
     return doors
 
 
 def deduplicate_doors(doors: list, distance_threshold: int = 15) -> list:
-    """Remove duplicate door detections that are too close together."""
+    """Remove duplicate door detections that are too close together (keep the wider)."""
     if not doors:
         return []
     
-    unique_doors = []
-    for door in doors:
-        is_duplicate = False
-        for existing in unique_doors:
-            dx = abs(door['center_x'] - existing['center_x'])
-            dy = abs(door['center_y'] - existing['center_y'])
-            if dx < distance_threshold and dy < distance_threshold:
-                # Keep the one with larger width
-                if door['width'] > existing['width']:
-                    unique_doors.remove(existing)
-                    unique_doors.append(door)
-                is_duplicate = True
-                break
-        if not is_duplicate:
-            unique_doors.append(door)
-    
-    return unique_doors
+    return dedup_by_distance(
+        doors,
+        point=lambda d: (d['center_x'], d['center_y']),
+        distance=distance_threshold,
+        keep=keep_by('width'),
+        metric="chebyshev"
+    )
 
 
 # =============================================================================
 # STAIR DETECTION
 # =============================================================================
 
-def detect_stairs(gray_image: np.ndarray, skew_angle: float, 
+def detect_stairs(image: PreprocessedImage, skew_angle: float, 
                   img_w: int, img_h: int, min_steps: int = 3) -> list:
     """
     Detect stairs by finding parallel lines in close proximity (stair pattern).
     Stairs appear as multiple short parallel lines arranged in sequence.
     """
     # Edge detection  
-    edges = cv2.Canny(gray_image, 50, 150, apertureSize=3)
+    edges = image.edges(50, 150)
     
     # Detect short lines that could be stair steps
     lines = cv2.HoughLinesP(edges, rho=1, theta=np.pi/180,
@@ -822,52 +754,66 @@ def extract_text(image: np.ndarray, skew_angle: float,
     return results
 
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python ocr_extract.py <image_path>")
-        sys.exit(1)
-    
-    image_path = sys.argv[1]
-    
-    if not os.path.exists(image_path):
-        print(f"Error: Image not found: {image_path}")
-        sys.exit(1)
-    
-    image_dir = os.path.dirname(os.path.abspath(image_path))
-    image_name = os.path.splitext(os.path.basename(image_path))[0]
-    output_path = os.path.join(image_dir, f"{image_name}-ocr.json")
-    
-    # Load image
-    image = cv2.imread(image_path)
-    if image is None:
-        print(f"Error: Could not load image: {image_path}")
-        sys.exit(1)
+def process_image(image: np.ndarray) -> dict:
+    """
+    Run the full OCR + door/stair/hallway extraction on a loaded image.
     
+    Returns the dict that main() writes to <imageName>-ocr.json.
+    """
     img_h, img_w = image.shape[:2]
     
     # Preprocess
-    processed, skew_angle, deskewed_gray = preprocess_image(image)
+    processed, skew_angle, deskewed = preprocess_image(PreprocessedImage(image))
     
     # Detect doors with de-duplication
-    doors = detect_doors(deskewed_gray, skew_angle, img_w, img_h)
+    doors = detect_doors(deskewed, skew_angle, img_w, img_h)
     doors = deduplicate_doors(doors, distance_threshold=15)
     
     # Detect stairs
-    stairs = detect_stairs(deskewed_gray, skew_angle, img_w, img_h)
+    stairs = detect_stairs(deskewed, skew_angle, img_w, img_h)
     
     # Extract text
     text_results = extract_text(processed, skew_angle, img_w, img_h, min_confidence=70)
     
     # Detect hallways (with simplified polylines)
-    hallways = detect_hallways(deskewed_gray, skew_angle, img_w, img_h)
+    hallways = detect_hallways(deskewed, skew_angle, img_w, img_h)
     
     # Build output with stairs
-    output = {
+    return {
         "texts": text_results,
         "doors": doors,
         "stairs": stairs,
         "hallways": hallways
     }
+
+
+def output_path_for(image_path: str) -> str:
+    """Path of the <imageName>-ocr.json written next to the input image."""
+    image_dir = os.path.dirname(os.path.abspath(image_path))
+    image_name = os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(image_dir, f"{image_name}-ocr.json")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python ocr_extract.py <image_path>")
+        sys.exit(1)
+    
+    image_path = sys.argv[1]
+    
+    if not os.path.exists(image_path):
+        print(f"Error: Image not found: {image_path}")
+        sys.exit(1)
+    
+    output_path = output_path_for(image_path)
+    
+    # Load image
+    image = cv2.imread(image_path)
+    if image is None:
+        print(f"Error: Could not load image: {image_path}")
+        sys.exit(1)
+    
+    output = process_image(image)
     
     # Save JSON
     with open(output_path, 'w', encoding='utf-8') as f: